@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: shared single-pass md_to_text vs the regex chains it replaced.
+
+Runs every converter over the bodies of content/**/index.md and reports
+throughput, plus how many outputs differ from the old normalizer chain.
+First checks md_to_text() against CASES, the edge cases of emphasis and
+escapes (exits 1 if any fails).
+
+Usage:
+  python scripts/bench_md_to_text.py              # 5 rounds over content/
+  python scripts/bench_md_to_text.py --rounds 20
+
+Dependencies:
+  pip install python-frontmatter
+"""
+from __future__ import annotations
+import argparse
+import pathlib
+import re
+import time
+import frontmatter
+from markdown_text import md_to_text
+
+ROOT = pathlib.Path(".").resolve()
+CONTENT = ROOT / "content"
+
+# --- chains as they were before markdown_text.py (kept verbatim for comparison)
+
+def legacy_normalize(md_body: str) -> str:
+    # normalize_and_build_dataset.md_to_text
+    t = md_body
+    t = re.sub(r"(?s)^---\n.*?\n---\n", "", t).strip()
+    t = re.sub(r'!\[([^\]]*)\]\([^)]+\)', r'\1', t)
+    t = re.sub(r'\[([^\]]+)\]\(([^)]+)\)', r'\1 (\2)', t)
+    t = re.sub(r'```[^\n]*\n(.*?)```', r'\1', t, flags=re.S)
+    t = t.replace("`", "")
+    t = re.sub(r'^\s*#{1,6}\s*', '', t, flags=re.M)
+    t = re.sub(r'^\s*>+\s?', '', t, flags=re.M)
+    t = re.sub(r'\n{3,}', '\n\n', t)
+    t = re.sub(r'[ \t]+$', '', t, flags=re.M)
+    return t.strip()
+
+def legacy_ingest_mh_md(md_body: str) -> str:
+    # ingest_mh_md.md_to_text
+    text = md_body
+    text = re.sub(r"(?s)^---\n.*?\n---\n", "", text).strip()
+    text = re.sub(r"!\[([^\]]*)\]\([^)]+\)", r"\1", text)
+    text = re.sub(r"\[([^\]]+)\]\(([^)]+)\)", r"\1 (\2)", text)
+    text = text.replace("`", "")
+    text = text.replace("**", "").replace("*", "").replace("_", "")
+    text = re.sub(r"^#{1,6}\s*", "", text, flags=re.MULTILINE)
+    text = re.sub(r"^\s*>\s?", "", text, flags=re.MULTILINE)
+    text = re.sub(r"^\s*[-*_]{3,}\s*$", "", text, flags=re.MULTILINE)
+    return text.strip()
+
+def legacy_import_medium(content: str) -> str:
+    # import_medium.process_entry
+    return re.sub(r"(?m)^\s*$", "\n", re.sub(r"\s+", " ", re.sub(r"\n{3,}", "\n\n", re.sub(r"\r", "", re.sub(r"\s+\n", "\n", content.strip())))))
+
+def legacy_import_substack(content: str) -> str:
+    # import_substack.process_entry and scrape_dyslexiaaction_tech_blog.write_post
+    return re.sub(r"(?m)^\s*$", "\n", re.sub(r"\s+", " ", re.sub(r"\r", "", content.strip())))
+
+# (markdown, expected md_to_text output)
+CASES = [
+    ("**bold** and *em* and __strong__ and _em_", "bold and em and strong and em"),
+    ("***both*** and ___both___", "both and both"),
+    ("*a **b** c*", "a b c"),
+    ("costs 5* more", "costs 5* more"),
+    ("a ** b", "a ** b"),
+    ("2*3*4", "2*3*4"),
+    ("**unclosed", "**unclosed"),
+    ("* item\n* item", "* item\n* item"),
+    ("*not\n\nacross paragraphs*", "*not\n\nacross paragraphs*"),
+    (r"\*escaped\*", "*escaped*"),
+    (r"\_not em\_ and a\\b", "_not em_ and a\\b"),
+    (r"C:\Users\me", r"C:\Users\me"),
+    ("snake_case_name and _x", "snake_case_name and _x"),
+    ("`*code*` stays", "*code* stays"),
+    ("**[link](http://a/_b_)****.**", "link (http://a/_b_)."),
+    ("**#1 priority**", "#1 priority"),
+    ("text\n\n---\n\n# Heading", "text\n\nHeading"),
+]
+
+CONVERTERS = {
+    "markdown_text.md_to_text": md_to_text,
+    "legacy normalize": legacy_normalize,
+    "legacy ingest_mh_md": legacy_ingest_mh_md,
+    "legacy import_medium": legacy_import_medium,
+    "legacy import_substack": legacy_import_substack,
+}
+
+def load_bodies() -> list[str]:
+    return [frontmatter.load(p).content or "" for p in sorted(CONTENT.rglob("index.md"))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    failed = [(md, expected, md_to_text(md)) for md, expected in CASES if md_to_text(md) != expected]
+    print(f"{len(CASES) - len(failed)}/{len(CASES)} cases pass")
+    for md, expected, got in failed:
+        print(f"  {md!r}: expected {expected!r}, got {got!r}")
+
+    bodies = load_bodies()
+    total = sum(len(b) for b in bodies)
+    print(f"{len(bodies)} bodies, {total / 1e6:.2f} MB, {args.rounds} rounds")
+    timings = {}
+    for name, fn in CONVERTERS.items():
+        best = float("inf")
+        for _ in range(args.rounds):
+            t0 = time.perf_counter()
+            for b in bodies:
+                fn(b)
+            best = min(best, time.perf_counter() - t0)
+        timings[name] = best
+        print(f"  {name:28s} {best * 1000:8.1f} ms  {total / best / 1e6:6.1f} MB/s")
+    differ = sum(1 for b in bodies if md_to_text(b) != legacy_normalize(b))
+    print(f"outputs differing from legacy normalize: {differ}/{len(bodies)}")
+    if failed:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+BM25 inverted index over the corpus, built by normalize_and_build_dataset.py
+next to the corpus shards, for exact-term queries (names such as "Fillmore"
+or "Lakoff") that dense embeddings serve poorly, and for search without any
+embedding cost.
+
+dataset/bm25.index is one file: an 8-byte little-endian header length, a
+JSON header (parameters, document ids, sorted vocabulary, array layout), then
+8-byte aligned little-endian arrays:
+
+  offsets  uint64[n_terms + 1]  postings of term t are [offsets[t], offsets[t+1])
+  docs     uint32[n_postings]   document positions, ascending within a term
+  tfs      uint16[n_postings]   term frequencies (capped at 65535)
+  doc_len  uint32[n_docs]       tokens per document
+  idf      float32[n_terms]     log(1 + (N - df + 0.5) / (df + 0.5))
+
+Bm25Index.load() memory-maps the file, so opening it costs the JSON header
+and nothing else; a query touches only the postings of its own terms.
+Documents are title + text, tokenized as lowercase \\w+ words minus a short
+stopword list.
+
+Usage:
+  python scripts/bm25_index.py "Fillmore frame semantics" -k 5   # query dataset/bm25.index
+  python scripts/bm25_index.py --build                           # rebuild it from the corpus
+
+Dependencies:
+  pip install numpy
+"""
+from __future__ import annotations
+import argparse
+import json
+import mmap
+import os
+import pathlib
+import re
+import struct
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+REPO = pathlib.Path(".").resolve()
+DATASET = REPO / "dataset"
+BM25_FILE = "bm25.index"
+VERSION = 1
+K1 = 1.2
+B = 0.75
+ALIGN = 8
+
+TOKEN_RE = re.compile(r"\w+")
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been before being below between both
+but by can could did do does doing down during each few for from further had has have having he her here hers
+herself him himself his how i if in into is it its itself just me more most my myself no nor not now of off on
+once only or other our ours ourselves out over own same she should so some such than that the their theirs them
+themselves then there these they this those through to too under until up very was we were what when where
+which while who whom why will with would you your yours yourself yourselves
+""".split())
+
+ARRAYS = (("offsets", "<u8"), ("docs", "<u4"), ("tfs", "<u2"), ("doc_len", "<u4"), ("idf", "<f4"))
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+def document_text(row: Dict) -> str:
+    return f"{row.get('title') or ''}\n\n{row.get('text') or ''}"
+
+def build_arrays(rows: Iterable[Dict]) -> Tuple[List[str], List[str], Dict[str, np.ndarray]]:
+    """Return (doc ids, sorted vocabulary, arrays) for rows in corpus order."""
+    ids: List[str] = []
+    term_ids: Dict[str, int] = {}
+    post_term: List[int] = []
+    post_doc: List[int] = []
+    post_tf: List[int] = []
+    doc_len: List[int] = []
+    for pos, row in enumerate(rows):
+        ids.append(row["id"])
+        counts: Dict[str, int] = {}
+        tokens = tokenize(document_text(row))
+        for t in tokens:
+            counts[t] = counts.get(t, 0) + 1
+        doc_len.append(len(tokens))
+        for t, tf in counts.items():
+            post_term.append(term_ids.setdefault(t, len(term_ids)))
+            post_doc.append(pos)
+            post_tf.append(tf)
+
+    vocab = sorted(term_ids)
+    # first-seen term ids -> sorted vocabulary order
+    rank = np.empty(len(vocab), dtype=np.int64)
+    rank[[term_ids[t] for t in vocab]] = np.arange(len(vocab))
+    terms = rank[np.asarray(post_term, dtype=np.int64)]
+    # stable sort keeps documents ascending within each term
+    order = np.argsort(terms, kind="stable")
+    df = np.bincount(terms, minlength=len(vocab))
+    offsets = np.zeros(len(vocab) + 1, dtype=np.uint64)
+    np.cumsum(df, out=offsets[1:])
+    n = len(ids)
+    return ids, vocab, {
+        "offsets": offsets,
+        "docs": np.asarray(post_doc, dtype=np.uint32)[order],
+        "tfs": np.minimum(np.asarray(post_tf, dtype=np.int64), 65535).astype(np.uint16)[order],
+        "doc_len": np.asarray(doc_len, dtype=np.uint32),
+        "idf": np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32),
+    }
+
+def write_index(rows: Iterable[Dict], dataset_dir: pathlib.Path = DATASET, k1: float = K1, b: float = B) -> Dict:
+    """Build the index for rows and publish it atomically; returns the header."""
+    ids, vocab, arrays = build_arrays(rows)
+    layout = {}
+    offset = 0
+    for name, dtype in ARRAYS:
+        layout[name] = {"dtype": dtype, "offset": offset, "count": int(arrays[name].size)}
+        offset += -(-arrays[name].size * np.dtype(dtype).itemsize // ALIGN) * ALIGN
+    doc_len = arrays["doc_len"]
+    header = {"version": VERSION, "k1": k1, "b": b, "n_docs": len(ids), "n_terms": len(vocab),
+              "avgdl": float(doc_len.mean()) if len(doc_len) else 0.0,
+              "ids": ids, "terms": vocab, "arrays": layout}
+    blob = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    blob += b" " * (-(8 + len(blob)) % ALIGN)
+
+    path = pathlib.Path(dataset_dir) / BM25_FILE
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("wb") as f:
+        f.write(struct.pack("<Q", len(blob)))
+        f.write(blob)
+        for name, dtype in ARRAYS:
+            data = arrays[name].astype(dtype, copy=False).tobytes()
+            f.write(data)
+            f.write(b"\0" * (-len(data) % ALIGN))
+    os.replace(tmp, path)
+    return header
+
+class Bm25Index:
+    def __init__(self, header: Dict, arrays: Dict[str, np.ndarray], buffer=None):
+        self.k1 = header["k1"]
+        self.b = header["b"]
+        self.avgdl = header["avgdl"] or 1.0
+        self.ids: List[str] = header["ids"]
+        self.term_ids = {t: i for i, t in enumerate(header["terms"])}
+        self.offsets = arrays["offsets"]
+        self.docs = arrays["docs"]
+        self.tfs = arrays["tfs"]
+        self.idf = arrays["idf"]
+        # per-document part of the BM25 denominator, precomputed once
+        self.norm = (self.k1 * (1 - self.b + self.b * arrays["doc_len"] / self.avgdl)).astype(np.float32)
+        self._buffer = buffer
+
+    @classmethod
+    def load(cls, dataset_dir: pathlib.Path = DATASET) -> "Bm25Index":
+        """Memory-map dataset/bm25.index (arrays are views into the mapping)."""
+        with (pathlib.Path(dataset_dir) / BM25_FILE).open("rb") as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (size,) = struct.unpack_from("<Q", buf, 0)
+        header = json.loads(buf[8:8 + size])
+        if header.get("version") != VERSION:
+            raise ValueError(f"{BM25_FILE}: unsupported version {header.get('version')}")
+        base = 8 + size
+        arrays = {name: np.frombuffer(buf, dtype=spec["dtype"], count=spec["count"], offset=base + spec["offset"])
+                  for name, spec in header["arrays"].items()}
+        return cls(header, arrays, buf)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every document for query (zero where no term matches)."""
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for term in set(tokenize(query)):
+            t = self.term_ids.get(term)
+            if t is None:
+                continue
+            lo, hi = int(self.offsets[t]), int(self.offsets[t + 1])
+            docs = self.docs[lo:hi]
+            tf = self.tfs[lo:hi].astype(np.float32)
+            # documents are unique within a term's postings, so plain fancy-index add is safe
+            scores[docs] += self.idf[t] * tf * (self.k1 + 1) / (tf + self.norm[docs])
+        return scores
+
+    def search(self, query: str, k: int = 10, allowed: Optional[np.ndarray] = None) -> List[Tuple[str, float]]:
+        """Top-k (doc id, score) by BM25, best first; only documents matching a term.
+
+        allowed is an optional boolean mask over the index's documents
+        (e.g. a metadata filter); other documents are never returned.
+        """
+        scores = self.scores(query)
+        if allowed is not None:
+            scores[~allowed] = 0
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(self.ids[i], float(scores[i])) for i in matched]
+
+def main():
+    parser = argparse.ArgumentParser(description="Query or rebuild the BM25 index in dataset/")
+    parser.add_argument("query", nargs="*")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--dataset", type=pathlib.Path, default=DATASET)
+    parser.add_argument("--build", action="store_true", help="rebuild bm25.index from the corpus shards")
+    args = parser.parse_args()
+
+    if args.build:
+        from corpus_reader import CorpusReader
+        t0 = time.perf_counter()
+        with CorpusReader(args.dataset) as reader:
+            header = write_index(reader.iter(), args.dataset)
+        size = (args.dataset / BM25_FILE).stat().st_size
+        print(f"Built {args.dataset / BM25_FILE}: {header['n_docs']} documents, {header['n_terms']} terms, "
+              f"{size / 2**20:.1f} MB in {time.perf_counter() - t0:.2f}s")
+    if args.query:
+        t0 = time.perf_counter()
+        index = Bm25Index.load(args.dataset)
+        t1 = time.perf_counter()
+        hits = index.search(" ".join(args.query), args.k)
+        t2 = time.perf_counter()
+        print(f"load {(t1 - t0) * 1000:.1f} ms, query {(t2 - t1) * 1000:.2f} ms")
+        for doc_id, score in hits:
+            print(f"  {score:8.3f}  {doc_id}")
+
+if __name__ == "__main__":
+    main()
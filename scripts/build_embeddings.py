@@ -1,143 +1,462 @@
 #!/usr/bin/env python3
 """
-Build embeddings and FAISS index from dataset/corpus.jsonl
+Build embeddings and FAISS index from dataset/corpus*.jsonl (read via corpus_reader.py)
+
+Embeddings are cached in dataset/embedding_cache.jsonl keyed by (model,
+sha256 of the exact input text), so only new or edited documents are sent to
+the provider; entries no longer used are dropped when the cache is saved.
+
+By default each document is split into overlapping, token-bounded paragraph
+chunks (chunking.py) and every chunk is embedded on its own; FAISS ids are
+then chunk ids "<doc id>#<n>", and dataset/faiss_chunks.json maps each one
+back to its document and character range. --unit doc embeds whole documents.
+
+Requests go through embed_scheduler.py: batches are packed by estimated token
+budget and several are kept in flight, backing off on 429 / Retry-After.
+Vectors are streamed to dataset/embeddings.journal.jsonl as batches complete,
+then written in corpus order to the matrix dataset/embeddings.npy (float32, or
+--dtype float16) with row ids in dataset/embedding_ids.json (see
+embedding_matrix.py); the FAISS index is built from the memory-mapped matrix
+in chunks. --jsonl also exports the old dataset/embeddings.jsonl format.
+
+The index type (faiss_index.py) is exact flat search for small corpora and
+HNSW / IVF as they grow; --index forces one of flat, hnsw, ivf-flat, ivf-pq,
+or the compact sq8 (int8) / binary (1 bit per dimension) codes, which
+search_service.py rescores against the float vectors in embeddings.npy.
+The index is maintained incrementally: vectors carry stable int64 labels
+derived from their ids, dataset/faiss_state.json remembers which input each
+was built from, and a run only removes and adds what changed since the last
+one (--rebuild starts over). dataset/faiss_meta.npz holds per-vector source,
+date, tag and language bitsets for filtered search (metadata_filter.py).
+
+The journal doubles as a checkpoint: after a crash or outage, --resume keeps
+every batch already journaled and embeds only the rest. Failing requests are
+retried, then bisected down to the offending document; documents that cannot
+be embedded are listed in dataset/embedding_failures.json. The run then exits
+1 without publishing anything but the journal: embeddings.npy, the index and
+the cache entries it needs stay as the last complete run left them.
+--allow-failures publishes the matrix and index without those documents.
+
+Usage:
+  python scripts/build_embeddings.py
+  python scripts/build_embeddings.py --full          # ignore the embedding cache
+  python scripts/build_embeddings.py --api-base http://127.0.0.1:8765/v1   # e.g. fake_embeddings_server.py
+  python scripts/build_embeddings.py --concurrency 8 --batch-tokens 50000
+  python scripts/build_embeddings.py --resume        # continue an interrupted run
+  python scripts/build_embeddings.py --dtype float16 --jsonl
+  python scripts/build_embeddings.py --index hnsw
+  python scripts/build_embeddings.py --index binary  # 1/32 of the memory, rescored on search
+  python scripts/build_embeddings.py --rebuild       # rebuild the FAISS index from scratch
 
 Dependencies:
   pip install openai tqdm ujson numpy faiss-cpu
 
 Environment:
-  OPENAI_API_KEY - required for OpenAI embeddings
+  OPENAI_API_KEY - required for OpenAI embeddings (any value for a local --api-base)
+  OPENAI_BASE_URL - default for --api-base
 """
+import argparse
 import json
 import os
 import pathlib
 import sys
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import numpy as np
 import openai
 from tqdm import tqdm
+from corpus_reader import CorpusReader
+from chunking import DEFAULT_MAX_TOKENS, DEFAULT_OVERLAP_TOKENS, embedding_input, iter_chunks
+from embedding_cache import EmbeddingCache, text_key
+from embedding_matrix import DTYPES, EMBEDDINGS_NPY, MatrixWriter, export_jsonl, load_embeddings
+from embed_scheduler import (EmbeddingScheduler, format_stats, DEFAULT_BATCH_INPUTS, DEFAULT_BATCH_TOKENS,
+                             DEFAULT_CONCURRENCY, DEFAULT_MAX_CONCURRENCY, DEFAULT_RETRIES)
 
 try:
     import faiss
 except ImportError:
     print("ERROR: faiss-cpu not installed. Run: pip install faiss-cpu")
     sys.exit(1)
+from faiss_index import (IVF, KINDS, TRAINED, add_rows, build_index, choose_kind, faiss_id, faiss_labels,
+                         index_bytes, index_kind, index_labels, needs_compaction, read_index, remove_labels,
+                         tombstones, write_index)
+from metadata_filter import META_FILE, write_metadata
 
 REPO = pathlib.Path(".").resolve()
 DATASET = REPO / "dataset"
-CORPUS_FILE = DATASET / "corpus.jsonl"
+MANIFEST_FILE = DATASET / "manifest.json"
 EMBEDDINGS_FILE = DATASET / "embeddings.jsonl"
 FAISS_INDEX_FILE = DATASET / "faiss.index"
 FAISS_IDS_FILE = DATASET / "faiss_ids.json"
+FAISS_CHUNKS_FILE = DATASET / "faiss_chunks.json"
+FAISS_STATE_FILE = DATASET / "faiss_state.json"
+FAISS_META_FILE = DATASET / META_FILE
+EMBEDDING_CACHE_FILE = DATASET / "embedding_cache.jsonl"
+EMBEDDINGS_JOURNAL = DATASET / "embeddings.journal.jsonl"
+FAILURES_FILE = DATASET / "embedding_failures.json"
+DEFAULT_MODEL = "text-embedding-3-small"
+# retrain IVF centroids / sq8 ranges once the corpus has grown this much since training
+RETRAIN_GROWTH = 2
+# faiss_state.json format; IVF indexes saved before version 2 may have removed vectors in place
+STATE_VERSION = 2
 
 def load_corpus() -> List[Dict[str, Any]]:
-    """Load corpus from JSONL file."""
-    if not CORPUS_FILE.exists():
-        print(f"ERROR: {CORPUS_FILE} not found")
+    """Load corpus rows through the manifest (any sharding / compression)."""
+    if not MANIFEST_FILE.exists():
+        print(f"ERROR: {MANIFEST_FILE} not found")
         sys.exit(1)
     
-    docs = []
-    with CORPUS_FILE.open("r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if line:
-                docs.append(json.loads(line))
+    with CorpusReader(DATASET) as reader:
+        docs = list(reader.iter())
     
-    print(f"Loaded {len(docs)} documents from {CORPUS_FILE}")
+    print(f"Loaded {len(docs)} documents from {DATASET} ({len(reader.shards)} shard(s))")
     return docs
 
-def get_embeddings(texts: List[str], model: str = "text-embedding-3-small") -> List[List[float]]:
-    """Get embeddings from OpenAI API."""
-    client = openai.OpenAI()
-    
-    embeddings = []
-    batch_size = 100  # OpenAI batch limit
-    
-    for i in tqdm(range(0, len(texts), batch_size), desc="Getting embeddings"):
-        batch_texts = texts[i:i + batch_size]
+def read_journal(journal: pathlib.Path, model: str, texts: List[str], doc_ids: List[str],
+                 cache: EmbeddingCache) -> tuple:
+    """Scan a journal left by an earlier run.
+
+    Returns (offsets, end): byte offsets of the lines that still match this
+    corpus and model (same id, same input hash) and the length of the intact
+    prefix; a torn last line from a crash is cut off. Vectors found are also
+    put into the cache.
+    """
+    position = {doc_id: i for i, doc_id in enumerate(doc_ids)}
+    offsets: Dict[str, tuple] = {}
+    end = 0
+    with journal.open("rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break
+            i = position.get(entry.get("id"))
+            if i is not None and entry.get("model") == model and entry.get("sha256") == text_key(texts[i]):
+                offsets[entry["id"]] = (end, len(line))
+                cache.store(model, texts[i], entry["embedding"])
+            end += len(line)
+    return offsets, end
+
+def embed_to_journal(texts: List[str], doc_ids: List[str], model: str, scheduler: EmbeddingScheduler,
+                     cache: EmbeddingCache, journal: pathlib.Path, resume: bool = False) -> Dict[str, Any]:
+    """Append {"id", "model", "sha256", "embedding"} lines to journal as vectors become available.
+
+    The journal is the checkpoint: every completed batch is flushed to it, and
+    with resume=True the documents it already holds are not embedded again.
+    Cached vectors are written first; the rest are embedded by the scheduler
+    and written (and cached) batch by batch as requests complete. Returns
+    byte offsets of each id's line and the documents that failed.
+    """
+    offsets: Dict[str, tuple] = {}
+    if resume and journal.exists():
+        offsets, end = read_journal(journal, model, texts, doc_ids, cache)
+        f = journal.open("r+b")
+        f.truncate(end)
+        f.seek(end)
+        print(f"  resuming: {len(offsets)} documents already in {journal.name}")
+    else:
+        if journal.exists():
+            print(f"  starting a new {journal.name} (pass --resume to continue the previous one)")
+        f = journal.open("wb")
+    missing = []
+    failed: List[Dict[str, str]] = []
+    with f:
+        def write(i: int, vector: List[float]):
+            entry = {"id": doc_ids[i], "model": model, "sha256": text_key(texts[i]), "embedding": vector}
+            line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+            offsets[doc_ids[i]] = (f.tell(), len(line))
+            f.write(line)
         
-        try:
-            response = client.embeddings.create(
-                model=model,
-                input=batch_texts
-            )
-            
-            batch_embeddings = [data.embedding for data in response.data]
-            embeddings.extend(batch_embeddings)
-            
-        except Exception as e:
-            print(f"ERROR getting embeddings for batch {i//batch_size}: {e}")
-            # Add zero vectors as fallback
-            embeddings.extend([[0.0] * 1536] * len(batch_texts))
-    
-    return embeddings
+        for i, text in enumerate(texts):
+            if doc_ids[i] in offsets:
+                continue
+            vector = cache.lookup(model, text)
+            if vector is None:
+                missing.append(i)
+            else:
+                write(i, vector)
+        print(f"  {len(texts) - len(missing)} cached or journaled, {len(missing)} to embed")
+        
+        progress = tqdm(total=len(missing), desc="Getting embeddings")
+        
+        def on_batch(batch: List[int], vectors: List[List[float]]):
+            progress.update(len(batch))
+            for i, vector in zip(batch, vectors):
+                cache.store(model, texts[i], vector)
+                write(i, vector)
+            # checkpoint: a crash after this point keeps the batch
+            f.flush()
+            os.fsync(f.fileno())
+        
+        def on_failed(batch: List[int], error: str):
+            progress.update(len(batch))
+            failed.extend({"id": doc_ids[i], "error": error} for i in batch)
+        
+        if missing:
+            stats = scheduler.run(texts, missing, on_batch, on_failed)
+            progress.close()
+            print(f"  {format_stats(stats)}")
+    return {"offsets": offsets, "failed": failed}
 
-def build_faiss_index(embeddings: List[List[float]], doc_ids: List[str]) -> None:
-    """Build and save FAISS index."""
-    embeddings_array = np.array(embeddings, dtype=np.float32)
-    
-    # Create FAISS index
-    dimension = embeddings_array.shape[1]
-    index = faiss.IndexFlatIP(dimension)  # Inner product (cosine similarity)
+def write_embeddings(doc_ids: List[str], journal: pathlib.Path, offsets: Dict[str, tuple],
+                     dtype: str = "float32") -> None:
+    """Write the embedding matrix in corpus order from the completion-ordered journal."""
+    with journal.open("rb") as src:
+        def vector(doc_id: str) -> List[float]:
+            offset, length = offsets[doc_id]
+            src.seek(offset)
+            return json.loads(src.read(length))["embedding"]
+        
+        dim = len(vector(doc_ids[0])) if doc_ids else 0
+        with MatrixWriter(DATASET, doc_ids, dim, dtype) as writer:
+            for row, doc_id in enumerate(doc_ids):
+                writer.write(row, vector(doc_id))
+            writer.commit()
+
+def load_faiss_state() -> Optional[Dict[str, Any]]:
+    if not (FAISS_STATE_FILE.exists() and FAISS_INDEX_FILE.exists()):
+        return None
+    try:
+        return json.loads(FAISS_STATE_FILE.read_text(encoding="utf-8"))
+    except ValueError:
+        return None
+
+def build_faiss_index(ids: List[str], hashes: List[str], matrix: np.ndarray, kind: str = "auto",
+                      model: str = DEFAULT_MODEL, dtype: str = "float32", rebuild: bool = False):
+    """Update the saved FAISS index to match ids, or build it from scratch.
+
+    Vectors are labelled faiss_id(id). dataset/faiss_state.json records the
+    input hash each label was embedded from, so a later run only removes the
+    ids that disappeared or changed and adds the new or changed rows of the
+    (memory-mapped) matrix. The index is rebuilt instead when there is no
+    usable state, when the index type, model, dtype or dimension changes,
+    when HNSW tombstones pass COMPACT_RATIO, when an IVF index would have
+    to remove vectors (see faiss_index.IVF), or when a trained index (IVF,
+    sq8) has grown RETRAIN_GROWTH times past the data it was trained on.
+    Returns (ids, index).
+    """
+    if not ids:
+        print("ERROR: no embeddings to index")
+        sys.exit(1)
     
-    # Normalize vectors for cosine similarity
-    faiss.normalize_L2(embeddings_array)
+    n, dim = matrix.shape
+    labels = faiss_labels(ids)
+    kind = choose_kind(n) if kind == "auto" else kind
+    config = {"kind": kind, "model": model, "dtype": dtype, "dim": dim}
+    state = None if rebuild else load_faiss_state()
+    index = None
+    reason = "--rebuild" if rebuild else "no previous index"
+    if state is not None:
+        changed = [k for k, v in config.items() if state.get(k) != v]
+        if changed:
+            reason = f"{', '.join(changed)} changed"
+        elif kind in IVF and state.get("version", 1) < STATE_VERSION:
+            reason = f"{kind} index from an older version may have drifted from its id map"
+        else:
+            index = read_index(FAISS_INDEX_FILE)
+            if index.ntotal != state.get("ntotal"):
+                index, reason = None, f"{FAISS_INDEX_FILE.name} does not match {FAISS_STATE_FILE.name}"
     
-    # Add embeddings to index
-    index.add(embeddings_array)
+    trained_on = n
+    if index is not None:
+        # Delta against the previous run: drop removed/edited ids, add new/edited rows
+        previous: Dict[str, str] = state["entries"]
+        current = dict(zip(ids, hashes))
+        stale = [i for i, h in previous.items() if current.get(i) != h]
+        fresh = np.array([row for row, (i, h) in enumerate(zip(ids, hashes)) if previous.get(i) != h],
+                         dtype=np.int64)
+        trained_on = state.get("trained_on", n)
+        if stale and kind in IVF:
+            # IndexIVF cannot remove vectors behind an id map without corrupting it
+            index, reason = None, f"{kind} cannot remove {len(stale)} vectors in place"
+        else:
+            removed = remove_labels(index, faiss_labels(stale))
+            add_rows(index, matrix, fresh, labels[fresh])
+            print(f"Updated FAISS index ({kind}): {len(fresh)} added or changed, {len(stale)} removed or changed, "
+                  f"{tombstones(index)} tombstones")
+            if removed != len(stale):
+                index, reason = None, f"expected to remove {len(stale)} vectors but found {removed}"
+            elif needs_compaction(index):
+                index, reason = None, f"compacting {tombstones(index)} tombstones"
+            elif kind in TRAINED and n > RETRAIN_GROWTH * trained_on:
+                index, reason = None, f"retraining ({trained_on} -> {n} vectors)"
+    if index is None:
+        print(f"Building FAISS index from scratch ({reason})")
+        index = build_index(matrix, kind, labels=labels)
+        trained_on = n
     
-    # Save index
-    faiss.write_index(index, str(FAISS_INDEX_FILE))
+    # Save index, then the state describing it (a crash in between is caught by the ntotal check)
+    tmp = FAISS_INDEX_FILE.with_name(FAISS_INDEX_FILE.name + ".tmp")
+    write_index(index, tmp)
+    os.replace(tmp, FAISS_INDEX_FILE)
+    state = dict(config, version=STATE_VERSION, ntotal=index.ntotal, trained_on=trained_on,
+                 tombstones=tombstones(index), entries=dict(zip(ids, hashes)))
+    tmp = FAISS_STATE_FILE.with_name(FAISS_STATE_FILE.name + ".tmp")
+    tmp.write_text(json.dumps(state, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, FAISS_STATE_FILE)
     
-    # Save document IDs mapping
+    # Save document IDs (label of ids[i] is faiss_id(ids[i]))
     with FAISS_IDS_FILE.open("w", encoding="utf-8") as f:
-        json.dump(doc_ids, f, ensure_ascii=False, indent=2)
+        json.dump(ids, f, ensure_ascii=False, indent=2)
     
-    print(f"Built FAISS index with {index.ntotal} vectors")
+    size = index_bytes(index)
+    print(f"FAISS index ({index_kind(index)}) has {index.ntotal - tombstones(index)} vectors, "
+          f"{size / 2**20:.1f} MB ({size / (n * dim * 4):.3f} x float32)")
     print(f"Saved index to {FAISS_INDEX_FILE}")
     print(f"Saved ID mapping to {FAISS_IDS_FILE}")
+    return ids, index
+
+def write_faiss_metadata(index, index_ids: List[str], spans: Dict[str, tuple], docs: List[Dict[str, Any]]) -> None:
+    """Save source / date / tag / language bitsets in the index's internal order.
+
+    Written after every build or update, since incremental updates move
+    vectors around inside the index (see metadata_filter.py).
+    """
+    by_id = {doc["id"]: doc for doc in docs}
+    metas = {}
+    for i in index_ids:
+        doc = by_id[spans[i][0]]
+        metas[faiss_id(i)] = {"source": doc.get("source"), "date": doc.get("date"),
+                              "tags": doc.get("tags") or [], "language": doc.get("language")}
+    summary = write_metadata(DATASET, index_labels(index), metas)
+    print(f"Saved filter metadata to {FAISS_META_FILE} ({summary['keys']} keys, "
+          f"{summary['bytes'] / 1024:.0f} KB)")
+
+def write_chunk_map(index_ids: List[str], spans: Dict[str, tuple], args: argparse.Namespace) -> None:
+    """Save chunk -> document mapping aligned with faiss_ids.json.
+
+    Position i describes FAISS vector i: the corpus row it came from and the
+    [start, end) character range of that row's text it covers.
+    """
+    chunk_map = {
+        "unit": args.unit,
+        "max_tokens": args.chunk_tokens if args.unit == "chunk" else None,
+        "overlap_tokens": args.overlap_tokens if args.unit == "chunk" else None,
+        "doc_id": [spans[i][0] for i in index_ids],
+        "start": [spans[i][1] for i in index_ids],
+        "end": [spans[i][2] for i in index_ids],
+    }
+    FAISS_CHUNKS_FILE.write_text(json.dumps(chunk_map, ensure_ascii=False), encoding="utf-8")
+    print(f"Saved chunk mapping to {FAISS_CHUNKS_FILE}")
 
 def main():
+    parser = argparse.ArgumentParser(description="Build embeddings and FAISS index from the corpus")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--api-base", default=os.getenv("OPENAI_BASE_URL"),
+                        help="OpenAI-compatible endpoint, e.g. a local fake_embeddings_server.py")
+    parser.add_argument("--full", action="store_true",
+                        help="ignore the embedding cache and re-embed every document")
+    parser.add_argument("--keep-unused", action="store_true",
+                        help="do not drop cache entries unused by this corpus")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="requests in flight at start (adapts to rate limits)")
+    parser.add_argument("--max-concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY)
+    parser.add_argument("--batch-tokens", type=int, default=DEFAULT_BATCH_TOKENS,
+                        help="estimated token budget per request")
+    parser.add_argument("--batch-inputs", type=int, default=DEFAULT_BATCH_INPUTS,
+                        help="maximum texts per request")
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES,
+                        help="retries per request before a failing batch is bisected")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue from dataset/embeddings.journal.jsonl left by an interrupted run")
+    parser.add_argument("--allow-failures", action="store_true",
+                        help="exit 0 even if some documents could not be embedded")
+    parser.add_argument("--dtype", choices=list(DTYPES), default="float32",
+                        help="element type of dataset/embeddings.npy")
+    parser.add_argument("--jsonl", action="store_true",
+                        help="also export dataset/embeddings.jsonl ({id, embedding} per line)")
+    parser.add_argument("--index", choices=["auto", *KINDS], default="auto",
+                        help="FAISS index type; auto picks by vector count (see faiss_index.py)")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="build the FAISS index from scratch instead of updating it")
+    parser.add_argument("--unit", choices=["chunk", "doc"], default="chunk",
+                        help="embed overlapping paragraph chunks (default) or whole documents")
+    parser.add_argument("--chunk-tokens", type=int, default=DEFAULT_MAX_TOKENS,
+                        help="maximum estimated tokens per chunk")
+    parser.add_argument("--overlap-tokens", type=int, default=DEFAULT_OVERLAP_TOKENS,
+                        help="estimated tokens shared by consecutive chunks")
+    args = parser.parse_args()
+
     # Check for OpenAI API key
     if not os.getenv("OPENAI_API_KEY"):
         print("ERROR: OPENAI_API_KEY environment variable not set")
         sys.exit(1)
+    # retries are handled by the scheduler (429 / Retry-After), not inside the client
+    client = openai.OpenAI(base_url=args.api_base, max_retries=0) if args.api_base else openai.OpenAI(max_retries=0)
     
     # Load corpus
     docs = load_corpus()
     
-    # Prepare texts for embedding
+    # Prepare texts for embedding: one per chunk ("<doc id>#<n>") or per document
     texts = []
     doc_ids = []
+    spans: Dict[str, tuple] = {}
     
-    for doc in docs:
-        # Combine title and text for better embeddings
-        title = doc.get("title", "")
-        text = doc.get("text", "")
-        combined_text = f"{title}\n\n{text}".strip()
-        
-        texts.append(combined_text)
-        doc_ids.append(doc["id"])
+    if args.unit == "chunk":
+        for doc, chunk in iter_chunks(docs, args.chunk_tokens, args.overlap_tokens):
+            texts.append(embedding_input(doc, chunk))
+            doc_ids.append(chunk["id"])
+            spans[chunk["id"]] = (doc["id"], chunk["start"], chunk["end"])
+        print(f"Split {len(docs)} documents into {len(texts)} chunks "
+              f"(<= {args.chunk_tokens} tokens, {args.overlap_tokens} overlap)")
+    else:
+        for doc in docs:
+            # Combine title and text for better embeddings
+            title = doc.get("title", "")
+            text = doc.get("text", "")
+            combined_text = f"{title}\n\n{text}".strip()
+            
+            texts.append(combined_text)
+            doc_ids.append(doc["id"])
+            spans[doc["id"]] = (doc["id"], 0, len(text))
     
-    # Get embeddings
-    print("Getting embeddings from OpenAI...")
-    embeddings = get_embeddings(texts)
+    # Get embeddings (cached ones are reused), streamed to a journal as batches finish
+    print(f"Getting embeddings ({args.model})...")
+    cache = EmbeddingCache(EMBEDDING_CACHE_FILE, full=args.full)
+    scheduler = EmbeddingScheduler(client, args.model, args.concurrency, args.max_concurrency,
+                                   args.batch_tokens, args.batch_inputs, args.retries)
+    result = embed_to_journal(texts, doc_ids, args.model, scheduler, cache, EMBEDDINGS_JOURNAL, args.resume)
+    failed = result["failed"]
+    publish = not failed or args.allow_failures
+    # an unpublished run keeps every cache entry: the previous index still needs them
+    dropped = cache.save(keep_unused=args.keep_unused or not publish)
+    print(f"Embedding cache: {cache.hits} hits, {len(cache.entries) - dropped} entries kept, {dropped} dropped")
     
-    # Save embeddings to JSONL
-    with EMBEDDINGS_FILE.open("w", encoding="utf-8") as f:
-        for i, (doc, embedding) in enumerate(zip(docs, embeddings)):
-            entry = {
-                "id": doc["id"],
-                "embedding": embedding
-            }
-            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    # Failed documents are never zero-filled; the journal is kept so --resume only retries them
+    if failed:
+        FAILURES_FILE.write_text(json.dumps({"model": args.model, "failed": failed}, ensure_ascii=False, indent=2),
+                                 encoding="utf-8")
+        if not publish:
+            print(f"ERROR: {len(failed)} documents could not be embedded (see {FAILURES_FILE}); the previous "
+                  f"embeddings and index are left in place. Re-run with --resume to retry only those, "
+                  f"or add --allow-failures to publish without them")
+            sys.exit(1)
+        print(f"WARNING: {len(failed)} documents could not be embedded and are left out of the index "
+              f"(see {FAILURES_FILE}); re-run with --resume to retry only those")
     
-    print(f"Saved embeddings to {EMBEDDINGS_FILE}")
+    # Save embedding matrix (corpus order)
+    write_embeddings([d for d in doc_ids if d in result["offsets"]], EMBEDDINGS_JOURNAL, result["offsets"],
+                     args.dtype)
+    if not failed:
+        EMBEDDINGS_JOURNAL.unlink()
+        FAILURES_FILE.unlink(missing_ok=True)
+    ids, matrix = load_embeddings(DATASET)
+    print(f"Saved {matrix.shape[0]} x {matrix.shape[1]} {matrix.dtype} embeddings to {DATASET / EMBEDDINGS_NPY}")
+    if args.jsonl:
+        export_jsonl(ids, matrix, EMBEDDINGS_FILE)
+        print(f"Saved embeddings to {EMBEDDINGS_FILE}")
+    else:
+        # a JSONL file left by an older run would no longer match the matrix
+        EMBEDDINGS_FILE.unlink(missing_ok=True)
     
     # Build FAISS index
     print("Building FAISS index...")
-    build_faiss_index(embeddings, doc_ids)
-    
+    hashes = {doc_id: text_key(text) for doc_id, text in zip(doc_ids, texts)}
+    index_ids, index = build_faiss_index(ids, [hashes[i] for i in ids], matrix, args.index, args.model,
+                                         args.dtype, args.rebuild)
+    write_chunk_map(index_ids, spans, args)
+    write_faiss_metadata(index, index_ids, spans, docs)
     print("Done!")
 
 if __name__ == "__main__":
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Split corpus rows into overlapping, token-bounded chunks for embedding.
+
+Each document's text is cut on paragraph boundaries (blank lines; headings
+are their own short paragraphs in the plain text), and paragraphs are packed
+greedily into chunks of at most max_tokens (estimated as len/4, as in
+embed_scheduler.py). A paragraph longer than that is split on sentence ends,
+and a sentence longer than that on whitespace. Consecutive chunks share up to
+overlap_tokens of trailing paragraphs/sentences so a passage cut at a chunk
+border is still whole in one of them.
+
+Chunks are identified by "<doc id>#<n>" (n counts from 0 in document order)
+and carry [start, end) character offsets into the row's "text", so the chunk
+text never needs to be stored separately:
+  reader.get(chunk["doc_id"])["text"][chunk["start"]:chunk["end"]]
+
+Usage:
+  python scripts/chunking.py                     # chunk statistics for dataset/
+  python scripts/chunking.py --max-tokens 256 --overlap-tokens 32
+"""
+from __future__ import annotations
+import argparse
+import pathlib
+import re
+from typing import Dict, Iterator, List, Tuple
+
+from corpus_reader import CorpusReader
+from embed_scheduler import estimate_tokens
+
+DEFAULT_MAX_TOKENS = 400
+DEFAULT_OVERLAP_TOKENS = 50
+
+_PARAGRAPH_BREAK_RE = re.compile(r"\n[ \t]*\n\s*")
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?…])[\"'”’)\]]*\s+")
+
+Span = Tuple[int, int]
+
+def _split(text: str, start: int, end: int, pattern: re.Pattern) -> List[Span]:
+    """Split text[start:end] at pattern matches, dropping the separators."""
+    spans = []
+    pos = start
+    for m in pattern.finditer(text, start, end):
+        if m.start() > pos:
+            spans.append((pos, m.start()))
+        pos = m.end()
+    if end > pos:
+        spans.append((pos, end))
+    return spans
+
+def _hard_split(text: str, start: int, end: int, max_chars: int) -> List[Span]:
+    """Cut an over-long span at the last whitespace before max_chars (or at max_chars)."""
+    spans = []
+    while end - start > max_chars:
+        cut = text.rfind(" ", start + 1, start + max_chars)
+        cut = cut if cut > start else start + max_chars
+        spans.append((start, cut))
+        start = cut
+        while start < end and text[start].isspace():
+            start += 1
+    if end > start:
+        spans.append((start, end))
+    return spans
+
+def segments(text: str, max_tokens: int = DEFAULT_MAX_TOKENS) -> List[Span]:
+    """Paragraph spans of text, with paragraphs over max_tokens split further."""
+    out: List[Span] = []
+    for p in _split(text, 0, len(text), _PARAGRAPH_BREAK_RE):
+        if estimate_tokens(text[p[0]:p[1]]) <= max_tokens:
+            out.append(p)
+            continue
+        for s in _split(text, p[0], p[1], _SENTENCE_END_RE):
+            if estimate_tokens(text[s[0]:s[1]]) <= max_tokens:
+                out.append(s)
+            else:
+                out.extend(_hard_split(text, s[0], s[1], max(1, max_tokens - 1) * 4))
+    return out
+
+def chunk_spans(text: str, max_tokens: int = DEFAULT_MAX_TOKENS,
+                overlap_tokens: int = DEFAULT_OVERLAP_TOKENS) -> List[Span]:
+    """Return [start, end) offsets of overlapping chunks covering text."""
+    segs = segments(text, max_tokens)
+    spans: List[Span] = []
+    i = 0
+    while i < len(segs):
+        j = i
+        # span tokens are estimated on the whole text[start:end] so separators count
+        while j + 1 < len(segs) and estimate_tokens(text[segs[i][0]:segs[j + 1][1]]) <= max_tokens:
+            j += 1
+        spans.append((segs[i][0], segs[j][1]))
+        if j + 1 >= len(segs):
+            break
+        # next chunk starts with the trailing segments that fit in the overlap
+        k = j + 1
+        while k - 1 > i and estimate_tokens(text[segs[k - 1][0]:segs[j][1]]) <= overlap_tokens:
+            k -= 1
+        i = k
+    return spans
+
+def chunk_document(doc: Dict, max_tokens: int = DEFAULT_MAX_TOKENS,
+                   overlap_tokens: int = DEFAULT_OVERLAP_TOKENS) -> List[Dict]:
+    """Chunks of a corpus row: {"id", "doc_id", "n", "start", "end", "text"}."""
+    text = doc.get("text") or ""
+    spans = chunk_spans(text, max_tokens, overlap_tokens) or [(0, len(text))]
+    return [{"id": f"{doc['id']}#{n}", "doc_id": doc["id"], "n": n,
+             "start": start, "end": end, "text": text[start:end]}
+            for n, (start, end) in enumerate(spans)]
+
+def embedding_input(doc: Dict, chunk: Dict) -> str:
+    """Text sent to the embedding model for a chunk (the title gives it context)."""
+    return f"{doc.get('title', '')}\n\n{chunk['text']}".strip()
+
+def iter_chunks(docs, max_tokens: int = DEFAULT_MAX_TOKENS,
+                overlap_tokens: int = DEFAULT_OVERLAP_TOKENS) -> Iterator[Tuple[Dict, Dict]]:
+    for doc in docs:
+        for chunk in chunk_document(doc, max_tokens, overlap_tokens):
+            yield doc, chunk
+
+def main():
+    parser = argparse.ArgumentParser(description="Show how the corpus would be chunked for embedding")
+    parser.add_argument("--dataset", type=pathlib.Path, default=pathlib.Path("dataset"))
+    parser.add_argument("--max-tokens", type=int, default=DEFAULT_MAX_TOKENS)
+    parser.add_argument("--overlap-tokens", type=int, default=DEFAULT_OVERLAP_TOKENS)
+    args = parser.parse_args()
+
+    with CorpusReader(args.dataset) as reader:
+        counts = []
+        sizes = []
+        for doc in reader.iter():
+            chunks = chunk_document(doc, args.max_tokens, args.overlap_tokens)
+            counts.append(len(chunks))
+            sizes.extend(estimate_tokens(c["text"]) for c in chunks)
+    if not counts:
+        print("no documents")
+        return
+    print(f"{len(counts)} documents -> {sum(counts)} chunks "
+          f"(max {max(counts)} per document), tokens per chunk: "
+          f"mean {sum(sizes) / len(sizes):.0f}, max {max(sizes)}")
+
+if __name__ == "__main__":
+    main()
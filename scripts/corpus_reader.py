@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Random-access reader for the corpus written by normalize_and_build_dataset.py.
+
+Opens dataset/manifest.json and the index it names (id -> shard, byte
+offset, length, plus date/source/tags/title/url/language columns) and fetches rows on
+demand, so a caller never has to parse the whole corpus to reach a few
+documents:
+
+  reader = CorpusReader()                    # dataset/ by default
+  reader.get("mh-20100718-hacking-a-metaphor-in-five-steps")
+  for doc in reader.iter(lambda m: "AI" in m["tags"]): ...
+  for doc in reader.slice("2019", "2020-06"):  # inclusive, prefix-aware bounds
+  reader.meta(doc_id)                        # index columns only, no text
+
+Uncompressed shards are memory-mapped and a get() decodes a single line.
+Compressed shards (.gz / .zst) cannot be seeked into; each one is decompressed
+into memory the first time one of its rows is requested.
+
+If the index is missing (e.g. a corpus.jsonl from before it existed) the
+shards are scanned once to rebuild it in memory.
+
+Usage:
+  python scripts/corpus_reader.py <id>                   # print one document
+  python scripts/corpus_reader.py --from 2019 --to 2019  # ids/titles in range
+  python scripts/corpus_reader.py --source Medium --tag AI
+
+Dependencies:
+  pip install zstandard   # only for .zst shards
+"""
+from __future__ import annotations
+import argparse
+import bisect
+import gzip
+import json
+import mmap
+import pathlib
+from typing import Any, Callable, Dict, Iterator, Optional
+
+REPO = pathlib.Path(".").resolve()
+DATASET = REPO / "dataset"
+
+META_COLUMNS = ("date", "source", "tags", "title", "url", "language")
+
+class CorpusReader:
+    def __init__(self, dataset_dir: pathlib.Path = DATASET, manifest_name: str = "manifest.json"):
+        self.dir = pathlib.Path(dataset_dir)
+        manifest = json.loads((self.dir / manifest_name).read_text(encoding="utf-8"))
+        index_path = self.dir / manifest.get("index", "corpus.index.json")
+        if manifest.get("index") and index_path.exists():
+            self.index = json.loads(index_path.read_text(encoding="utf-8"))
+        else:
+            shards = [s["path"] for s in manifest.get("shards", [{"path": "corpus.jsonl"}])]
+            self.index = self._scan(shards)
+        self.shards: list[str] = self.index["shards"]
+        self.ids: list[str] = self.index["ids"]
+        self.positions = {doc_id: i for i, doc_id in enumerate(self.ids)}
+        # positions ordered by date for slice(); the corpus is written in date
+        # order, so this is usually the identity
+        self.by_date = sorted(range(len(self.ids)), key=lambda i: self.index["date"][i] or "")
+        self.sorted_dates = [self.index["date"][i] or "" for i in self.by_date]
+        self._buffers: dict[int, Any] = {}
+        self._files: list = []
+
+    def __enter__(self) -> "CorpusReader":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def close(self):
+        for buf in self._buffers.values():
+            if isinstance(buf, mmap.mmap):
+                buf.close()
+        for fh in self._files:
+            fh.close()
+        self._buffers = {}
+        self._files = []
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.positions
+
+    def _scan(self, shards: list[str]) -> dict:
+        index: dict[str, list] = {k: [] for k in ("ids", "shard", "offset", "length", *META_COLUMNS)}
+        for n, name in enumerate(shards):
+            data = self._read_shard(name)
+            offset = 0
+            for line in data.splitlines(keepends=True):
+                if line.strip():
+                    row = json.loads(line)
+                    index["ids"].append(row["id"])
+                    index["shard"].append(n)
+                    index["offset"].append(offset)
+                    index["length"].append(len(line))
+                    for col in META_COLUMNS:
+                        index[col].append(row.get(col))
+                offset += len(line)
+        return {"version": 1, "shards": shards, **index}
+
+    def _read_shard(self, name: str) -> bytes:
+        raw = (self.dir / name).read_bytes()
+        if name.endswith(".gz"):
+            return gzip.decompress(raw)
+        if name.endswith(".zst"):
+            import zstandard
+            return zstandard.ZstdDecompressor().decompressobj().decompress(raw)
+        return raw
+
+    def _buffer(self, shard: int):
+        buf = self._buffers.get(shard)
+        if buf is None:
+            name = self.shards[shard]
+            if name.endswith((".gz", ".zst")):
+                buf = self._read_shard(name)
+            else:
+                fh = (self.dir / name).open("rb")
+                self._files.append(fh)
+                buf = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+            self._buffers[shard] = buf
+        return buf
+
+    def _row(self, pos: int) -> Dict[str, Any]:
+        offset = self.index["offset"][pos]
+        buf = self._buffer(self.index["shard"][pos])
+        return json.loads(buf[offset:offset + self.index["length"][pos]])
+
+    def meta(self, doc_id: str) -> Dict[str, Any]:
+        """Index columns for doc_id, without touching the shard."""
+        pos = self.positions[doc_id]
+        return {"id": doc_id, **{col: self.index[col][pos] for col in META_COLUMNS if col in self.index}}
+
+    def get(self, doc_id: str, default: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Full row for doc_id, or default if the id is not in the corpus."""
+        pos = self.positions.get(doc_id)
+        return default if pos is None else self._row(pos)
+
+    def iter(self, filter: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Iterator[Dict[str, Any]]:
+        """Yield rows in corpus order; filter() sees meta() only, so skipped rows are never decoded."""
+        for pos, doc_id in enumerate(self.ids):
+            if filter is None or filter(self.meta(doc_id)):
+                yield self._row(pos)
+
+    def slice(self, date_from: str = "", date_to: str = "") -> Iterator[Dict[str, Any]]:
+        """Yield rows with date_from <= date <= date_to in date order.
+
+        Bounds compare as ISO prefixes, so slice("2019", "2019") is all of 2019.
+        An empty bound is open; undated rows only match an open date_from.
+        """
+        lo = bisect.bisect_left(self.sorted_dates, date_from)
+        hi = bisect.bisect_right(self.sorted_dates, date_to + "\uffff") if date_to else len(self.by_date)
+        for k in range(lo, hi):
+            yield self._row(self.by_date[k])
+
+def main():
+    parser = argparse.ArgumentParser(description="Look up documents in dataset/ without loading the whole corpus")
+    parser.add_argument("ids", nargs="*", help="document ids to print as JSON")
+    parser.add_argument("--dataset", type=pathlib.Path, default=DATASET)
+    parser.add_argument("--from", dest="date_from", default="")
+    parser.add_argument("--to", dest="date_to", default="")
+    parser.add_argument("--source")
+    parser.add_argument("--tag")
+    args = parser.parse_args()
+
+    with CorpusReader(args.dataset) as reader:
+        if args.ids:
+            for doc_id in args.ids:
+                doc = reader.get(doc_id)
+                if doc is None:
+                    print(f"[WARN] not found: {doc_id}")
+                else:
+                    print(json.dumps(doc, ensure_ascii=False, indent=2))
+            return
+        def keep(m: Dict[str, Any]) -> bool:
+            return ((not args.source or m["source"] == args.source)
+                    and (not args.tag or args.tag in (m["tags"] or [])))
+        if args.date_from or args.date_to:
+            docs = (d for d in reader.slice(args.date_from, args.date_to) if keep(d))
+        else:
+            docs = reader.iter(keep)
+        for doc in docs:
+            print(f"{doc['id']}\t{doc['date']}\t{doc['source']}\t{doc['title']}")
+
+if __name__ == "__main__":
+    main()
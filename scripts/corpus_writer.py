@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Streaming, optionally sharded and compressed writer for dataset/corpus*.jsonl.
+
+Rows are written one at a time into a private staging directory next to the
+output. Nothing a reader can see changes until commit():
+
+  1. every finished shard is moved into dataset/ under a content-addressed
+     name, its logical name plus the first 16 hex digits of its sha256
+     (corpus.3f2a9c0e5b7d1a64.jsonl), so publishing never overwrites a file
+     an existing manifest points to; corpus.index.json is published the same
+     way (corpus.index.<hash>.json)
+  2. manifest.json, listing each shard's path (the hashed file), name, row
+     count, size and sha256 plus the index file, is written to a temp file
+     and moved into place: that os.replace is the single commit point
+  3. each shard is then linked to its stable name (corpus.jsonl,
+     corpus-2019.jsonl, ...; atomic per file) for readers and links that
+     do not go through the manifest
+  4. shards, stable names and the index of the previous manifest that the
+     new one no longer uses are removed
+
+A reader that opens manifest.json therefore always gets a complete,
+consistent set of shards and an index whose offsets match them, old or new,
+as long as it opens them before the next commit deletes the old ones; a
+reader opening a single stable name never sees it half-written.
+
+The index has one entry per row in write order, stored column-wise:
+  ids, shard (position in "shards"), offset, length (bytes in the uncompressed
+  shard), and the metadata columns in INDEX_COLUMNS (date, source, tags, ...).
+scripts/corpus_reader.py uses it for random access by id or date range.
+
+Shard layouts (shard_by), by stable name:
+  none  corpus.jsonl                       (the historical single file)
+  year  corpus-2010.jsonl, corpus-2011.jsonl, ... (corpus-undated.jsonl)
+  size  corpus-00001.jsonl, corpus-00002.jsonl, ... rolled at shard_size bytes
+        of uncompressed JSONL
+
+Compression (compress): none, gzip (stdlib, mtime=0 so output is
+reproducible) or zstd (requires `pip install zstandard`); adds .gz / .zst.
+"""
+from __future__ import annotations
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import tempfile
+
+SHARD_BY = ("none", "year", "size")
+COMPRESSION = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+DEFAULT_SHARD_SIZE = 64 * 1024 * 1024
+INDEX_VERSION = 1
+# hex digits of a file's sha256 in its published name
+HASH_CHARS = 16
+INDEX_COLUMNS = ("date", "source", "tags", "title", "url", "language")
+
+class _HashingFile:
+    """Binary file wrapper that tracks sha256 and size of what is written."""
+
+    def __init__(self, path: pathlib.Path):
+        self.fh = path.open("wb")
+        self.sha = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data) -> int:
+        self.sha.update(data)
+        self.size += len(data)
+        return self.fh.write(data)
+
+    def flush(self):
+        self.fh.flush()
+
+    def close(self):
+        if not self.fh.closed:
+            self.fh.flush()
+            os.fsync(self.fh.fileno())
+            self.fh.close()
+
+    @property
+    def closed(self) -> bool:
+        return self.fh.closed
+
+class _Shard:
+    def __init__(self, name: str, staging: pathlib.Path, compress: str):
+        self.name = name
+        self.path = staging / name
+        self.raw = _HashingFile(self.path)
+        if compress == "gzip":
+            self.stream = gzip.GzipFile(filename="", mode="wb", fileobj=self.raw, mtime=0)
+        elif compress == "zstd":
+            import zstandard
+            self.stream = zstandard.ZstdCompressor(level=10).stream_writer(self.raw, closefd=False)
+        else:
+            self.stream = self.raw
+        self.rows = 0
+        self.uncompressed = 0
+
+    def write(self, data: bytes) -> int:
+        """Write one encoded row; return its offset in the uncompressed shard."""
+        offset = self.uncompressed
+        self.stream.write(data)
+        self.rows += 1
+        self.uncompressed += len(data)
+        return offset
+
+    def close(self) -> dict:
+        if self.stream is not self.raw:
+            self.stream.close()
+        self.raw.close()
+        return {
+            "name": self.name,
+            "rows": self.rows,
+            "bytes": self.raw.size,
+            "uncompressed_bytes": self.uncompressed,
+            "sha256": self.raw.sha.hexdigest(),
+        }
+
+class CorpusWriter:
+    """Stream corpus rows into shards under out_dir and publish them atomically.
+
+    Use as a context manager: rows written inside the block are published by
+    commit() on success and discarded if the block raises.
+    """
+
+    def __init__(self, out_dir: pathlib.Path, manifest_name: str = "manifest.json",
+                 shard_by: str = "none", shard_size: int = DEFAULT_SHARD_SIZE,
+                 compress: str = "none", prefix: str = "corpus",
+                 index_name: str | None = "corpus.index.json"):
+        if shard_by not in SHARD_BY:
+            raise ValueError(f"unknown shard_by: {shard_by}")
+        if compress not in COMPRESSION:
+            raise ValueError(f"unknown compression: {compress}")
+        if compress == "zstd":
+            import zstandard  # noqa: F401  (fail before writing anything)
+        self.out_dir = out_dir
+        self.manifest_path = out_dir / manifest_name
+        self.index_name = index_name
+        self.shard_by = shard_by
+        self.shard_size = shard_size
+        self.compress = compress
+        self.prefix = prefix
+        self.staging = pathlib.Path(tempfile.mkdtemp(prefix=f".{prefix}-staging-", dir=out_dir))
+        self.open: dict[str, _Shard] = {}
+        self.done: list[dict] = []
+        self.size_seq = 0
+        self.index: dict[str, list] = {k: [] for k in ("ids", "shard", "offset", "length", *INDEX_COLUMNS)}
+
+    def __enter__(self) -> "CorpusWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+        return False
+
+    def _shard_name(self, row: dict) -> str:
+        ext = ".jsonl" + COMPRESSION[self.compress]
+        if self.shard_by == "none":
+            return f"{self.prefix}{ext}"
+        if self.shard_by == "year":
+            year = (row.get("date") or "")[:4]
+            return f"{self.prefix}-{year if year.isdigit() else 'undated'}{ext}"
+        return f"{self.prefix}-{self.size_seq:05d}{ext}"
+
+    def _shard_for(self, row: dict) -> _Shard:
+        if self.shard_by == "size":
+            current = self.open.get("size")
+            if current is None or current.uncompressed >= self.shard_size:
+                if current is not None:
+                    self.done.append(current.close())
+                self.size_seq += 1
+                current = self.open["size"] = _Shard(self._shard_name(row), self.staging, self.compress)
+            return current
+        name = self._shard_name(row)
+        shard = self.open.get(name)
+        if shard is None:
+            shard = self.open[name] = _Shard(name, self.staging, self.compress)
+        return shard
+
+    def write(self, row: dict) -> tuple[str, int, int]:
+        """Append one row; return (shard name, offset, length) in uncompressed bytes."""
+        data = (json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8")
+        shard = self._shard_for(row)
+        offset = shard.write(data)
+        if self.index_name:
+            self.index["ids"].append(row.get("id"))
+            self.index["shard"].append(shard.name)
+            self.index["offset"].append(offset)
+            self.index["length"].append(len(data))
+            for col in INDEX_COLUMNS:
+                self.index[col].append(row.get(col))
+        return shard.name, offset, len(data)
+
+    def commit(self, manifest: dict | None = None) -> dict:
+        """Publish all shards and the index, then manifest.json; return the manifest written."""
+        for shard in self.open.values():
+            self.done.append(shard.close())
+        self.open = {}
+        previous = self._previous_files()
+        shards = []
+        for s in sorted(self.done, key=lambda s: s["name"]):
+            path = hashed_name(s["name"], s["sha256"])
+            os.replace(self.staging / s["name"], self.out_dir / path)
+            shards.append({"path": path, **s})
+        out = dict(manifest or {})
+        out.setdefault("generated_at", datetime.datetime.utcnow().isoformat() + "Z")
+        out.setdefault("n_documents", sum(s["rows"] for s in shards))
+        out["shard_by"] = self.shard_by
+        out["compression"] = self.compress
+        out["shards"] = shards
+        if self.index_name:
+            position = {s["name"]: i for i, s in enumerate(shards)}
+            index = {"version": INDEX_VERSION, "shards": [s["path"] for s in shards], **self.index}
+            index["shard"] = [position[name] for name in self.index["shard"]]
+            text = json.dumps(index, ensure_ascii=False, separators=(",", ":"))
+            out["index"] = hashed_name(self.index_name, hashlib.sha256(text.encode("utf-8")).hexdigest())
+            write_atomic(self.out_dir / out["index"], text)
+        # commit point: readers switch to the new shards and index here
+        write_atomic(self.manifest_path, json.dumps(out, ensure_ascii=False, indent=2))
+        for s in shards:
+            link_atomic(self.out_dir / s["path"], self.out_dir / s["name"])
+        current = {s["path"] for s in shards} | {s["name"] for s in shards} | {out.get("index")}
+        for name in previous - current:
+            (self.out_dir / name).unlink(missing_ok=True)
+        shutil.rmtree(self.staging, ignore_errors=True)
+        return out
+
+    def abort(self):
+        for shard in self.open.values():
+            shard.close()
+        self.open = {}
+        shutil.rmtree(self.staging, ignore_errors=True)
+
+    def _previous_files(self) -> set[str]:
+        """Shard paths, stable names and index file of the manifest being replaced."""
+        try:
+            old = json.loads(self.manifest_path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return set()
+        # manifests written before sharding existed always meant corpus.jsonl
+        files = set()
+        for s in old.get("shards", [{"path": f"{self.prefix}.jsonl"}]):
+            files.add(s["path"])
+            files.add(s.get("name", s["path"]))
+        if old.get("index"):
+            files.add(old["index"])
+        return files
+
+def hashed_name(name: str, sha256: str) -> str:
+    """corpus-2019.jsonl.gz -> corpus-2019.<first HASH_CHARS of sha256>.jsonl.gz"""
+    cut = name.rfind(".json")
+    if cut == -1:
+        cut = len(name)
+    return f"{name[:cut]}.{sha256[:HASH_CHARS]}{name[cut:]}"
+
+def link_atomic(src: pathlib.Path, dst: pathlib.Path):
+    """Make dst a hard link to (or, where links are unsupported, a copy of) src via os.replace."""
+    tmp = dst.with_name(f".{dst.name}.{os.getpid()}.tmp")
+    tmp.unlink(missing_ok=True)
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+def write_atomic(path: pathlib.Path, text: str):
+    """Write text to path via a temp file in the same directory and os.replace."""
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", dir=path.parent)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            # mkstemp creates 0600; published files stay world-readable like the shards
+            os.fchmod(fh.fileno(), 0o644)
+            fh.write(text)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        pathlib.Path(tmp).unlink(missing_ok=True)
+        raise
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Concurrent, token-budgeted batch scheduler for embedding requests.
+
+Used by build_embeddings.py in place of fixed 100-text batches sent one after
+another:
+
+  - pack_batches() groups texts so each request stays under a token budget
+    (estimated as len/4) and an input-count cap, in input order
+  - EmbeddingScheduler keeps up to `concurrency` requests in flight on a
+    thread pool; the limit adapts AIMD-style: +1 per window of successful
+    requests, halved on HTTP 429, and every worker pauses for Retry-After
+  - results are handed to a callback as each batch completes, so the caller
+    can stream them to disk instead of holding the whole run in memory
+  - failed requests are retried with exponential backoff; a batch that still
+    fails is bisected down to the offending text, which is reported instead
+    of being replaced by a placeholder vector (unless the provider looks down,
+    see OUTAGE_THRESHOLD)
+
+The OpenAI client should be created with max_retries=0 so 429s reach the
+scheduler instead of being retried (and slept on) inside the client.
+
+Usage (throughput against fake_embeddings_server.py with injected latency):
+  python scripts/fake_embeddings_server.py --latency-ms 200 --max-concurrent 8 &
+  OPENAI_API_KEY=local python scripts/embed_scheduler.py --api-base http://127.0.0.1:8765/v1 \\
+      --docs 2000 --concurrency 1 4 16
+
+Dependencies:
+  pip install openai
+"""
+from __future__ import annotations
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import openai
+
+DEFAULT_BATCH_TOKENS = 100_000
+DEFAULT_BATCH_INPUTS = 256
+DEFAULT_CONCURRENCY = 4
+DEFAULT_MAX_CONCURRENCY = 16
+MAX_RATE_LIMIT_RETRIES = 8
+DEFAULT_RETRY_AFTER = 1.0
+DEFAULT_RETRIES = 3
+RETRY_BACKOFF = 0.5
+# batches in a row failing on transient errors (after retries) before the
+# provider is treated as down: the rest is skipped instead of bisected, so an
+# outage costs a handful of requests and --resume picks up from there
+OUTAGE_THRESHOLD = 5
+
+# errors retrying cannot fix: bad input may be one text (bisect), auth is all of them
+INPUT_ERRORS = (openai.BadRequestError, openai.UnprocessableEntityError)
+FATAL_ERRORS = (openai.AuthenticationError, openai.PermissionDeniedError, openai.NotFoundError)
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English prose)."""
+    return len(text) // 4 + 1
+
+def pack_batches(texts: Sequence[str], indices: Optional[Sequence[int]] = None,
+                 max_tokens: int = DEFAULT_BATCH_TOKENS,
+                 max_inputs: int = DEFAULT_BATCH_INPUTS) -> List[List[int]]:
+    """Group text indices into batches under max_tokens / max_inputs.
+
+    A single text over the budget gets a batch of its own.
+    """
+    batches: List[List[int]] = []
+    current: List[int] = []
+    budget = 0
+    for i in (range(len(texts)) if indices is None else indices):
+        tokens = estimate_tokens(texts[i])
+        if current and (budget + tokens > max_tokens or len(current) >= max_inputs):
+            batches.append(current)
+            current, budget = [], 0
+        current.append(i)
+        budget += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+def retry_after_seconds(exc: Exception) -> float:
+    """Delay requested by a 429 response (retry-after-ms / Retry-After), or a default."""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return DEFAULT_RETRY_AFTER
+
+class AdaptiveConcurrency:
+    """AIMD in-flight limit shared by the scheduler's workers."""
+
+    def __init__(self, initial: int, maximum: int, minimum: int = 1):
+        self.minimum = minimum
+        self.maximum = max(maximum, minimum)
+        self.limit = float(min(max(initial, minimum), self.maximum))
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.cond = threading.Condition()
+        self.peak = int(self.limit)
+
+    def acquire(self):
+        with self.cond:
+            while True:
+                delay = self.paused_until - time.monotonic()
+                if delay > 0:
+                    self.cond.wait(delay)
+                elif self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return
+                else:
+                    self.cond.wait()
+
+    def release(self, rate_limited: bool = False, retry_after: float = 0.0):
+        with self.cond:
+            self.in_flight -= 1
+            if rate_limited:
+                self.limit = max(self.minimum, self.limit / 2)
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+            else:
+                # +1 after roughly `limit` successes
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+                self.peak = max(self.peak, int(self.limit))
+            self.cond.notify_all()
+
+class EmbeddingScheduler:
+    def __init__(self, client: openai.OpenAI, model: str,
+                 concurrency: int = DEFAULT_CONCURRENCY,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 max_tokens: int = DEFAULT_BATCH_TOKENS,
+                 max_inputs: int = DEFAULT_BATCH_INPUTS,
+                 retries: int = DEFAULT_RETRIES,
+                 bisect: bool = True):
+        self.client = client
+        self.model = model
+        self.max_tokens = max_tokens
+        self.max_inputs = max_inputs
+        self.retries = retries
+        self.bisect = bisect
+        self.limiter = AdaptiveConcurrency(concurrency, max_concurrency)
+        self.stats: Dict[str, float] = {"requests": 0, "rate_limited": 0, "retried": 0, "bisected": 0,
+                                        "failed_batches": 0, "inputs": 0, "tokens": 0, "seconds": 0.0}
+        self.lock = threading.Lock()
+        self.consecutive_failures = 0
+        self.outage = False
+
+    def _count(self, **delta):
+        with self.lock:
+            for k, v in delta.items():
+                self.stats[k] += v
+
+    def _embed(self, texts: List[str]) -> Tuple[Optional[List[List[float]]], str, bool]:
+        """Return (vectors, "", False) or (None, error, splittable).
+
+        429s wait for Retry-After and do not count as attempts; other errors
+        are retried with exponential backoff, except those that will not change
+        on retry (bad input, auth). splittable says whether the failure may be
+        caused by one of the inputs, i.e. whether bisecting the batch can help.
+        """
+        attempt = 0
+        rate_limited = 0
+        while True:
+            if self.outage:
+                return None, "skipped: provider failing repeatedly", False
+            self.limiter.acquire()
+            try:
+                response = self.client.embeddings.create(model=self.model, input=texts)
+            except openai.RateLimitError as e:
+                self.limiter.release(rate_limited=True, retry_after=retry_after_seconds(e))
+                self._count(requests=1, rate_limited=1)
+                rate_limited += 1
+                if rate_limited > MAX_RATE_LIMIT_RETRIES:
+                    return None, f"still rate limited after {MAX_RATE_LIMIT_RETRIES} retries", False
+                continue
+            except FATAL_ERRORS as e:
+                self.limiter.release()
+                self._count(requests=1)
+                return None, f"{type(e).__name__}: {e}", False
+            except INPUT_ERRORS as e:
+                self.limiter.release()
+                self._count(requests=1)
+                return None, f"{type(e).__name__}: {e}", True
+            except Exception as e:
+                self.limiter.release()
+                self._count(requests=1)
+                if attempt >= self.retries:
+                    with self.lock:
+                        self.consecutive_failures += 1
+                        if self.consecutive_failures >= OUTAGE_THRESHOLD and not self.outage:
+                            self.outage = True
+                            print(f"ERROR: {OUTAGE_THRESHOLD} batches in a row failed; skipping the rest")
+                    return None, f"{type(e).__name__}: {e}", True
+                self._count(retried=1)
+                time.sleep(RETRY_BACKOFF * 2 ** attempt)
+                attempt += 1
+                continue
+            self.limiter.release()
+            with self.lock:
+                self.consecutive_failures = 0
+            self._count(requests=1, inputs=len(texts), tokens=sum(estimate_tokens(t) for t in texts))
+            return [d.embedding for d in sorted(response.data, key=lambda d: d.index)], "", False
+
+    def run(self, texts: Sequence[str], indices: Optional[Sequence[int]],
+            on_batch: Callable[[List[int], List[List[float]]], None],
+            on_failed: Optional[Callable[[List[int], str], None]] = None) -> Dict[str, float]:
+        """Embed texts[i] for i in indices (all if None); return throughput stats.
+
+        on_batch(batch, vectors) is called as each batch completes. A batch
+        that still fails after retries is split in half and both halves are
+        resubmitted, down to single texts, so one bad input only loses itself;
+        what cannot be embedded is passed to on_failed(batch, error).
+        """
+        batches = pack_batches(texts, indices, self.max_tokens, self.max_inputs)
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.limiter.maximum) as pool:
+            pending = {pool.submit(self._embed, [texts[i] for i in b]): b for b in batches}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch = pending.pop(future)
+                    vectors, error, splittable = future.result()
+                    if vectors is not None:
+                        on_batch(batch, vectors)
+                    elif splittable and self.bisect and len(batch) > 1:
+                        self._count(bisected=1)
+                        mid = len(batch) // 2
+                        for half in (batch[:mid], batch[mid:]):
+                            pending[pool.submit(self._embed, [texts[i] for i in half])] = half
+                    else:
+                        self._count(failed_batches=1)
+                        if not self.outage:
+                            print(f"ERROR getting embeddings for batch of {len(batch)}: {error}")
+                        if on_failed is not None:
+                            on_failed(batch, error)
+        self.stats["seconds"] = time.perf_counter() - t0
+        self.stats["batches"] = len(batches)
+        self.stats["peak_concurrency"] = self.limiter.peak
+        self.stats["final_concurrency"] = int(self.limiter.limit)
+        return self.stats
+
+def format_stats(stats: Dict[str, float]) -> str:
+    secs = max(stats["seconds"], 1e-9)
+    return (f"{int(stats['inputs'])} inputs in {int(stats.get('batches', 0))} batches, "
+            f"{stats['seconds']:.2f}s, {stats['inputs'] / secs:.1f} inputs/s, "
+            f"{stats['tokens'] / secs:.0f} tokens/s, {int(stats['requests'])} requests, "
+            f"{int(stats['rate_limited'])} rate limited, {int(stats['retried'])} retried, "
+            f"{int(stats['bisected'])} bisected, {int(stats['failed_batches'])} failed, "
+            f"concurrency peak {int(stats.get('peak_concurrency', 0))}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure embedding throughput with synthetic texts")
+    parser.add_argument("--api-base", default=os.getenv("OPENAI_BASE_URL"))
+    parser.add_argument("--model", default="text-embedding-3-small")
+    parser.add_argument("--docs", type=int, default=1000)
+    parser.add_argument("--chars", type=int, default=4000, help="characters per synthetic text")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, DEFAULT_CONCURRENCY])
+    parser.add_argument("--max-concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY)
+    parser.add_argument("--batch-tokens", type=int, default=DEFAULT_BATCH_TOKENS)
+    parser.add_argument("--batch-inputs", type=int, default=DEFAULT_BATCH_INPUTS)
+    args = parser.parse_args()
+
+    client = openai.OpenAI(base_url=args.api_base, max_retries=0)
+    words = "metaphor frame model language thought science hacking".split()
+    texts = [" ".join(words[(i + k) % len(words)] for k in range(args.chars // 8)) + f" {i}"
+             for i in range(args.docs)]
+    for c in args.concurrency:
+        sched = EmbeddingScheduler(client, args.model, c, max(c, args.max_concurrency) if c > 1 else 1,
+                                   args.batch_tokens, args.batch_inputs)
+        stats = sched.run(texts, None, lambda batch, vectors: None)
+        print(f"concurrency {c:3d}: {format_stats(stats)}")
+
+if __name__ == "__main__":
+    main()
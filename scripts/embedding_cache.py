@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Persistent embedding store for build_embeddings.py.
+
+Vectors are keyed by (model, sha256 of the exact input text), so a document
+is only sent to the provider again when the text that would be embedded (or
+the model) changes. Renames, reordering and unrelated edits elsewhere in the
+corpus are all cache hits.
+
+Stored as dataset/embedding_cache.jsonl, one entry per line:
+  {"model": ..., "sha256": ..., "dim": N, "embedding": "<base64 float32 LE>"}
+Base64 float32 keeps the file ~4x smaller than JSON floats and round-trips
+the provider's vectors exactly.
+
+save() keeps only the entries looked up or stored during the run, so vectors
+for deleted or edited documents (and for models no longer used) are garbage
+collected; pass keep_unused=True to keep everything. With full=True the
+file is still loaded but lookups always miss, so every text is embedded
+again while a save(keep_unused=True) keeps what was there.
+
+Dependencies:
+  pip install numpy
+"""
+from __future__ import annotations
+import base64
+import hashlib
+import json
+import os
+import pathlib
+import sys
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def encode_vector(vector) -> str:
+    return base64.b64encode(np.asarray(vector, dtype="<f4").tobytes()).decode("ascii")
+
+def decode_vector(data: str) -> List[float]:
+    return np.frombuffer(base64.b64decode(data), dtype="<f4").tolist()
+
+class EmbeddingCache:
+    def __init__(self, path: pathlib.Path, full: bool = False):
+        self.path = path
+        self.entries: Dict[Tuple[str, str], str] = {}
+        self.used: Dict[Tuple[str, str], str] = {}
+        self.hits = 0
+        self.misses = 0
+        self.full = full
+        if not path.exists():
+            return
+        with path.open("r", encoding="utf-8") as f:
+            for n, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                    self.entries[(entry["model"], entry["sha256"])] = entry["embedding"]
+                except Exception as e:
+                    print(f"[WARN] skipping bad cache line {path.name}:{n}: {e}", file=sys.stderr)
+
+    def lookup(self, model: str, text: str) -> Optional[List[float]]:
+        key = (model, text_key(text))
+        data = None if self.full else self.entries.get(key)
+        if data is None:
+            self.misses += 1
+            return None
+        self.used[key] = data
+        self.hits += 1
+        return decode_vector(data)
+
+    def store(self, model: str, text: str, vector: List[float]):
+        key = (model, text_key(text))
+        self.entries[key] = self.used[key] = encode_vector(vector)
+
+    def save(self, keep_unused: bool = False) -> int:
+        """Write the cache atomically; return the number of entries dropped."""
+        keep = self.entries if keep_unused else self.used
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            for (model, sha), data in keep.items():
+                dim = len(base64.b64decode(data)) // 4
+                f.write(json.dumps({"model": model, "sha256": sha, "dim": dim, "embedding": data}) + "\n")
+        os.replace(tmp, self.path)
+        return len(self.entries) - len(keep)
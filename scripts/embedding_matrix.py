@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Embedding matrix written by build_embeddings.py and its loader.
+
+  dataset/embeddings.npy      one row per vector, float32 or float16, C order
+  dataset/embedding_ids.json  ids of the rows, in the same order
+
+.npy is a fixed header plus the raw array, so np.load(..., mmap_mode="r")
+maps it without copying or parsing; float16 halves the size again at a
+precision that is ample for cosine similarity. Vectors are stored as
+returned by the provider (not re-normalized).
+
+Usage (from other scripts):
+  from embedding_matrix import load_embeddings
+  ids, matrix = load_embeddings()          # matrix is a read-only np.memmap
+
+  python scripts/embedding_matrix.py                  # shape / dtype / size
+  python scripts/embedding_matrix.py --jsonl out.jsonl  # export {"id", "embedding"} lines
+
+Dependencies:
+  pip install numpy
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import pathlib
+from typing import List, Sequence, Tuple
+import numpy as np
+
+REPO = pathlib.Path(".").resolve()
+DATASET = REPO / "dataset"
+EMBEDDINGS_NPY = "embeddings.npy"
+EMBEDDING_IDS = "embedding_ids.json"
+DTYPES = {"float32": np.float32, "float16": np.float16}
+
+class MatrixWriter:
+    """Fill an (n, dim) .npy row by row through a memmap, then publish it with os.replace."""
+
+    def __init__(self, dataset_dir: pathlib.Path, ids: Sequence[str], dim: int, dtype: str = "float32"):
+        self.path = pathlib.Path(dataset_dir) / EMBEDDINGS_NPY
+        self.ids_path = pathlib.Path(dataset_dir) / EMBEDDING_IDS
+        self.ids = list(ids)
+        self.tmp = self.path.with_name(self.path.name + ".tmp")
+        self.matrix = np.lib.format.open_memmap(self.tmp, mode="w+", dtype=DTYPES[dtype],
+                                                shape=(len(self.ids), dim))
+
+    def __enter__(self) -> "MatrixWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            del self.matrix
+            self.tmp.unlink(missing_ok=True)
+        return False
+
+    def write(self, row: int, vector) -> None:
+        self.matrix[row] = vector
+
+    def commit(self) -> None:
+        self.matrix.flush()
+        del self.matrix
+        os.replace(self.tmp, self.path)
+        tmp_ids = self.ids_path.with_name(self.ids_path.name + ".tmp")
+        tmp_ids.write_text(json.dumps(self.ids, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_ids, self.ids_path)
+
+def load_embeddings(dataset_dir: pathlib.Path = DATASET, mmap: bool = True) -> Tuple[List[str], np.ndarray]:
+    """Return (ids, matrix); with mmap=True the matrix is a zero-copy read-only memmap."""
+    dataset_dir = pathlib.Path(dataset_dir)
+    ids = json.loads((dataset_dir / EMBEDDING_IDS).read_text(encoding="utf-8"))
+    matrix = np.load(dataset_dir / EMBEDDINGS_NPY, mmap_mode="r" if mmap else None)
+    if len(ids) != matrix.shape[0]:
+        raise ValueError(f"{EMBEDDING_IDS} has {len(ids)} ids but {EMBEDDINGS_NPY} has {matrix.shape[0]} rows")
+    return ids, matrix
+
+def export_jsonl(ids: Sequence[str], matrix: np.ndarray, path: pathlib.Path, chunk: int = 1024) -> None:
+    """Write {"id", "embedding"} lines (the format build_embeddings.py used to produce)."""
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        for start in range(0, len(ids), chunk):
+            rows = np.asarray(matrix[start:start + chunk], dtype=np.float32).tolist()
+            for doc_id, vector in zip(ids[start:start + chunk], rows):
+                f.write(json.dumps({"id": doc_id, "embedding": vector}, ensure_ascii=False) + "\n")
+    os.replace(tmp, path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or export dataset/embeddings.npy")
+    parser.add_argument("--dataset", type=pathlib.Path, default=DATASET)
+    parser.add_argument("--jsonl", type=pathlib.Path, help="export the matrix as JSONL to this path")
+    args = parser.parse_args()
+
+    ids, matrix = load_embeddings(args.dataset)
+    print(f"{matrix.shape[0]} x {matrix.shape[1]} {matrix.dtype}, "
+          f"{matrix.nbytes / 2**20:.1f} MB ({args.dataset / EMBEDDINGS_NPY})")
+    if args.jsonl:
+        export_jsonl(ids, matrix, args.jsonl)
+        print(f"Exported {len(ids)} rows to {args.jsonl}")
+
+if __name__ == "__main__":
+    main()
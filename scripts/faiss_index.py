@@ -0,0 +1,525 @@
+#!/usr/bin/env python3
+"""
+FAISS index builders for the embedding matrix, with automatic selection and
+a recall / latency benchmark.
+
+All indexes use inner product on L2-normalized vectors (cosine similarity),
+like the original IndexFlatIP:
+
+  flat      exact brute force; best under ~20k vectors
+  hnsw      graph index (IndexHNSWFlat), no training, fast and accurate;
+            keeps full vectors plus ~M*8 bytes of links per vector
+  ivf-flat  inverted lists over k-means cells (IndexIVFFlat), trained on a
+            sample; full vectors, searches nprobe cells
+  ivf-pq    IVF with product-quantized codes (IndexIVFPQ); a few dozen bytes
+            per vector, lossy, for corpora that no longer fit in RAM
+  sq8       exhaustive search over int8 scalar-quantized codes
+            (IndexScalarQuantizer QT_8bit), a quarter of float32
+  binary    exhaustive Hamming search over sign bits (IndexBinaryFlat), dim/8
+            bytes per vector, a thirty-second of float32
+
+sq8 and binary are first stages: search_rescored() fetches RESCORE_FACTOR * k
+candidates from the codes and re-ranks them by exact cosine against the
+float vectors in embeddings.npy, read through the memory map, so only the
+candidates' rows are touched and the full-precision matrix can stay on disk.
+Binary indexes are saved and loaded with faiss' *_index_binary functions;
+use write_index() / read_index() here, which handle both.
+
+choose_kind() picks by vector count (AUTO_THRESHOLDS). IVF variants train on
+a random sample of at most TRAIN_PER_LIST * nlist rows, with nlist ~ 4*sqrt(n).
+
+Indexes built with labels are wrapped in IndexIDMap2, so search returns stable
+int64 labels (faiss_id(), a 63-bit hash of the document / chunk id) rather
+than positions, and vectors can be added or removed by label without a
+rebuild. HNSW cannot remove vectors: remove_labels() relabels them -1
+(tombstones), search() filters those out, and the index should be rebuilt
+once needs_compaction() says too many have piled up. IVF kinds cannot remove
+them behind an id map either: IndexIVF keeps the old internal ids in its
+inverted lists while IndexIDMap2 compacts its map, so the two drift apart.
+remove_labels() refuses them; their callers rebuild instead (new vectors can
+still be added in place, which keeps internal ids and map positions equal).
+
+Usage:
+  python scripts/faiss_index.py bench                          # every kind on dataset/embeddings.npy
+  python scripts/faiss_index.py bench --kinds flat hnsw --k 10 --queries 500
+  python scripts/faiss_index.py bench --synthetic 200000 --dim 256   # random data at a larger scale
+  python scripts/faiss_index.py bench --kinds flat sq8 binary --rescore-factor 20
+  python scripts/faiss_index.py check                          # incremental remove + add still self-match
+
+Dependencies:
+  pip install numpy faiss-cpu
+"""
+from __future__ import annotations
+import argparse
+import hashlib
+import math
+import pathlib
+import time
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+import faiss
+
+KINDS = ("flat", "hnsw", "ivf-flat", "ivf-pq", "sq8", "binary")
+# kinds whose scores are approximate enough that results should be rescored
+QUANTIZED = ("sq8", "binary")
+# kinds trained on a sample, retrained when the corpus outgrows it
+TRAINED = ("ivf-flat", "ivf-pq", "sq8")
+# kinds that cannot remove vectors in place; rebuilt instead
+IVF = ("ivf-flat", "ivf-pq")
+# (max vectors, kind) in order; the last kind covers everything larger.
+# The IVF picks are rebuilt rather than updated whenever vectors are removed.
+AUTO_THRESHOLDS = ((20_000, "flat"), (500_000, "hnsw"), (2_000_000, "ivf-flat"))
+AUTO_LARGE = "ivf-pq"
+
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 64
+TRAIN_PER_LIST = 64     # FAISS wants >= 39 training points per list
+PQ_BITS = 8
+PQ_TRAIN_PER_CENTROID = 64
+SEED = 1234
+ADD_CHUNK = 16384
+# rebuild an HNSW index once this share of its vectors are tombstones
+COMPACT_RATIO = 0.2
+TOMBSTONE = -1
+# first-stage candidates per result for the quantized kinds
+RESCORE_FACTOR = 10
+SQ8_TRAIN = 65_536
+
+def choose_kind(n: int) -> str:
+    for limit, kind in AUTO_THRESHOLDS:
+        if n <= limit:
+            return kind
+    return AUTO_LARGE
+
+def default_nlist(n: int) -> int:
+    """~4*sqrt(n) cells, but never fewer than 39 training points per cell."""
+    return max(1, min(int(4 * math.sqrt(n)), n // 39))
+
+def default_nprobe(nlist: int) -> int:
+    """Cells visited per query: an eighth of them, at least 8 and at most 64."""
+    return min(nlist, max(8, min(nlist // 8, 64)))
+
+def default_pq_m(dim: int) -> int:
+    """Sub-quantizers for IVF-PQ: the largest of 64/48/32/... that divides dim,
+    keeping at least 2 dimensions per sub-vector."""
+    for m in (64, 48, 32, 24, 16, 12, 8, 4, 2, 1):
+        if m <= max(1, dim // 2) and dim % m == 0:
+            return m
+    return 1
+
+def faiss_id(item_id: str) -> int:
+    """Stable FAISS label of a document / chunk id (63-bit blake2b, never negative)."""
+    digest = hashlib.blake2b(item_id.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") & (2 ** 63 - 1)
+
+def faiss_labels(ids: Sequence[str]) -> np.ndarray:
+    """int64 labels of ids, in order; raises ValueError on a hash collision."""
+    labels = np.fromiter((faiss_id(i) for i in ids), dtype=np.int64, count=len(ids))
+    if len(np.unique(labels)) != len(labels):
+        raise ValueError("FAISS label collision between ids")
+    return labels
+
+def normalized(rows) -> np.ndarray:
+    """float32 copy of rows with unit L2 norm (rows may be a float16 memmap slice)."""
+    x = np.array(rows, dtype=np.float32)
+    faiss.normalize_L2(x)
+    return x
+
+def binarize(x: np.ndarray) -> np.ndarray:
+    """Sign bits of each row packed into bytes, the code of the binary kind."""
+    return np.packbits(np.asarray(x) > 0, axis=1)
+
+def is_binary(index) -> bool:
+    return isinstance(index, faiss.IndexBinary)
+
+def training_sample(matrix: np.ndarray, size: int, seed: int = SEED) -> np.ndarray:
+    n = matrix.shape[0]
+    if n <= size:
+        return normalized(matrix[:])
+    rows = np.sort(np.random.default_rng(seed).choice(n, size=size, replace=False))
+    return normalized(matrix[rows])
+
+def make_index(kind: str, n: int, dim: int, nlist: Optional[int] = None,
+               pq_m: Optional[int] = None) -> faiss.Index:
+    """Empty (untrained) index of the given kind sized for n vectors."""
+    if kind == "flat":
+        return faiss.IndexFlatIP(dim)
+    if kind == "sq8":
+        return faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+    if kind == "binary":
+        if dim % 8:
+            raise ValueError(f"binary index needs a dimension divisible by 8, got {dim}")
+        return faiss.IndexBinaryFlat(dim)
+    if kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+        return index
+    nlist = nlist or default_nlist(n)
+    quantizer = faiss.IndexFlatIP(dim)
+    if kind == "ivf-flat":
+        index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+    elif kind == "ivf-pq":
+        index = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m or default_pq_m(dim), PQ_BITS,
+                                 faiss.METRIC_INNER_PRODUCT)
+        # polysemous codes only help Hamming pre-filtering, which is not used
+        index.do_polysemous_training = False
+        index.pq.cp.max_points_per_centroid = PQ_TRAIN_PER_CENTROID
+    else:
+        raise ValueError(f"unknown index kind: {kind}")
+    index.nprobe = default_nprobe(nlist)
+    return index
+
+def build_index(matrix: np.ndarray, kind: str = "auto", nlist: Optional[int] = None,
+                pq_m: Optional[int] = None, chunk: int = ADD_CHUNK,
+                labels: Optional[np.ndarray] = None) -> faiss.Index:
+    """Build an index over the rows of matrix (normalized chunk by chunk).
+
+    With labels (one int64 per row) the index is an IndexIDMap2 returning them.
+    """
+    n, dim = matrix.shape
+    if kind == "auto":
+        kind = choose_kind(n)
+    index = make_index(kind, n, dim, nlist, pq_m)
+    if kind == "sq8":
+        # per-dimension ranges; a sample is plenty
+        index.train(training_sample(matrix, SQ8_TRAIN))
+    elif not index.is_trained:
+        # PQ codebooks (2**PQ_BITS centroids per sub-quantizer) need samples too
+        size = max(TRAIN_PER_LIST * index.nlist, PQ_TRAIN_PER_CENTROID * 2 ** PQ_BITS if kind == "ivf-pq" else 0)
+        index.train(training_sample(matrix, size))
+    encode = binarize if is_binary(index) else (lambda x: x)
+    if labels is None:
+        for start in range(0, n, chunk):
+            index.add(encode(normalized(matrix[start:start + chunk])))
+        return index
+    index = faiss.IndexBinaryIDMap2(index) if is_binary(index) else faiss.IndexIDMap2(index)
+    add_rows(index, matrix, np.arange(n), labels, chunk)
+    return index
+
+def add_rows(index: faiss.Index, matrix: np.ndarray, rows: np.ndarray, labels: np.ndarray,
+             chunk: int = ADD_CHUNK) -> None:
+    """Add matrix[rows] to an id-mapped index under the given labels."""
+    encode = binarize if is_binary(index) else (lambda x: x)
+    for start in range(0, len(rows), chunk):
+        index.add_with_ids(encode(normalized(matrix[rows[start:start + chunk]])),
+                           np.ascontiguousarray(labels[start:start + chunk], dtype=np.int64))
+
+def _downcast(index):
+    return faiss.downcast_IndexBinary(index) if is_binary(index) else faiss.downcast_index(index)
+
+def _id_mapped(index) -> bool:
+    return isinstance(_downcast(index), (faiss.IndexIDMap, faiss.IndexIDMap2,
+                                         faiss.IndexBinaryIDMap, faiss.IndexBinaryIDMap2))
+
+def _inner(index: faiss.Index) -> faiss.Index:
+    index = _downcast(index)
+    if _id_mapped(index):
+        index = _downcast(index.index)
+    return index
+
+def write_index(index, path: pathlib.Path) -> None:
+    (faiss.write_index_binary if is_binary(index) else faiss.write_index)(index, str(path))
+
+def read_index(path: pathlib.Path, mmap: bool = False):
+    """Read a float or binary index; with mmap=True, map its data where the type allows."""
+    flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap else 0
+    try:
+        return faiss.read_index(str(path), flags)
+    except RuntimeError:
+        if mmap:
+            try:
+                return faiss.read_index(str(path))
+            except RuntimeError:
+                pass
+        return faiss.read_index_binary(str(path))
+
+def index_labels(index: faiss.Index) -> np.ndarray:
+    """Label of every stored vector of an id-mapped index (TOMBSTONE for removed ones)."""
+    return faiss.vector_to_array(_downcast(index).id_map)
+
+def remove_labels(index: faiss.Index, labels: Sequence[int]) -> int:
+    """Remove vectors by label from an id-mapped index; returns how many were removed.
+
+    HNSW graphs cannot drop nodes, so there the vectors stay in place with
+    their label set to TOMBSTONE. IVF indexes raise ValueError (see IVF):
+    rebuild them without the removed vectors instead.
+    """
+    labels = np.asarray(labels, dtype=np.int64)
+    if not len(labels):
+        return 0
+    index = _downcast(index)
+    if isinstance(_inner(index), faiss.IndexIVF):
+        raise ValueError(f"{index_kind(index)} index cannot remove vectors in place, rebuild it")
+    if not isinstance(_inner(index), faiss.IndexHNSW):
+        return int(index.remove_ids(faiss.IDSelectorBatch(labels)))
+    id_map = index_labels(index)
+    dead = np.isin(id_map, labels)
+    id_map[dead] = TOMBSTONE
+    faiss.copy_array_to_vector(id_map, index.id_map)
+    index.construct_rev_map()
+    return int(dead.sum())
+
+def tombstones(index: faiss.Index) -> int:
+    if not _id_mapped(index) or not isinstance(_inner(index), faiss.IndexHNSW):
+        return 0
+    return int(np.count_nonzero(index_labels(index) == TOMBSTONE))
+
+def needs_compaction(index: faiss.Index) -> bool:
+    return index.ntotal > 0 and tombstones(index) > COMPACT_RATIO * index.ntotal
+
+def search(index: faiss.Index, queries: np.ndarray, k: int):
+    """index.search() that never returns tombstoned vectors; returns (scores, labels).
+
+    queries are normalized float vectors for every kind (binarized here for
+    binary indexes, whose scores are then Hamming distances, lower is closer).
+    """
+    if is_binary(index):
+        return index.search(binarize(queries), k)
+    if not tombstones(index):
+        return index.search(queries, k)
+    alive = faiss.IDSelectorNot(faiss.IDSelectorBatch(np.array([TOMBSTONE], dtype=np.int64)))
+    return index.search(queries, k, params=search_params(index, alive))
+
+def search_params(index, sel, k: int = 0, widen: float = 1.0) -> faiss.SearchParameters:
+    """SearchParameters of the right type for index carrying selector sel.
+
+    HNSW and IVF read efSearch / nprobe from their parameters when given,
+    so the index's own settings are copied in, scaled by widen: vectors a
+    selector rejects still occupy the HNSW beam / IVF cells, so a selector
+    passing 1/x of the vectors needs about x times the effort for the
+    same recall.
+    """
+    inner = _inner(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=sel, efSearch=int(max(inner.hnsw.efSearch, k) * widen))
+    if isinstance(inner, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=sel, nprobe=min(int(round(inner.nprobe * widen)), inner.nlist))
+    return faiss.SearchParameters(sel=sel)
+
+def search_positions(index, queries: np.ndarray, k: int, sel, widen: float = 1.0):
+    """Search the vectors inside an (id-mapped) index restricted to the internal
+    positions sel accepts; returns (scores, positions), not labels."""
+    inner = _inner(index)
+    if is_binary(inner):
+        queries = binarize(queries)
+    return inner.search(queries, k, params=search_params(inner, sel, k, widen))
+
+def search_rescored(index: faiss.Index, queries: np.ndarray, k: int, matrix: np.ndarray,
+                    rows: Optional[Dict[int, int]] = None, factor: int = RESCORE_FACTOR):
+    """Search the codes for factor * k candidates, then rank them by exact cosine.
+
+    matrix is the float embedding matrix (usually the embeddings.npy memmap)
+    and rows maps labels to its rows (None when labels are row numbers).
+    Returns (scores, labels) like index.search(), padded with -1.
+    """
+    fetch = min(k * factor, index.ntotal)
+    _, candidates = search(index, queries, fetch)
+    return rescore(candidates, queries, k, matrix, rows)
+
+def rescore(candidates: np.ndarray, queries: np.ndarray, k: int, matrix: np.ndarray,
+            rows: Optional[Dict[int, int]] = None):
+    """Top k of each query's candidate labels by exact cosine against matrix rows."""
+    scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    labels = np.full((len(queries), k), -1, dtype=np.int64)
+    for qi, found in enumerate(candidates):
+        found = found[found >= 0]
+        if rows is not None:
+            found = np.array([label for label in found.tolist() if label in rows], dtype=np.int64)
+            positions = np.array([rows[label] for label in found.tolist()], dtype=np.int64)
+        else:
+            positions = found
+        if not len(found):
+            continue
+        # read candidate rows in file order for locality on a memmap
+        order = np.argsort(positions)
+        exact = normalized(matrix[positions[order]]) @ queries[qi]
+        best = np.argsort(-exact, kind="stable")[:k]
+        scores[qi, :len(best)] = exact[best]
+        labels[qi, :len(best)] = found[order][best]
+    return scores, labels
+
+def index_kind(index: faiss.Index) -> str:
+    index = _inner(index)
+    if isinstance(index, faiss.IndexBinary):
+        return "binary"
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        return "sq8"
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf-pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf-flat"
+    return "flat"
+
+def index_bytes(index: faiss.Index) -> int:
+    """Serialized size, a close proxy for the index's resident memory."""
+    serialize = faiss.serialize_index_binary if is_binary(index) else faiss.serialize_index
+    return int(serialize(index).size)
+
+def benchmark(matrix: np.ndarray, kinds: List[str], k: int = 10, queries: int = 200,
+              noise: float = 0.05, seed: int = SEED, factor: int = RESCORE_FACTOR) -> List[Dict]:
+    """Recall@k of each kind against exact search, plus build time, size and latency.
+
+    Queries are random rows with Gaussian noise added (so a query is not
+    trivially its own nearest neighbour). Quantized kinds are measured with
+    rescoring against matrix, the way they are searched; first_stage_recall
+    is their recall from the codes alone. memory_ratio is the index size over
+    the float32 vectors' size.
+    """
+    rng = np.random.default_rng(seed)
+    n, dim = matrix.shape
+    rows = rng.choice(n, size=min(queries, n), replace=False)
+    q = normalized(matrix[np.sort(rows)])
+    q += rng.normal(0, noise / math.sqrt(dim), size=q.shape).astype(np.float32)
+    faiss.normalize_L2(q)
+    k = min(k, n)
+
+    exact = faiss.IndexFlatIP(dim)
+    for start in range(0, n, ADD_CHUNK):
+        exact.add(normalized(matrix[start:start + ADD_CHUNK]))
+    _, truth = exact.search(q, k)
+
+    results = []
+    for kind in kinds:
+        t0 = time.perf_counter()
+        index = build_index(matrix, kind)
+        build_s = time.perf_counter() - t0
+        if kind in QUANTIZED:
+            run = lambda x: search_rescored(index, x, k, matrix, factor=factor)
+        else:
+            run = lambda x: search(index, x, k)
+        _, first = search(index, q, k)
+        _, found = run(q)
+        recall = np.mean([len(set(found[i]) & set(truth[i])) / k for i in range(len(q))])
+        first_recall = np.mean([len(set(first[i]) & set(truth[i])) / k for i in range(len(q))])
+        latencies = []
+        for i in range(len(q)):
+            t0 = time.perf_counter()
+            run(q[i:i + 1])
+            latencies.append((time.perf_counter() - t0) * 1000)
+        size = index_bytes(index)
+        results.append({
+            "kind": kind,
+            "n": n,
+            "recall_at_k": round(float(recall), 4),
+            "first_stage_recall": round(float(first_recall), 4),
+            "memory_ratio": round(size / (n * dim * 4), 4),
+            "build_s": round(build_s, 3),
+            "bytes": size,
+            "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+            "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+        })
+    return results
+
+def synthetic_matrix(n: int, dim: int, seed: int = SEED) -> np.ndarray:
+    """n random vectors around n/100 cluster centres."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, n // 100), dim)).astype(np.float32)
+    matrix = centers[rng.integers(0, len(centers), n)]
+    matrix += rng.normal(scale=0.5, size=matrix.shape).astype(np.float32)
+    return matrix
+
+def incremental_index(kind: str, matrix: np.ndarray, labels: np.ndarray, remove: int, add: int) -> faiss.Index:
+    """Labelled index over matrix[remove:], reached the way build_embeddings.py updates one.
+
+    Builds over all but the last `add` rows, removes the first `remove`
+    labels (IVF kinds are rebuilt without them, once remove_labels() has
+    refused), then adds the last rows. Raises RuntimeError if a step
+    misbehaves.
+    """
+    n = len(matrix)
+    index = build_index(matrix[:n - add], kind, labels=labels[:n - add])
+    if kind in IVF:
+        try:
+            remove_labels(index, labels[:remove])
+        except ValueError:
+            rows = np.arange(remove, n - add)
+            index = build_index(matrix[rows], kind, labels=labels[rows])
+        else:
+            raise RuntimeError(f"{kind}: remove_labels() did not refuse an IVF index")
+    elif remove_labels(index, labels[:remove]) != remove:
+        raise RuntimeError(f"{kind}: removed fewer than {remove} vectors")
+    add_rows(index, matrix, np.arange(n - add, n), labels[n - add:])
+    return index
+
+def check_incremental(kind: str, n: int = 20_000, dim: int = 64, remove: int = 100, add: int = 50,
+                      queries: int = 2000) -> List[str]:
+    """Regression check of an incremental update (see incremental_index()).
+
+    Checks that kept and added rows find themselves and no removed label is
+    ever returned. Returns the problems.
+    """
+    matrix = synthetic_matrix(n, dim)
+    labels = faiss_labels([f"doc{i}" for i in range(n)])
+    try:
+        index = incremental_index(kind, matrix, labels, remove, add)
+    except RuntimeError as e:
+        return [str(e)]
+    live = np.arange(remove, n)
+    # a sample of the rows kept from the first build, and every added row
+    rng = np.random.default_rng(SEED)
+    sample = np.concatenate([np.sort(rng.choice(live[:-add], size=min(queries, len(live) - add), replace=False)),
+                             live[-add:]])
+    q = normalized(matrix[sample])
+    if kind in QUANTIZED:
+        rows = {label: row for row, label in enumerate(labels.tolist())}
+        _, found = search_rescored(index, q, 1, matrix, rows)
+    else:
+        _, found = search(index, q, 1)
+    problems = []
+    hits = int(np.sum(found[:, 0] == labels[sample]))
+    # IVF-PQ codes are lossy, so its self-match only has to be high, not exact
+    if hits < (0.9 if kind == "ivf-pq" else 0.99) * len(sample):
+        problems.append(f"{kind}: self-match {hits}/{len(sample)}")
+    deleted = int(np.isin(found, labels[:remove]).sum())
+    if deleted:
+        problems.append(f"{kind}: {deleted} results are removed labels")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="FAISS index builders and benchmark")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bench = sub.add_parser("bench", help="recall@k / build time / memory / latency per index kind")
+    bench.add_argument("--dataset", type=pathlib.Path, default=pathlib.Path("dataset"))
+    bench.add_argument("--kinds", nargs="+", choices=KINDS, default=list(KINDS))
+    bench.add_argument("--k", type=int, default=10)
+    bench.add_argument("--queries", type=int, default=200)
+    bench.add_argument("--synthetic", type=int, default=0,
+                       help="benchmark on this many random clustered vectors instead of dataset/")
+    bench.add_argument("--dim", type=int, default=256, help="dimension for --synthetic")
+    bench.add_argument("--rescore-factor", type=int, default=RESCORE_FACTOR,
+                       help="first-stage candidates per result for sq8 / binary")
+    check = sub.add_parser("check", help="self-match after incremental remove + add, per index kind")
+    check.add_argument("--kinds", nargs="+", choices=KINDS, default=list(KINDS))
+    args = parser.parse_args()
+
+    if args.command == "check":
+        problems = []
+        for kind in args.kinds:
+            found = check_incremental(kind)
+            print(f"{kind:9s} {'FAIL' if found else 'ok'}")
+            problems.extend(found)
+        for problem in problems:
+            print(f"  {problem}")
+        raise SystemExit(1 if problems else 0)
+
+    if args.synthetic:
+        matrix = synthetic_matrix(args.synthetic, args.dim)
+        source = f"synthetic {args.synthetic} x {args.dim}"
+    else:
+        from embedding_matrix import load_embeddings
+        _, matrix = load_embeddings(args.dataset)
+        source = f"{args.dataset}/embeddings.npy"
+    n, dim = matrix.shape
+    print(f"{source}: {n} x {dim} {matrix.dtype}, auto -> {choose_kind(n)}")
+    print(f"{'kind':9s} {'recall@' + str(args.k):>10s} {'1st stage':>10s} {'build s':>9s} {'MB':>8s} "
+          f"{'x f32':>7s} {'p50 ms':>8s} {'p99 ms':>8s}")
+    for r in benchmark(matrix, args.kinds, args.k, args.queries, factor=args.rescore_factor):
+        print(f"{r['kind']:9s} {r['recall_at_k']:10.4f} {r['first_stage_recall']:10.4f} {r['build_s']:9.3f} "
+              f"{r['bytes'] / 2**20:8.2f} {r['memory_ratio']:7.3f} {r['p50_ms']:8.3f} {r['p99_ms']:8.3f}")
+
+if __name__ == "__main__":
+    main()
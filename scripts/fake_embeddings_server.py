@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenAI embeddings endpoint, for testing
+build_embeddings.py without an API key or network access.
+
+Serves POST /v1/embeddings with the same request/response shape as the real
+API (float or base64 encoding). Vectors are deterministic: words are
+feature-hashed into `--dim` buckets and the result is L2-normalized, so equal
+texts always get equal vectors and texts sharing words are similar.
+
+GET /stats returns {"requests": n, "inputs": n, "rate_limited": n} so a test
+can check how many texts were actually embedded (e.g. zero on a fully cached
+re-run).
+
+To measure client throughput, --latency-ms / --per-input-ms delay every
+response, and --max-concurrent answers 429 with a Retry-After header once more
+than that many requests are in flight (like a provider rate limit).
+
+Failures for retry/resume testing: --fail-rate answers a random share of
+requests with 500, --reject-substring answers 400 to any request containing
+an input with that substring (one bad document), and --outage-after N answers
+503 to everything after N successful requests.
+
+Usage:
+  python scripts/fake_embeddings_server.py --port 8765 &
+  python scripts/fake_embeddings_server.py --latency-ms 200 --max-concurrent 8 &
+  OPENAI_API_KEY=local python scripts/build_embeddings.py --api-base http://127.0.0.1:8765/v1
+"""
+from __future__ import annotations
+import argparse
+import base64
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+WORD_RE = re.compile(r"\w+")
+
+def fake_embedding(text: str, dim: int) -> np.ndarray:
+    vec = np.zeros(dim, dtype=np.float32)
+    for word in WORD_RE.findall(text.lower()):
+        h = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+        vec[h % dim] += 1.0 if (h >> 63) else -1.0
+    norm = np.linalg.norm(vec)
+    if norm == 0:
+        vec[0] = 1.0
+        return vec
+    return vec / norm
+
+class FakeEmbeddings(BaseHTTPRequestHandler):
+    dim = 1536
+    latency = 0.0
+    per_input = 0.0
+    max_concurrent = 0
+    retry_after = 0.5
+    fail_rate = 0.0
+    reject_substring = ""
+    outage_after = 0
+    in_flight = 0
+    stats = {"requests": 0, "inputs": 0, "rate_limited": 0}
+    lock = threading.Lock()
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send(self, status: int, body: dict, headers: dict | None = None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/stats"):
+            with self.lock:
+                self._send(200, dict(self.stats))
+        else:
+            self._send(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/embeddings"):
+            self._send(404, {"error": {"message": "not found"}})
+            return
+        req = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)))
+        cls = type(self)
+        with self.lock:
+            limited = bool(cls.max_concurrent) and cls.in_flight >= cls.max_concurrent
+            if limited:
+                self.stats["rate_limited"] += 1
+            else:
+                cls.in_flight += 1
+        if limited:
+            self._send(429, {"error": {"message": "rate limited", "type": "rate_limit_exceeded"}},
+                       {"Retry-After": f"{cls.retry_after:g}"})
+            return
+        try:
+            self._embed(req)
+        finally:
+            with self.lock:
+                cls.in_flight -= 1
+
+    def _embed(self, req: dict):
+        inputs = req.get("input")
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        if not isinstance(inputs, list) or not inputs:
+            self._send(400, {"error": {"message": "input must be a non-empty string or list"}})
+            return
+        if self.reject_substring and any(self.reject_substring in t for t in inputs):
+            self._send(400, {"error": {"message": "input rejected", "type": "invalid_request_error"}})
+            return
+        if self.outage_after and self.stats["requests"] >= self.outage_after:
+            self._send(503, {"error": {"message": "service unavailable"}})
+            return
+        if self.fail_rate and random.random() < self.fail_rate:
+            self._send(500, {"error": {"message": "injected failure"}})
+            return
+        time.sleep(self.latency + self.per_input * len(inputs))
+        b64 = req.get("encoding_format") == "base64"
+        data = []
+        for i, text in enumerate(inputs):
+            vec = fake_embedding(text, self.dim)
+            emb = base64.b64encode(vec.astype("<f4").tobytes()).decode("ascii") if b64 else vec.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": emb})
+        tokens = sum(len(t) // 4 + 1 for t in inputs)
+        with self.lock:
+            self.stats["requests"] += 1
+            self.stats["inputs"] += len(inputs)
+        self._send(200, {"object": "list", "data": data, "model": req.get("model", ""),
+                         "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+
+def main():
+    parser = argparse.ArgumentParser(description="Deterministic fake OpenAI embeddings server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="fixed delay per request")
+    parser.add_argument("--per-input-ms", type=float, default=0.0, help="extra delay per input text")
+    parser.add_argument("--max-concurrent", type=int, default=0,
+                        help="answer 429 above this many requests in flight (0 = unlimited)")
+    parser.add_argument("--retry-after", type=float, default=0.5, help="Retry-After seconds sent with 429")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of requests answered with 500")
+    parser.add_argument("--reject-substring", default="", help="answer 400 if any input contains this")
+    parser.add_argument("--outage-after", type=int, default=0, help="answer 503 after this many requests")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    FakeEmbeddings.dim = args.dim
+    FakeEmbeddings.latency = args.latency_ms / 1000
+    FakeEmbeddings.per_input = args.per_input_ms / 1000
+    FakeEmbeddings.max_concurrent = args.max_concurrent
+    FakeEmbeddings.retry_after = args.retry_after
+    FakeEmbeddings.fail_rate = args.fail_rate
+    FakeEmbeddings.reject_substring = args.reject_substring
+    FakeEmbeddings.outage_after = args.outage_after
+    random.seed(args.seed)
+    server = ThreadingHTTPServer((args.host, args.port), FakeEmbeddings)
+    print(f"Fake embeddings on http://{args.host}:{args.port}/v1 (dim={args.dim})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
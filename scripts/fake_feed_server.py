@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for Medium / Substack feeds and article pages, for testing
+import_medium.py and import_substack.py without network access.
+
+Serves canned, deterministic content:
+
+  GET /<name>/feed     RSS 2.0 with --posts items (newest first). Even
+                       items carry the full post in content:encoded, odd
+                       ones only a short teaser, so the importer has to
+                       fetch the article page.
+  GET /<name>/p/<n>    the article page of item n (HTML)
+  POST /<name>/publish adds one post to that feed
+  GET /stats           {"requests": n, "feeds": n, "pages": n, "not_modified": n, "max_in_flight": n}
+
+Feeds carry an ETag (hash of the body) and Last-Modified (newest post) and
+answer 304 to a matching If-None-Match / If-Modified-Since, unless
+--no-validators, which makes the server always answer 200 with the full body
+(like a host that ignores conditional requests).
+
+Any <name> works, so several "publications" can be served at once. Links
+use the Host header the client sent, so they resolve back to this server.
+--latency-ms delays every response, which makes the effect of concurrent
+fetching (and of per-host rate limits, via max_in_flight) visible.
+
+Usage:
+  python scripts/fake_feed_server.py --port 8767 --posts 20 --latency-ms 100 &
+  python scripts/import_medium.py --no-default-feeds --feed http://127.0.0.1:8767/hacker/feed
+  curl -X POST http://127.0.0.1:8767/hacker/publish
+"""
+from __future__ import annotations
+import argparse
+import datetime
+import hashlib
+import json
+import threading
+import time
+from email.utils import format_datetime, parsedate_to_datetime
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIRST_DATE = datetime.datetime(2020, 1, 6, 9, 30, tzinfo=datetime.timezone.utc)
+TAGS = ("metaphor", "education", "technology", "writing")
+
+def post_paragraphs(name: str, n: int) -> list[str]:
+    return [f"Paragraph {i + 1} of post {n} from {name}. Metaphors structure how we think about "
+            f"{TAGS[(n + i) % len(TAGS)]}, and this canned text is long enough for content extraction "
+            f"to treat it as the main body of the page rather than boilerplate." for i in range(5)]
+
+def post_title(name: str, n: int) -> str:
+    return f"Post {n} from {name}: on {TAGS[n % len(TAGS)]}"
+
+def post_date(n: int) -> datetime.datetime:
+    return FIRST_DATE + datetime.timedelta(days=7 * n)
+
+def render_feed(name: str, base: str, posts: int) -> str:
+    items = []
+    for n in range(posts, 0, -1):
+        link = f"{base}/{name}/p/{n}"
+        date = post_date(n)
+        if n % 2 == 0:
+            body = "".join(f"<p>{escape(p)}</p>" for p in post_paragraphs(name, n))
+            content = f"<content:encoded><![CDATA[{body}]]></content:encoded>"
+        else:
+            content = ""
+        items.append(f"""
+    <item>
+      <title>{escape(post_title(name, n))}</title>
+      <link>{link}</link>
+      <guid isPermaLink="false">{name}-{n}</guid>
+      <pubDate>{format_datetime(date)}</pubDate>
+      <category>{TAGS[n % len(TAGS)]}</category>
+      <description>{escape(f"Teaser for post {n}.")}</description>{content}
+    </item>""")
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0" xmlns:content="http://purl.org/rss/1.0/modules/content/">
+  <channel>
+    <title>{escape(name)}</title>
+    <link>{base}/{name}</link>
+    <description>Fake feed {escape(name)}</description>{"".join(items)}
+  </channel>
+</rss>
+"""
+
+def render_page(name: str, n: int) -> str:
+    paragraphs = "\n".join(f"      <p>{escape(p)}</p>" for p in post_paragraphs(name, n))
+    return f"""<!DOCTYPE html>
+<html lang="en">
+  <head><meta charset="utf-8"><title>{escape(post_title(name, n))}</title></head>
+  <body>
+    <nav><a href="/{name}">Home</a></nav>
+    <article>
+      <h1>{escape(post_title(name, n))}</h1>
+{paragraphs}
+    </article>
+    <footer>Fake footer</footer>
+  </body>
+</html>
+"""
+
+class FakeFeeds(BaseHTTPRequestHandler):
+    posts = 10
+    published: dict = {}
+    validators = True
+    latency = 0.0
+    in_flight = 0
+    stats = {"requests": 0, "feeds": 0, "pages": 0, "not_modified": 0, "max_in_flight": 0}
+    lock = threading.Lock()
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send(self, status: int, body: str, content_type: str, headers: dict | None = None):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        cls = type(self)
+        with self.lock:
+            cls.in_flight += 1
+            self.stats["requests"] += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], cls.in_flight)
+        try:
+            time.sleep(self.latency)
+            self._route()
+        finally:
+            with self.lock:
+                cls.in_flight -= 1
+
+    def do_POST(self):
+        parts = [p for p in self.path.split("?")[0].split("/") if p]
+        if len(parts) == 2 and parts[1] == "publish":
+            with self.lock:
+                self.published[parts[0]] = self.published.get(parts[0], self.posts) + 1
+                posts = self.published[parts[0]]
+            self._send(200, json.dumps({"posts": posts}), "application/json")
+        else:
+            self._send(404, "not found", "text/plain")
+
+    def _not_modified(self, etag: str, last_modified: datetime.datetime) -> bool:
+        if not self.validators:
+            return False
+        if self.headers.get("If-None-Match"):
+            return self.headers["If-None-Match"] == etag
+        try:
+            return parsedate_to_datetime(self.headers.get("If-Modified-Since", "")) >= last_modified
+        except (TypeError, ValueError):
+            return False
+
+    def _feed(self, name: str, base: str):
+        with self.lock:
+            self.stats["feeds"] += 1
+            posts = self.published.get(name, self.posts)
+        body = render_feed(name, base, posts)
+        etag = '"' + hashlib.sha256(body.encode("utf-8")).hexdigest()[:16] + '"'
+        last_modified = post_date(posts)
+        headers = {"ETag": etag, "Last-Modified": format_datetime(last_modified, usegmt=True)} if self.validators else {}
+        if self._not_modified(etag, last_modified):
+            with self.lock:
+                self.stats["not_modified"] += 1
+            self.send_response(304)
+            for k, v in headers.items():
+                self.send_header(k, v)
+            self.end_headers()
+            return
+        self._send(200, body, "application/rss+xml", headers)
+
+    def _route(self):
+        parts = [p for p in self.path.split("?")[0].split("/") if p]
+        base = f"http://{self.headers.get('Host') or 'localhost'}"
+        if parts == ["stats"]:
+            with self.lock:
+                self._send(200, json.dumps(self.stats), "application/json")
+        elif len(parts) == 2 and parts[1] == "feed":
+            self._feed(parts[0], base)
+        elif (len(parts) == 3 and parts[1] == "p" and parts[2].isdigit()
+              and 0 < int(parts[2]) <= self.published.get(parts[0], self.posts)):
+            with self.lock:
+                self.stats["pages"] += 1
+            self._send(200, render_page(parts[0], int(parts[2])), "text/html")
+        else:
+            self._send(404, "not found", "text/plain")
+
+def main():
+    parser = argparse.ArgumentParser(description="Deterministic fake RSS feeds and article pages")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--posts", type=int, default=10, help="items per feed")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="fixed delay per response")
+    parser.add_argument("--no-validators", action="store_true", help="no ETag / Last-Modified, never answer 304")
+    args = parser.parse_args()
+    FakeFeeds.posts = args.posts
+    FakeFeeds.validators = not args.no_validators
+    FakeFeeds.latency = args.latency_ms / 1000
+    server = ThreadingHTTPServer((args.host, args.port), FakeFeeds)
+    print(f"Fake feeds on http://{args.host}:{args.port}/<name>/feed ({args.posts} posts each)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Wayback Machine captures of the Dyslexia Action tech
+blog, for testing scrape_dyslexiaaction_tech_blog.py without network access.
+
+Serves canned, deterministic pages shaped like the real captures:
+
+  GET /web/<snapshot>/http://www.dyslexiaaction.org.uk/tech-blog?page=N
+        listing page N (Drupal views rows: title link + created date), or,
+        like the real landing-page capture, a page without listings when
+        <snapshot> is the first of SNAPSHOTS and N > 0
+  GET /web/<snapshot>/http://www.dyslexiaaction.org.uk/page/<slug>
+        a post page (hero title + body field)
+  GET /stats   {"requests": n, "listings": n, "posts": n, "errors": n, "max_in_flight": n}
+
+--error-every N answers every Nth request with 503 (and Retry-After: 0) to
+exercise retries; --latency-ms delays every response.
+
+Usage:
+  python scripts/fake_wayback_server.py --port 8769 --pages 8 --latency-ms 200 &
+  python scripts/scrape_dyslexiaaction_tech_blog.py --base-url http://127.0.0.1:8769 --no-cache
+"""
+from __future__ import annotations
+import argparse
+import datetime
+import json
+import re
+import threading
+import time
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+SNAPSHOTS = ["20170613010952", "20170504173908", "20170428003223"]
+SITE = "http://www.dyslexiaaction.org.uk"
+PER_PAGE = 10
+FIRST_DATE = datetime.datetime(2016, 12, 5, 14, 18)
+PATH_RE = re.compile(r"^/web/(\d+)/https?://www\.dyslexiaaction\.org\.uk(?::80)?(/[^?]*)(?:\?(.*))?$")
+
+def post_slug(page: int, i: int) -> str:
+    return f"fixture-post-{page}-{i}"
+
+def post_date(page: int, i: int) -> datetime.datetime:
+    return FIRST_DATE - datetime.timedelta(days=7 * (page * PER_PAGE + i))
+
+def render_listing(snap: str, page: int) -> str:
+    rows = []
+    for i in range(PER_PAGE):
+        date = post_date(page, i)
+        created = f"{date:%A}, {date.day} {date:%B}, {date.year} - {date:%H:%M}"
+        rows.append(f"""
+  <div class="views-row">
+    <div class="views-field views-field-title">        <span class="field-content"><a href="/web/{snap}/{SITE}/page/{post_slug(page, i)}">Fixture post {page}.{i}</a></span>  </div>
+    <div class="views-field views-field-created">        <span class="field-content">{created}</span>  </div>
+  </div>""")
+    return f"""<!DOCTYPE html>
+<html><head><title>Tech blog | Dyslexia Action</title></head>
+<body><div class="view-content">{"".join(rows)}
+</div>
+<ul class="pager"><li class="pager-next"><a href="/web/{snap}/{SITE}/tech-blog?page={page + 1}">next</a></li></ul>
+</body></html>
+"""
+
+def render_post(slug: str) -> str:
+    paragraphs = "\n".join(
+        f"<p>Paragraph {n + 1} of {escape(slug)}. Assistive technology such as text-to-speech, scanner pens and "
+        f"notetaking apps helps dyslexic learners; this canned text is long enough to be the main content.</p>"
+        for n in range(4))
+    return f"""<!DOCTYPE html>
+<html><head><title>{escape(slug)} | Dyslexia Action</title></head>
+<body>
+<div class="hero-title"><h1>{escape(slug.replace("-", " ").capitalize())}</h1></div>
+<div class="field field-name-body field-type-text-with-summary"><div class="field-items"><div class="field-item even">
+{paragraphs}
+</div></div></div>
+<footer>Dyslexia Action footer</footer>
+</body></html>
+"""
+
+class FakeWayback(BaseHTTPRequestHandler):
+    pages = 8
+    latency = 0.0
+    error_every = 0
+    in_flight = 0
+    stats = {"requests": 0, "listings": 0, "posts": 0, "errors": 0, "max_in_flight": 0}
+    lock = threading.Lock()
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send(self, status: int, body: str, content_type: str = "text/html", headers: dict | None = None):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        cls = type(self)
+        with self.lock:
+            cls.in_flight += 1
+            self.stats["requests"] += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], cls.in_flight)
+            n = self.stats["requests"]
+        try:
+            time.sleep(self.latency)
+            if self.path == "/stats":
+                with self.lock:
+                    self._send(200, json.dumps(self.stats), "application/json")
+            elif self.error_every and n % self.error_every == 0:
+                with self.lock:
+                    self.stats["errors"] += 1
+                self._send(503, "busy", "text/plain", {"Retry-After": "0"})
+            else:
+                self._route()
+        finally:
+            with self.lock:
+                cls.in_flight -= 1
+
+    def _route(self):
+        m = PATH_RE.match(self.path)
+        if not m:
+            self._send(404, "not found", "text/plain")
+            return
+        snap, path, query = m.group(1), m.group(2), m.group(3) or ""
+        if path == "/tech-blog" and snap in SNAPSHOTS:
+            page = int(parse_qs(query).get("page", ["0"])[0])
+            with self.lock:
+                self.stats["listings"] += 1
+            if page >= self.pages or (snap == SNAPSHOTS[0] and page > 0):
+                self._send(200, "<html><body><p>No listing in this capture.</p></body></html>")
+            else:
+                self._send(200, render_listing(snap, page))
+        elif path.startswith("/page/fixture-post-"):
+            with self.lock:
+                self.stats["posts"] += 1
+            self._send(200, render_post(urlsplit(path).path.rsplit("/", 1)[1]))
+        else:
+            self._send(404, "not found", "text/plain")
+
+def main():
+    parser = argparse.ArgumentParser(description="Deterministic fake Wayback captures of the Dyslexia Action tech blog")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8769)
+    parser.add_argument("--pages", type=int, default=8, help="listing pages with posts")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="fixed delay per response")
+    parser.add_argument("--error-every", type=int, default=0, help="answer every Nth request with 503")
+    args = parser.parse_args()
+    FakeWayback.pages = args.pages
+    FakeWayback.latency = args.latency_ms / 1000
+    FakeWayback.error_every = args.error_every
+    server = ThreadingHTTPServer((args.host, args.port), FakeWayback)
+    print(f"Fake Wayback on http://{args.host}:{args.port}/web/<snapshot>/{SITE}/tech-blog ({args.pages} pages)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
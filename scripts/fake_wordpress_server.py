@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for a WordPress site's REST API, for testing
+import_wordpress.py without network access.
+
+Serves canned, deterministic posts the way WordPress does:
+
+  GET /wp-json/wp/v2/posts        ?page, per_page (max 100), orderby, order,
+                                  modified_after, _fields; X-WP-Total and
+                                  X-WP-TotalPages headers; 400
+                                  rest_post_invalid_page_number past the end
+  GET /wp-json/wp/v2/categories   ?include=1,2 ?per_page ?_fields
+  GET /wp-json/wp/v2/tags         likewise
+  POST /wp-json/wp/v2/posts/<id>  edits post <id> (new content, modified = now)
+  POST /wp-json/wp/v2/posts       publishes one new post
+  GET /stats                      {"requests": n, "post_objects": n, "bytes": n, "max_in_flight": n}
+
+post_objects counts the posts sent, so an incremental sync that only
+downloads what changed is easy to tell from a full re-download. --latency-ms
+delays every response.
+
+Usage:
+  python scripts/fake_wordpress_server.py --port 8770 --posts 250 --latency-ms 100 &
+  python scripts/import_wordpress.py --site http://127.0.0.1:8770
+  curl -X POST http://127.0.0.1:8770/wp-json/wp/v2/posts/7
+"""
+from __future__ import annotations
+import argparse
+import datetime
+import json
+import threading
+import time
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+FIRST_DATE = datetime.datetime(2010, 3, 1, 10, 0)
+CATEGORIES = {1: "Metaphor", 2: "Education", 3: "Technology"}
+TAGS = {11: "metaphor hacking", 12: "cognition", 13: "language", 14: "AI"}
+MAX_PER_PAGE = 100
+
+def make_post(n: int, base: str, edits: int = 0, modified: datetime.datetime | None = None) -> dict:
+    date = FIRST_DATE + datetime.timedelta(days=9 * n)
+    slug = f"post-{n}-on-{CATEGORIES[1 + n % 3].lower()}"
+    paragraphs = "".join(
+        f"<p>Paragraph {i + 1} of post {n}{f' (edit {edits})' if edits else ''}. Metaphors are "
+        f"<em>ways of thinking</em> &amp; talking about {escape(TAGS[11 + (n + i) % 4])}.</p>\n" for i in range(4))
+    return {
+        "id": n,
+        "date": date.isoformat(),
+        "date_gmt": date.isoformat(),
+        "modified": (modified or date + datetime.timedelta(hours=1)).isoformat(timespec="seconds"),
+        "modified_gmt": (modified or date + datetime.timedelta(hours=1)).isoformat(timespec="seconds"),
+        "slug": slug,
+        "status": "publish",
+        "type": "post",
+        "link": f"{base}/{date:%Y/%m}/{slug}/",
+        "title": {"rendered": f"Post {n} on {CATEGORIES[1 + n % 3].lower()} &#8211; a &#8216;metaphor&#8217;"},
+        "content": {"rendered": f"<h2>Part one</h2>\n{paragraphs}", "protected": False},
+        "excerpt": {"rendered": f"<p>Excerpt of post {n}</p>\n", "protected": False},
+        "author": 1,
+        "featured_media": 0,
+        "comment_status": "open",
+        "ping_status": "open",
+        "sticky": False,
+        "template": "",
+        "format": "standard",
+        "meta": {"footnotes": ""},
+        "categories": [1 + n % 3],
+        "tags": sorted({11 + n % 4, 11 + (n + 1) % 4}),
+        "guid": {"rendered": f"{base}/?p={n}"},
+        "_links": {"self": [{"href": f"{base}/wp-json/wp/v2/posts/{n}"}],
+                   "collection": [{"href": f"{base}/wp-json/wp/v2/posts"}]},
+    }
+
+def trim(obj: dict, fields: str | None) -> dict:
+    if not fields:
+        return obj
+    keep = {f.split(".")[0] for f in fields.split(",") if f}
+    return {k: v for k, v in obj.items() if k in keep}
+
+class FakeWordPress(BaseHTTPRequestHandler):
+    posts = 250
+    edits: dict = {}
+    latency = 0.0
+    in_flight = 0
+    stats = {"requests": 0, "post_objects": 0, "bytes": 0, "max_in_flight": 0}
+    lock = threading.Lock()
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send(self, status: int, payload, headers: dict | None = None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        with self.lock:
+            self.stats["bytes"] += len(data)
+
+    def _base(self) -> str:
+        return f"http://{self.headers.get('Host') or 'localhost'}"
+
+    def _all_posts(self) -> list[dict]:
+        with self.lock:
+            edits = dict(self.edits)
+            n = self.posts
+        return [make_post(i, self._base(), *edits.get(i, (0, None))) for i in range(1, n + 1)]
+
+    def do_GET(self):
+        cls = type(self)
+        with self.lock:
+            cls.in_flight += 1
+            self.stats["requests"] += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], cls.in_flight)
+        try:
+            time.sleep(self.latency)
+            self._route()
+        finally:
+            with self.lock:
+                cls.in_flight -= 1
+
+    def do_POST(self):
+        parts = [p for p in urlsplit(self.path).path.split("/") if p]
+        if parts[:4] != ["wp-json", "wp", "v2", "posts"]:
+            self._send(404, {"code": "rest_no_route"})
+            return
+        now = datetime.datetime.now().replace(microsecond=0)
+        with self.lock:
+            n = None
+            if len(parts) == 4:
+                type(self).posts += 1
+                n = self.posts
+                self.edits[n] = (0, now)
+            elif parts[4].isdigit() and 0 < int(parts[4]) <= self.posts:
+                n = int(parts[4])
+                self.edits[n] = (self.edits.get(n, (0, None))[0] + 1, now)
+            edits, modified = self.edits[n] if n else (0, None)
+        if n is None:
+            self._send(404, {"code": "rest_post_invalid_id"})
+            return
+        self._send(200, make_post(n, self._base(), edits, modified))
+
+    def _route(self):
+        url = urlsplit(self.path)
+        q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        parts = [p for p in url.path.split("/") if p]
+        if parts == ["stats"]:
+            with self.lock:
+                stats = dict(self.stats)
+            self._send(200, stats)
+            return
+        if parts[:3] != ["wp-json", "wp", "v2"] or len(parts) != 4:
+            self._send(404, {"code": "rest_no_route", "message": "No route was found matching the URL and request method."})
+            return
+        per_page = min(int(q.get("per_page", 10)), MAX_PER_PAGE)
+        page = int(q.get("page", 1))
+        if parts[3] == "posts":
+            items = self._all_posts()
+            if q.get("modified_after"):
+                after = datetime.datetime.fromisoformat(q["modified_after"].replace("Z", "")).replace(tzinfo=None)
+                items = [p for p in items if datetime.datetime.fromisoformat(p["modified"]) > after]
+            key = q.get("orderby", "date")
+            key = {"id": "id", "modified": "modified", "date": "date"}.get(key, "date")
+            items.sort(key=lambda p: (p[key], p["id"]), reverse=q.get("order", "desc") == "desc")
+        elif parts[3] in ("categories", "tags"):
+            terms = CATEGORIES if parts[3] == "categories" else TAGS
+            include = [int(i) for i in q.get("include", "").split(",") if i.strip().isdigit()]
+            items = [{"id": i, "name": terms[i], "slug": terms[i].lower().replace(" ", "-"), "count": 1}
+                     for i in (include or sorted(terms)) if i in terms]
+        else:
+            self._send(404, {"code": "rest_no_route"})
+            return
+        total = len(items)
+        pages = max(1, -(-total // per_page))
+        if page > pages:
+            self._send(400, {"code": "rest_post_invalid_page_number",
+                             "message": "The page number requested is larger than the number of pages available."})
+            return
+        chunk = [trim(p, q.get("_fields")) for p in items[(page - 1) * per_page:page * per_page]]
+        if parts[3] == "posts":
+            with self.lock:
+                self.stats["post_objects"] += len(chunk)
+        self._send(200, chunk, {"X-WP-Total": str(total), "X-WP-TotalPages": str(pages)})
+
+def main():
+    parser = argparse.ArgumentParser(description="Deterministic fake WordPress REST API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8770)
+    parser.add_argument("--posts", type=int, default=250, help="published posts")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="fixed delay per response")
+    args = parser.parse_args()
+    FakeWordPress.posts = args.posts
+    FakeWordPress.latency = args.latency_ms / 1000
+    server = ThreadingHTTPServer((args.host, args.port), FakeWordPress)
+    print(f"Fake WordPress on http://{args.host}:{args.port}/wp-json/wp/v2/posts ({args.posts} posts)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Per-feed state for the RSS importers, so a nightly run where nothing was
+published costs one conditional request per feed and no disk writes.
+
+sources/<name>/feed_state.json maps each feed URL to
+
+  etag, last_modified  validators from the last full download, sent back as
+                       If-None-Match / If-Modified-Since
+  sha256               hash of that download's body, for servers that ignore
+                       validators and answer 200 with the same bytes
+  entries              {entry id: output path relative to the repo} for every
+                       entry already written
+  checked              when the feed was last downloaded in full
+
+A feed is "unchanged" on a 304 or an identical body, and then neither its raw
+JSON nor any entry is touched. Validators are only sent while every recorded
+output still exists, so a checkout without the imported content (or a deleted
+post) triggers a full download instead of a silent skip. Of a changed feed,
+only entries missing from `entries` (or whose output is gone) are processed.
+Validators are kept only if every entry of the feed was processed, so a run
+that failed half way is retried in full next time. save() writes the file
+only if something in it changed.
+
+Usage (from an importer):
+  state = FeedState.load(RAW_DIR.parent / STATE_FILE)
+  headers = state.conditional_headers(url, ROOT)    # {} if a full download is needed
+  r = engine.get(url, headers=headers)
+  if state.unchanged(url, r.status_code, r.content, ROOT): ...   # 304 or same body
+  fresh = state.new_entries(url, entries, ROOT)
+  state.record(url, r.headers, r.content, {entry id: output path}, complete=True)
+  state.save()
+
+  python scripts/feed_state.py sources/medium/feed_state.json   # summary
+
+Dependencies:
+  none (requests responses are passed in)
+"""
+from __future__ import annotations
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import pathlib
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+STATE_FILE = "feed_state.json"
+VERSION = 1
+
+def entry_key(entry: Dict[str, Any]) -> str:
+    """Stable id of a feedparser entry: its guid, else its link, else its title."""
+    return entry.get("id") or entry.get("link") or entry.get("title") or ""
+
+class FeedState:
+    def __init__(self, path: pathlib.Path, feeds: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.path = pathlib.Path(path)
+        self.feeds: Dict[str, Dict[str, Any]] = feeds or {}
+        self.dirty = False
+
+    @classmethod
+    def load(cls, path: pathlib.Path) -> "FeedState":
+        path = pathlib.Path(path)
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return cls(path)
+        if data.get("version") != VERSION:
+            return cls(path)
+        return cls(path, data.get("feeds") or {})
+
+    def _outputs_exist(self, url: str, root: pathlib.Path) -> bool:
+        return all((root / rel).exists() for rel in self.feeds.get(url, {}).get("entries", {}).values())
+
+    def conditional_headers(self, url: str, root: pathlib.Path) -> Dict[str, str]:
+        """If-None-Match / If-Modified-Since for url, or {} when a full download is needed."""
+        feed = self.feeds.get(url)
+        if not feed or not self._outputs_exist(url, root):
+            return {}
+        headers = {}
+        if feed.get("etag"):
+            headers["If-None-Match"] = feed["etag"]
+        if feed.get("last_modified"):
+            headers["If-Modified-Since"] = feed["last_modified"]
+        return headers
+
+    def unchanged(self, url: str, status: int, body: bytes, root: pathlib.Path) -> bool:
+        """Whether a response means the feed has nothing new (304, or the same body as last time)."""
+        feed = self.feeds.get(url)
+        if not feed or not self._outputs_exist(url, root):
+            return False
+        return status == 304 or (status == 200 and hashlib.sha256(body).hexdigest() == feed.get("sha256"))
+
+    def refresh_validators(self, url: str, headers: Dict[str, str]):
+        """Keep validators current when a server answered 200 with an unchanged body."""
+        feed = self.feeds.get(url)
+        if feed is None:
+            return
+        for key, header in (("etag", "etag"), ("last_modified", "last-modified")):
+            value = headers.get(header)
+            if value and feed.get(key) != value:
+                feed[key] = value
+                self.dirty = True
+
+    def new_entries(self, url: str, entries: Iterable[Dict[str, Any]], root: pathlib.Path,
+                    key: Callable[[Dict[str, Any]], str] = entry_key) -> List[Dict[str, Any]]:
+        """Entries not processed before (or whose recorded output has since been deleted)."""
+        done = self.feeds.get(url, {}).get("entries", {})
+        return [e for e in entries if key(e) not in done or not (root / done[key(e)]).exists()]
+
+    def record(self, url: str, headers: Dict[str, str], body: bytes, outputs: Dict[str, str],
+               complete: bool = True):
+        """Remember a full download of url and the outputs of its entries.
+
+        outputs maps entry ids to output paths (relative to the repo root);
+        previously recorded entries are kept. Validators and hash are stored
+        only if complete, i.e. every entry of the feed was handled.
+        """
+        previous = self.feeds.get(url, {})
+        entries = dict(previous.get("entries", {}))
+        entries.update(outputs)
+        self.feeds[url] = {
+            "etag": headers.get("etag") if complete else None,
+            "last_modified": headers.get("last-modified") if complete else None,
+            "sha256": hashlib.sha256(body).hexdigest() if complete else None,
+            "entries": dict(sorted(entries.items())),
+            "checked": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        }
+        self.dirty = True
+
+    def save(self) -> bool:
+        """Write the state (atomically) if it changed; returns whether it was written."""
+        if not self.dirty:
+            return False
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps({"version": VERSION, "feeds": self.feeds}, ensure_ascii=False, indent=2),
+                       encoding="utf-8")
+        os.replace(tmp, self.path)
+        self.dirty = False
+        return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize an importer's feed_state.json")
+    parser.add_argument("path", type=pathlib.Path)
+    args = parser.parse_args()
+    state = FeedState.load(args.path)
+    for url, feed in sorted(state.feeds.items()):
+        validators = ", ".join(k for k in ("etag", "last_modified", "sha256") if feed.get(k)) or "none"
+        print(f"{url}\n  {len(feed.get('entries', {}))} entries, validators: {validators}, "
+              f"checked {feed.get('checked')}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+On-disk HTTP response cache shared by the importers and the scrapers, so a
+--force re-run (say, after changing the HTML -> Markdown conversion) replays
+the pages it already downloaded instead of fetching them again.
+
+Layout (sources/.http_cache/, not committed):
+
+  blobs/ab/ab12....gz   gzip-compressed response bodies, named by the sha256 of
+                        the uncompressed body, so identical bodies (a page
+                        reachable under two URLs, an unchanged feed) are stored
+                        once
+  index.json            URL -> {sha256, size, status, headers, fetched, used}
+
+fetch(url, download) serves a cached 200 response without any request while
+it is younger than the TTL; after that it revalidates with If-None-Match /
+If-Modified-Since when the response carried validators, and a 304 renews the
+entry. In offline mode every cached response is served whatever its age and
+a URL that is not cached raises CacheMiss instead of touching the network.
+
+The compressed bodies are capped at --max-mb: past the cap the least recently
+used URLs are dropped, and a blob is deleted once no URL refers to it. The
+index is written (atomically) by save(); blobs are written as they arrive, so
+an interrupted run leaves at most a few unreferenced blobs, removed by --gc.
+
+Usage (from an importer):
+  cache = HttpCache(ttl=30 * 86400, offline=args.offline)
+  page = cache.fetch(url, lambda headers: requests.get(url, headers=headers))
+  page.text, page.status_code, page.source   # "cache", "revalidated" or "network"
+  cache.save()
+
+  python scripts/http_cache.py                # summary
+  python scripts/http_cache.py --gc           # apply the size cap, remove stray blobs
+  python scripts/http_cache.py --get URL      # print a cached body
+
+Dependencies:
+  pip install requests
+"""
+from __future__ import annotations
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import pathlib
+import re
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+import requests
+from requests.structures import CaseInsensitiveDict
+
+ROOT = pathlib.Path(".").resolve()
+CACHE_DIR = ROOT / "sources" / ".http_cache"
+INDEX_FILE = "index.json"
+VERSION = 1
+DEFAULT_TTL = 30 * 86400
+DEFAULT_MAX_MB = 512
+# headers not worth replaying from the cache
+DROP_HEADERS = ("set-cookie", "content-encoding", "content-length", "transfer-encoding", "connection")
+
+class CacheMiss(LookupError):
+    """Raised in offline mode for a URL that is not in the cache."""
+
+def charset(content_type: str) -> Optional[str]:
+    m = re.search(r"charset=[\"']?([\w.:-]+)", content_type or "", flags=re.I)
+    return m.group(1) if m else None
+
+class CachedPage:
+    """The parts of a requests.Response the importers use, from the cache or the network."""
+
+    def __init__(self, url: str, status_code: int, content: bytes, headers: Dict[str, str], source: str):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = CaseInsensitiveDict(headers)
+        self.source = source
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    @property
+    def text(self) -> str:
+        encoding = charset(self.headers.get("content-type", ""))
+        if encoding:
+            try:
+                return self.content.decode(encoding, errors="replace")
+            except LookupError:
+                pass
+        try:
+            return self.content.decode("utf-8")
+        except UnicodeDecodeError:
+            return self.content.decode("cp1252", errors="replace")
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} for url: {self.url}")
+
+def response_headers(response) -> Dict[str, str]:
+    return {k.lower(): v for k, v in response.headers.items() if k.lower() not in DROP_HEADERS}
+
+class HttpCache:
+    def __init__(self, root: pathlib.Path = CACHE_DIR, ttl: float = DEFAULT_TTL,
+                 max_mb: float = DEFAULT_MAX_MB, offline: bool = False):
+        """ttl is in seconds (math.inf: cached responses never go stale)."""
+        self.root = pathlib.Path(root)
+        self.ttl = ttl
+        self.max_bytes = int(max_mb * 2**20)
+        self.offline = offline
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.stats = {"hits": 0, "revalidated": 0, "downloaded": 0, "stored": 0, "evicted": 0, "misses": 0}
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        try:
+            data = json.loads((self.root / INDEX_FILE).read_text(encoding="utf-8"))
+            if data.get("version") == VERSION:
+                self.entries = data.get("urls") or {}
+        except (OSError, ValueError):
+            pass
+        self.refs: Dict[str, int] = {}
+        self.sizes: Dict[str, int] = {}
+        for entry in self.entries.values():
+            self._ref(entry)
+
+    def _ref(self, entry: Dict[str, Any]):
+        sha = entry["sha256"]
+        self.refs[sha] = self.refs.get(sha, 0) + 1
+        self.sizes[sha] = entry["size"]
+
+    def _unref(self, entry: Dict[str, Any]):
+        sha = entry["sha256"]
+        self.refs[sha] -= 1
+        if self.refs[sha] == 0:
+            del self.refs[sha], self.sizes[sha]
+            self._blob(sha).unlink(missing_ok=True)
+
+    def _blob(self, sha: str) -> pathlib.Path:
+        return self.root / "blobs" / sha[:2] / f"{sha}.gz"
+
+    def total_bytes(self) -> int:
+        with self.lock:
+            return sum(self.sizes.values())
+
+    def _page(self, url: str, entry: Dict[str, Any], source: str) -> Optional[CachedPage]:
+        try:
+            content = gzip.decompress(self._blob(entry["sha256"]).read_bytes())
+        except (OSError, EOFError, gzip.BadGzipFile):
+            with self.lock:
+                if self.entries.get(url) is entry:
+                    del self.entries[url]
+                    self._unref(entry)
+                    self.dirty = True
+            return None
+        with self.lock:
+            entry["used"] = time.time()
+            self.dirty = True
+        return CachedPage(url, entry["status"], content, entry["headers"], source)
+
+    def get(self, url: str) -> Optional[CachedPage]:
+        """The cached response for url, whatever its age, without any request."""
+        entry = self.entries.get(url)
+        return self._page(url, entry, "cache") if entry else None
+
+    def put(self, url: str, response) -> CachedPage:
+        """Store a 200 response (anything with status_code, content and headers) under url."""
+        body = response.content
+        sha = hashlib.sha256(body).hexdigest()
+        blob = self._blob(sha)
+        now = time.time()
+        entry = {"sha256": sha, "size": 0, "status": response.status_code,
+                 "headers": response_headers(response), "fetched": now, "used": now}
+        with self.lock:
+            stored = sha in self.refs
+            if stored:
+                # blobs are only deleted under the lock once unreferenced, so this one stays
+                entry["size"] = self.sizes[sha]
+                self._store(url, entry)
+        if not stored:
+            data = gzip.compress(body, compresslevel=6)
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=blob.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            entry["size"] = len(data)
+            with self.lock:
+                # publish and reference in one step; another thread may have stored the same body
+                if sha in self.refs:
+                    os.unlink(tmp)
+                else:
+                    os.replace(tmp, blob)
+                self._store(url, entry)
+        return CachedPage(url, response.status_code, body, entry["headers"], "network")
+
+    def _store(self, url: str, entry: Dict[str, Any]):
+        """Point url at entry, whose blob is on disk (lock held)."""
+        previous = self.entries.get(url)
+        self.entries[url] = entry
+        self._ref(entry)
+        if previous:
+            self._unref(previous)
+        self.stats["stored"] += 1
+        self.dirty = True
+        self._evict()
+
+    def _evict(self):
+        """Drop least recently used URLs until the blobs fit under the cap (lock held)."""
+        total = sum(self.sizes.values())
+        if total <= self.max_bytes:
+            return
+        for url, entry in sorted(self.entries.items(), key=lambda item: item[1]["used"]):
+            if total <= self.max_bytes:
+                break
+            del self.entries[url]
+            before = len(self.sizes)
+            size = self.sizes[entry["sha256"]]
+            self._unref(entry)
+            if len(self.sizes) < before:
+                total -= size
+            self.stats["evicted"] += 1
+            self.dirty = True
+
+    def fetch(self, url: str, download: Callable[[Dict[str, str]], Any], ttl: Optional[float] = None) -> CachedPage:
+        """Response for url from the cache or from download(conditional headers).
+
+        ttl overrides the cache's TTL for this call (0 always revalidates).
+        Only 200 responses are stored; others are returned as they are.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        entry = self.entries.get(url)
+        if entry and (self.offline or time.time() - entry["fetched"] < ttl):
+            page = self._page(url, entry, "cache")
+            if page:
+                self._count("hits")
+                return page
+            entry = None
+        if self.offline:
+            self._count("misses")
+            raise CacheMiss(f"{url} is not in the HTTP cache (offline)")
+        headers = {}
+        if entry:
+            if entry["headers"].get("etag"):
+                headers["If-None-Match"] = entry["headers"]["etag"]
+            if entry["headers"].get("last-modified"):
+                headers["If-Modified-Since"] = entry["headers"]["last-modified"]
+        response = download(headers)
+        if response.status_code == 304 and entry:
+            with self.lock:
+                entry["fetched"] = time.time()
+                entry["headers"].update({k: v for k, v in response_headers(response).items()
+                                         if k in ("etag", "last-modified", "cache-control", "expires")})
+                self.dirty = True
+            page = self._page(url, entry, "revalidated")
+            if page:
+                self._count("revalidated")
+                return page
+            response = download({})
+        self._count("downloaded")
+        if response.status_code == 200:
+            return self.put(url, response)
+        return CachedPage(url, response.status_code, response.content, response_headers(response), "network")
+
+    def _count(self, key: str):
+        with self.lock:
+            self.stats[key] += 1
+
+    def gc(self) -> int:
+        """Apply the size cap and delete blobs no URL refers to; returns the number of files removed."""
+        removed = 0
+        with self.lock:
+            self._evict()
+            for blob in (self.root / "blobs").glob("*/*"):
+                if blob.name.endswith(".tmp") or blob.name[:-3] not in self.refs:
+                    blob.unlink()
+                    removed += 1
+        return removed
+
+    def save(self) -> bool:
+        """Write the index (atomically) if it changed; returns whether it was written."""
+        with self.lock:
+            if not self.dirty:
+                return False
+            self.root.mkdir(parents=True, exist_ok=True)
+            path = self.root / INDEX_FILE
+            tmp = path.with_name(path.name + ".tmp")
+            tmp.write_text(json.dumps({"version": VERSION, "urls": self.entries}, ensure_ascii=False),
+                           encoding="utf-8")
+            os.replace(tmp, path)
+            self.dirty = False
+            return True
+
+    def summary(self) -> str:
+        with self.lock:
+            s = dict(self.stats)
+        return (f"{s['hits']} cached, {s['revalidated']} revalidated, {s['downloaded']} downloaded, "
+                f"{s['evicted']} evicted; {len(self.entries)} URLs in {len(self.sizes)} blobs, "
+                f"{self.total_bytes() / 2**20:.1f} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or trim the shared HTTP response cache")
+    parser.add_argument("--dir", type=pathlib.Path, default=CACHE_DIR)
+    parser.add_argument("--max-mb", type=float, default=DEFAULT_MAX_MB, help="size cap for --gc")
+    parser.add_argument("--gc", action="store_true", help="evict down to --max-mb and remove stray blobs")
+    parser.add_argument("--get", metavar="URL", help="print the cached body of URL")
+    args = parser.parse_args()
+    cache = HttpCache(args.dir, max_mb=args.max_mb, offline=True)
+    if args.get:
+        page = cache.get(args.get)
+        if page is None:
+            print(f"ERROR: {args.get} is not cached", file=sys.stderr)
+            sys.exit(1)
+        sys.stdout.write(page.text)
+        return
+    if args.gc:
+        removed = cache.gc()
+        cache.save()
+        print(f"Removed {removed} stray blobs")
+    by_host: Dict[str, int] = {}
+    for url in cache.entries:
+        host = url.split("/")[2] if "://" in url else url
+        by_host[host] = by_host.get(host, 0) + 1
+    for host, n in sorted(by_host.items(), key=lambda item: -item[1]):
+        print(f"  {n:6d}  {host}")
+    print(cache.summary())
+
+if __name__ == "__main__":
+    main()
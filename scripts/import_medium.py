@@ -5,11 +5,27 @@ Import articles from Medium RSS feeds into the monorepo.
 Usage:
   python scripts/import_medium.py               # uses FEEDS list below
   python scripts/import_medium.py --force       # overwrite existing outputs
+  python scripts/import_medium.py --workers 8 --rate 4
+  python scripts/import_medium.py --force --offline  # re-convert from the HTTP cache only
+  python scripts/import_medium.py --no-default-feeds --feed http://127.0.0.1:8767/hacker/feed  # fake_feed_server.py
 
 Notes:
 - Add or remove feeds in FEEDS below (author/profile or publication feed URLs).
 - If the feed entry lacks full content, the script will fetch the article page and
   attempt to extract main content via trafilatura.
+- Feeds and article pages are fetched concurrently through fetch_engine.py (one
+  keep-alive connection pool, --rate requests per second per host); files are
+  still written one entry at a time in feed order, so output does not depend on
+  which response arrives first.
+- sources/medium/feed_state.json (feed_state.py) keeps each feed's ETag,
+  Last-Modified and content hash plus the entries already imported: feeds are
+  requested conditionally, a run where no feed changed exits without writing
+  anything, and of a changed feed only the new entries are processed
+  (--refresh ignores the state).
+- Article pages (and feeds, for --force / --refresh) go through the HTTP cache
+  in sources/.http_cache (http_cache.py): a page younger than --cache-ttl days
+  is not requested again, so re-running with --force after a conversion change
+  costs one conditional request per feed. --offline makes no requests at all.
 
 Requires:
   pip install feedparser trafilatura markdownify python-frontmatter python-slugify requests pyyaml
@@ -21,13 +37,15 @@ import pathlib
 import datetime
 import json
 import re
-import time
 import feedparser
-import requests
-from trafilatura import extract, fetch_url
+from trafilatura import extract
 from markdownify import markdownify as md
 from slugify import slugify
 import frontmatter
+from markdown_text import md_to_text
+from fetch_engine import DEFAULT_RATE, DEFAULT_WORKERS, FetchEngine
+from feed_state import STATE_FILE, FeedState, entry_key
+from http_cache import DEFAULT_TTL, HttpCache
 
 # EDIT THIS LIST: your Medium profile(s) / publication feed URLs
 FEEDS = [
@@ -37,6 +55,7 @@ FEEDS = [
 
 ROOT = pathlib.Path(".").resolve()
 RAW_DIR = ROOT / "sources" / "medium" / "raw"
+STATE_PATH = RAW_DIR.parent / STATE_FILE
 OUT_CONTENT = ROOT / "content"
 OUT_PLAIN = ROOT / "plain"
 
@@ -46,18 +65,31 @@ for d in (RAW_DIR, OUT_CONTENT, OUT_PLAIN):
 def html_to_md(html: str) -> str:
     return md(html or "", heading_style="ATX", strip=["script", "style"]).strip()
 
-def fetch_full_html(url: str) -> str | None:
+def fetch_feed(engine: FetchEngine, url: str, state: FeedState, refresh: bool = False):
+    """Download one feed, conditionally on the last run's validators unless refresh.
+
+    Returns (response, parsed feed); the response is None if the feed could
+    not be fetched and the parsed feed None if it has not changed. A refresh
+    revalidates the copy in the HTTP cache (offline: just reads it); other runs
+    store what they download there for the next refresh.
+    """
     try:
-        html = fetch_url(url, timeout=60)
-        if not html:
-            # fallback to requests if trafilatura fetch failed
-            r = requests.get(url, timeout=30, headers={"User-Agent": "Mozilla/5.0"})
+        if refresh or engine.offline:
+            r = engine.fetch(url, ttl=0)
+        else:
+            r = engine.get(url, headers=state.conditional_headers(url, ROOT))
+            engine.store(url, r)
+        if r.status_code != 304:
             r.raise_for_status()
-            return r.text
-        return html
     except Exception as e:
-        print(f"[WARN] fetch_full_html failed for {url}: {e}")
-        return None
+        print(f"[WARN] feed fetch failed for {url}: {e}")
+        return None, None
+    if not refresh and state.unchanged(url, r.status_code, r.content, ROOT):
+        return r, None
+    headers = {k.lower(): v for k, v in r.headers.items()}
+    d = feedparser.parse(r.content, response_headers={"content-location": url, **headers})
+    d["href"], d["status"], d["headers"] = url, r.status_code, dict(r.headers)
+    return r, d
 
 def extract_main_html(html: str) -> str | None:
     try:
@@ -82,7 +114,12 @@ def make_slug(title: str, published: datetime.date, feed_slug: str) -> str:
     # ensure uniqueness-ish by including feed nickname (short)
     return f"{s}"
 
-def process_entry(entry: dict, feed_url: str, force: bool = False) -> None:
+def plan_entry(entry: dict, feed_url: str, force: bool = False, planned: set | None = None) -> dict | None:
+    """Work out ids, paths and feed content for an entry; None if it is skipped.
+
+    planned holds the destinations claimed earlier in this run, so two entries
+    with the same slug behave as if they had been written one after another.
+    """
     # id & dates
     published_parsed = entry.get("published_parsed") or entry.get("updated_parsed")
     if published_parsed:
@@ -111,9 +148,9 @@ def process_entry(entry: dict, feed_url: str, force: bool = False) -> None:
     dest_md = dest_dir / "index.md"
     dest_txt = OUT_PLAIN / f"{nid}.txt"
 
-    if dest_md.exists() and not force:
+    if (dest_md.exists() or dest_md in (planned or ())) and not force:
         print(f"[SKIP] {nid} (already exists)")
-        return
+        return None
 
     # get HTML content from feed if available
     content_html = ""
@@ -126,13 +163,33 @@ def process_entry(entry: dict, feed_url: str, force: bool = False) -> None:
     elif entry.get("summary_detail"):
         content_html = entry.get("summary") or ""
 
-    # If content is short or looks like a teaser, fetch the page and extract
-    if not content_html or len(content_html) < 200:
-        fetched = fetch_full_html(canonical or link)
-        if fetched:
-            main = extract_main_html(fetched)
-            if main:
-                content_html = main
+    if planned is not None:
+        planned.add(dest_md)
+    return {"entry": entry, "feed_url": feed_url, "nid": nid, "title": title, "date": date_str,
+            "canonical": canonical, "page_url": canonical or link, "content_html": content_html,
+            "dest_md": dest_md, "dest_txt": dest_txt}
+
+def needs_page(job: dict) -> bool:
+    """Whether the feed only has a teaser, so the article page has to be fetched."""
+    return not job["content_html"] or len(job["content_html"]) < 200
+
+def page_content(job: dict, page_html: str | None) -> str:
+    """Main content of the article page if there is one, else the entry's own HTML."""
+    if page_html:
+        main = extract_main_html(page_html)
+        if main:
+            return main
+    return job["content_html"]
+
+def fetch_content(job: dict, engine: FetchEngine) -> str:
+    """Entry HTML; if the feed only has a teaser, the article page's main content (runs on a worker)."""
+    return page_content(job, engine.text(job["page_url"]) if needs_page(job) else None)
+
+def render_entry(job: dict, content_html: str) -> tuple[str, str]:
+    """Text of the entry's index.md and of its plain-text mirror."""
+    entry = job["entry"]
+    nid, title, date_str, canonical = job["nid"], job["title"], job["date"], job["canonical"]
+    feed_url = job["feed_url"]
 
     body_md = html_to_md(content_html or "")
     # If still empty, fall back to summary or leave blank but include metadata
@@ -152,33 +209,89 @@ def process_entry(entry: dict, feed_url: str, force: bool = False) -> None:
         "original_format": "html",
     }
 
-    # persist
-    dest_dir.mkdir(parents=True, exist_ok=True)
     post = frontmatter.Post(body_md, **fm)
-    dest_md.write_text(frontmatter.dumps(post), encoding="utf-8")
-    dest_txt.write_text(re.sub(r"(?m)^\s*$", "\n", re.sub(r"\s+", " ", re.sub(r"\n{3,}", "\n\n", re.sub(r"\r", "", re.sub(r"\s+\n", "\n", post.content.strip()))))), encoding="utf-8")
-
-    print(f"[OK]   {nid} -> {dest_md.relative_to(ROOT)}")
-
-def run(feeds: list[str], force: bool = False):
-    for f_url in feeds:
-        print(f"[FEED] {f_url}")
-        d = feedparser.parse(f_url)
-        rawfn = RAW_DIR / (slugify(f_url)[:50] + ".json")
-        rawfn.write_text(json.dumps(d, ensure_ascii=False, default=str, indent=2), encoding="utf-8")
-        entries = d.entries or []
-        print(f"  entries: {len(entries)}")
-        for e in entries:
+    return frontmatter.dumps(post), md_to_text(post.content)
+
+def write_entry(job: dict, content_html: str) -> None:
+    index_md, plain = render_entry(job, content_html)
+    # persist
+    job["dest_md"].parent.mkdir(parents=True, exist_ok=True)
+    job["dest_md"].write_text(index_md, encoding="utf-8")
+    job["dest_txt"].write_text(plain, encoding="utf-8")
+
+    print(f"[OK]   {job['nid']} -> {job['dest_md'].relative_to(ROOT)}")
+
+def run(feeds: list[str], force: bool = False, workers: int = DEFAULT_WORKERS, rate: float = DEFAULT_RATE,
+        refresh: bool = False, cache: HttpCache | None = None):
+    state = FeedState.load(STATE_PATH)
+    with FetchEngine(workers, rate, cache=cache) as engine:
+        # feeds are downloaded concurrently, then saved and planned in list order
+        fetched = engine.map(lambda url: fetch_feed(engine, url, state, refresh or force), feeds)
+        if not any(d is not None for _, d in fetched):
+            # nothing published since the last run: no raw JSON, no entries, state only if validators moved
+            for f_url, (r, _) in zip(feeds, fetched):
+                if r is not None:
+                    state.refresh_validators(f_url, r.headers)
+            state.save()
+            unchanged = sum(r is not None for r, _ in fetched)
+            print(f"No feed changed since the last run ({unchanged} not modified, {len(feeds) - unchanged} failed; "
+                  f"{engine.summary()})")
+            return
+        jobs = []
+        planned: set = set()
+        outputs: dict = {f_url: {} for f_url in feeds}
+        failed: set = set()
+        for f_url, (r, d) in zip(feeds, fetched):
+            print(f"[FEED] {f_url}")
+            if r is None:
+                continue
+            if d is None:
+                print("  not modified")
+                state.refresh_validators(f_url, r.headers)
+                continue
+            rawfn = RAW_DIR / (slugify(f_url)[:50] + ".json")
+            rawfn.write_text(json.dumps(d, ensure_ascii=False, default=str, indent=2), encoding="utf-8")
+            entries = d.entries or []
+            fresh = entries if refresh or force else state.new_entries(f_url, entries, ROOT)
+            print(f"  entries: {len(entries)} ({len(fresh)} new)")
+            for e in fresh:
+                try:
+                    job = plan_entry(e, f_url, force=force, planned=planned)
+                except Exception as exc:
+                    print(f"[ERROR] processing entry: {exc}")
+                    failed.add(f_url)
+                    continue
+                if job:
+                    jobs.append(job)
+        contents = engine.map(lambda job: fetch_content(job, engine), jobs)
+        for job, content_html in zip(jobs, contents):
             try:
-                process_entry(e, f_url, force=force)
+                write_entry(job, content_html)
             except Exception as exc:
                 print(f"[ERROR] processing entry: {exc}")
-            time.sleep(0.1)
+                failed.add(job["feed_url"])
+                continue
+            outputs[job["feed_url"]][entry_key(job["entry"])] = job["dest_md"].relative_to(ROOT).as_posix()
+        for f_url, (r, d) in zip(feeds, fetched):
+            if d is not None:
+                state.record(f_url, r.headers, r.content, outputs[f_url], complete=f_url not in failed)
+        state.save()
+        print(f"Fetched: {engine.summary()}")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--force", action="store_true", help="overwrite existing outputs")
     parser.add_argument("--feed", action="append", help="additional feed URL to process (can be repeated)")
+    parser.add_argument("--no-default-feeds", action="store_true", help="process only the --feed URLs")
+    parser.add_argument("--refresh", action="store_true",
+                        help="ignore feed_state.json: download every feed in full and process every entry")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="concurrent requests")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="requests per second per host")
+    parser.add_argument("--cache-ttl", type=float, default=DEFAULT_TTL / 86400,
+                        help="days a cached article page is used without revalidating it")
+    parser.add_argument("--offline", action="store_true",
+                        help="serve feeds and pages from the HTTP cache only, no requests")
     args = parser.parse_args()
-    FEEDS_RUN = FEEDS + (args.feed or [])
-    run(FEEDS_RUN, force=args.force)
+    FEEDS_RUN = ([] if args.no_default_feeds else FEEDS) + (args.feed or [])
+    run(FEEDS_RUN, force=args.force, workers=args.workers, rate=args.rate, refresh=args.refresh,
+        cache=HttpCache(ttl=args.cache_ttl * 86400, offline=args.offline))
@@ -1,4 +1,284 @@
-# stub: will fetch via /wp-json/wp/v2/posts (Phase B)
-# ref: https://developer.wordpress.org/rest-api/reference/posts/
+#!/usr/bin/env python3
+"""
+Import Metaphor Hacker posts from WordPress via the REST API (/wp-json/wp/v2/posts).
+
+Usage:
+  python scripts/import_wordpress.py                   # sync https://metaphorhacker.net
+  python scripts/import_wordpress.py --force           # overwrite existing outputs
+  python scripts/import_wordpress.py --full            # ignore the high-water mark, list every post
+  python scripts/import_wordpress.py --site http://127.0.0.1:8770   # fake_wordpress_server.py
+
+Notes:
+- Posts are listed 100 per page, ordered by id, with _fields limited to what
+  the importer uses. The first page's X-WP-TotalPages header tells how many
+  more there are, and those are fetched concurrently through fetch_engine.py
+  (--workers, --rate per host). Category and tag names are looked up in
+  batches and remembered.
+- Syncs are incremental: sources/wordpress/sync_state.json keeps, per site,
+  the newest `modified` time seen (the high-water mark, advanced only after a
+  complete listing) and the output of every post. The next run asks only for
+  posts with modified_after the mark (less a minute's overlap; posts whose
+  `modified` is unchanged are skipped), so a night with no edits costs one
+  request.
+- Output is content/<year>/<slug>/index.md and plain/mh-YYYYMMDD-<slug>.txt,
+  using the WordPress slug and publication date, so posts already ingested from
+  the Markdown export (ingest_mh_md.py) land on the same paths. Those files are
+  left alone unless --force; posts this importer wrote are updated when edited.
+- Each written post's JSON is kept in sources/wordpress/raw for rerender.py.
+- Deleted or unpublished posts are not removed.
+
+Requires:
+  pip install markdownify python-frontmatter python-slugify requests
+"""
+
+from __future__ import annotations
+import argparse
+import datetime
+import html
+import json
+import os
+import pathlib
+import re
+from urllib.parse import unquote, urlsplit
+from markdownify import markdownify as md
+from slugify import slugify
+import frontmatter
+from markdown_text import md_to_text
+from fetch_engine import DEFAULT_RATE, DEFAULT_WORKERS, FetchEngine
+
+SITE = "https://metaphorhacker.net"
+SOURCE_NAME = "Metaphor Hacker"
+PER_PAGE = 100
+FIELDS = ("id", "date", "modified", "slug", "link", "title", "content", "categories", "tags")
+TAXONOMIES = ("categories", "tags")
+# re-list posts modified this long before the high-water mark, so an edit
+# saved in the same second as the last sync is not missed
+OVERLAP = datetime.timedelta(minutes=1)
+STATE_VERSION = 1
+
+ROOT = pathlib.Path(".").resolve()
+RAW_DIR = ROOT / "sources" / "wordpress" / "raw"
+STATE_PATH = RAW_DIR.parent / "sync_state.json"
+OUT_CONTENT = ROOT / "content"
+OUT_PLAIN = ROOT / "plain"
+
+for d in (RAW_DIR, OUT_CONTENT, OUT_PLAIN):
+    d.mkdir(parents=True, exist_ok=True)
+
+def html_to_md(html_text: str) -> str:
+    return md(html_text or "", heading_style="ATX", strip=["script", "style"]).strip()
+
+def rendered_text(value) -> str:
+    """Plain text of a WordPress {"rendered": html} field (titles come entity-encoded)."""
+    if isinstance(value, dict):
+        value = value.get("rendered", "")
+    return re.sub(r"\s+", " ", html.unescape(re.sub(r"<[^>]+>", "", value or ""))).strip()
+
+def load_state() -> dict:
+    try:
+        data = json.loads(STATE_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {"version": STATE_VERSION, "sites": {}}
+    if data.get("version") != STATE_VERSION:
+        return {"version": STATE_VERSION, "sites": {}}
+    return data
+
+def save_state(state: dict) -> None:
+    tmp = STATE_PATH.with_name(STATE_PATH.name + ".tmp")
+    tmp.write_text(json.dumps(state, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, STATE_PATH)
+
+def get_json(engine: FetchEngine, url: str, params: dict):
+    """(decoded JSON, response headers) of a REST request; raises on HTTP errors."""
+    r = engine.get(url, params=params)
+    r.raise_for_status()
+    return r.json(), r.headers
+
+def fetch_posts(engine: FetchEngine, site: str, modified_after: str | None = None) -> tuple[list[dict], bool]:
+    """Every post (modified after modified_after, if given), ordered by id.
+
+    Returns (posts, complete): complete is False if a page failed or fewer
+    posts arrived than X-WP-Total announced (say, a post was deleted mid-sync).
+    """
+    url = f"{site}/wp-json/wp/v2/posts"
+    params = {"per_page": PER_PAGE, "orderby": "id", "order": "asc", "_fields": ",".join(FIELDS)}
+    if modified_after:
+        params["modified_after"] = modified_after
+    first, headers = get_json(engine, url, dict(params, page=1))
+    total = int(headers.get("X-WP-Total", len(first)))
+    pages = int(headers.get("X-WP-TotalPages", 1))
+
+    def fetch_page(page: int) -> list[dict] | None:
+        try:
+            return get_json(engine, url, dict(params, page=page))[0]
+        except Exception as e:
+            print(f"[WARN] page {page} of {url} failed: {e}")
+            return None
+
+    rest = engine.map(fetch_page, range(2, pages + 1))
+    posts = {p["id"]: p for batch in [first] + [b for b in rest if b] for p in batch}
+    complete = all(b is not None for b in rest) and len(posts) >= total
+    return [posts[i] for i in sorted(posts)], complete
+
+def fetch_terms(engine: FetchEngine, site: str, taxonomy: str, ids: set[int]) -> dict[str, str]:
+    """Names of the given category / tag ids, PER_PAGE ids per request."""
+    url = f"{site}/wp-json/wp/v2/{taxonomy}"
+    ids_sorted = sorted(ids)
+    batches = [ids_sorted[i:i + PER_PAGE] for i in range(0, len(ids_sorted), PER_PAGE)]
+
+    def fetch_batch(batch: list[int]) -> list[dict]:
+        try:
+            params = {"include": ",".join(map(str, batch)), "per_page": PER_PAGE, "_fields": "id,name"}
+            return get_json(engine, url, params)[0]
+        except Exception as e:
+            print(f"[WARN] {taxonomy} lookup failed: {e}")
+            return []
+
+    return {str(t["id"]): html.unescape(t["name"]) for batch in engine.map(fetch_batch, batches) for t in batch}
+
+def post_paths(post: dict) -> tuple[str, pathlib.Path, pathlib.Path]:
+    """(id, index.md path, plain-text path) of a post."""
+    date_str = post["date"][:10]
+    slug = slugify(unquote(post.get("slug") or "")) or slugify(rendered_text(post.get("title")) or "untitled", max_length=80)
+    nid = f"mh-{date_str.replace('-', '')}-{slug}"
+    return nid, OUT_CONTENT / date_str[:4] / slug / "index.md", OUT_PLAIN / f"{nid}.txt"
+
+def render_post(raw: dict) -> tuple[str, str]:
+    """Text of the post's index.md and of its plain-text mirror, from a raw record (see write_post)."""
+    post = raw["post"]
+    nid, _, _ = post_paths(post)
+    body_md = html_to_md((post.get("content") or {}).get("rendered", ""))
+    fm = {
+        "id": nid,
+        "title": rendered_text(post.get("title")) or "Untitled",
+        "date": post["date"][:10],
+        "source": {"name": SOURCE_NAME, "url": raw["site"] + "/"},
+        "canonical_url": post.get("link") or "",
+        "tags": raw["tags"],
+        "categories": raw["categories"],
+        "language": "en",
+        "license": "CC-BY-4.0",
+        "original_format": "html",
+    }
+    doc = frontmatter.Post(body_md, **fm)
+    return frontmatter.dumps(doc), md_to_text(doc.content)
+
+def raw_path(site: str, post_id: int) -> pathlib.Path:
+    return RAW_DIR / f"{slugify(urlsplit(site).netloc)}-{post_id}.json"
+
+def write_post(raw: dict) -> None:
+    """Write a post's raw record, index.md and plain mirror.
+
+    raw is {"site", "post" (as listed), "categories", "tags" (names)}.
+    """
+    nid, dest_md, dest_txt = post_paths(raw["post"])
+    index_md, plain = render_post(raw)
+    raw_path(raw["site"], raw["post"]["id"]).write_text(json.dumps(raw, ensure_ascii=False, indent=2), encoding="utf-8")
+    dest_md.parent.mkdir(parents=True, exist_ok=True)
+    dest_md.write_text(index_md, encoding="utf-8")
+    dest_txt.write_text(plain, encoding="utf-8")
+    print(f"[OK]   {nid} -> {dest_md.relative_to(ROOT)}")
+
+def front_matter_field(head: str, key: str) -> str | None:
+    m = re.search(rf"^{key}:\s*['\"]?([^'\"\n]+)", head, flags=re.M)
+    return m.group(1).strip() if m else None
+
+def written_here(dest_md: pathlib.Path, nid: str) -> bool:
+    """Whether an existing index.md is this post as written by this importer (not the Markdown export)."""
+    try:
+        head = dest_md.read_text(encoding="utf-8")[:4096]
+    except FileNotFoundError:
+        return False
+    return front_matter_field(head, "id") == nid and front_matter_field(head, "original_format") == "html"
+
+def remove_output(rel: str) -> None:
+    """Delete an earlier output of this importer (a post whose slug or date changed)."""
+    dest_md = ROOT / rel
+    try:
+        head = dest_md.read_text(encoding="utf-8")[:4096]
+    except FileNotFoundError:
+        return
+    nid = front_matter_field(head, "id")
+    if nid:
+        (OUT_PLAIN / f"{nid}.txt").unlink(missing_ok=True)
+    dest_md.unlink()
+    if not any(dest_md.parent.iterdir()):
+        dest_md.parent.rmdir()
+    print(f"[DEL]  {rel}")
+
+def needs_sync(post: dict, known: dict) -> bool:
+    """Whether a listed post is new, edited, or its output (ours or not) has gone."""
+    entry = known.get(str(post["id"]))
+    if not entry or entry.get("modified") != post["modified"]:
+        return True
+    rel = entry.get("path") or post_paths(post)[1].relative_to(ROOT).as_posix()
+    return not (ROOT / rel).exists()
+
+def run(site: str = SITE, force: bool = False, full: bool = False, workers: int = DEFAULT_WORKERS,
+        rate: float = DEFAULT_RATE):
+    state = load_state()
+    site_state = state["sites"].setdefault(site, {"modified_after": None, "posts": {},
+                                                  "terms": {t: {} for t in TAXONOMIES}})
+    mark = None if full or force else site_state.get("modified_after")
+    since = (datetime.datetime.fromisoformat(mark) - OVERLAP).isoformat() if mark else None
+    with FetchEngine(workers, rate) as engine:
+        try:
+            posts, complete = fetch_posts(engine, site, since)
+        except Exception as e:
+            print(f"[ERROR] listing posts of {site} failed: {e}")
+            return
+        print(f"[SITE] {site}: {len(posts)} posts" + (f" modified after {since}" if since else ""))
+
+        known = site_state["posts"]
+        changed = [p for p in posts if force or needs_sync(p, known)]
+        terms = site_state["terms"]
+        for taxonomy in TAXONOMIES:
+            missing = {i for p in changed for i in p.get(taxonomy, []) if str(i) not in terms[taxonomy]}
+            if missing:
+                terms[taxonomy].update(fetch_terms(engine, site, taxonomy, missing))
+
+        written = skipped = 0
+        for post in changed:
+            key = str(post["id"])
+            nid, dest_md, _ = post_paths(post)
+            rel = dest_md.relative_to(ROOT).as_posix()
+            previous = known.get(key, {}).get("path")
+            if dest_md.exists() and not force and previous != rel and not written_here(dest_md, nid):
+                # not ours: e.g. the same post ingested from the Markdown export
+                print(f"[SKIP] {nid} (exists)")
+                raw_path(site, post["id"]).unlink(missing_ok=True)
+                known[key] = {"modified": post["modified"], "path": None}
+                skipped += 1
+                continue
+            raw = {"site": site, "post": post,
+                   "categories": [terms["categories"].get(str(i), str(i)) for i in post.get("categories", [])],
+                   "tags": [terms["tags"].get(str(i), str(i)) for i in post.get("tags", [])]}
+            try:
+                write_post(raw)
+            except Exception as exc:
+                print(f"[ERROR] processing post {key}: {exc}")
+                complete = False
+                continue
+            if previous and previous != rel:
+                remove_output(previous)
+            known[key] = {"modified": post["modified"], "path": rel}
+            written += 1
+
+        if complete and posts:
+            newest = max(p["modified"] for p in posts)
+            if not mark or newest > mark:
+                site_state["modified_after"] = newest
+        site_state["synced"] = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+        save_state(state)
+        print(f"Posts: {written} written, {skipped} skipped, {len(posts) - len(changed)} unchanged; "
+              f"high-water mark {site_state['modified_after']}; fetched: {engine.summary()}")
+
 if __name__ == "__main__":
-    print("stub")
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--site", default=SITE, help="WordPress site root (default: %(default)s)")
+    parser.add_argument("--force", action="store_true", help="list every post and overwrite existing outputs")
+    parser.add_argument("--full", action="store_true", help="ignore the high-water mark (outputs still skipped)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="concurrent requests")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="requests per second per host")
+    args = parser.parse_args()
+    run(args.site.rstrip("/"), force=args.force, full=args.full, workers=args.workers, rate=args.rate)
@@ -15,6 +15,7 @@ import pathlib
 import re
 from datetime import datetime
 import frontmatter
+from markdown_text import md_to_text
 
 ROOT = pathlib.Path(".").resolve()
 IN_DIR = ROOT / "sources" / "metaphorhacker_md" / "incoming"
@@ -25,27 +26,6 @@ OUT_PLAIN.mkdir(parents=True, exist_ok=True)
 
 FILENAME_RE = re.compile(r"^(?P<y>\d{4})-(?P<m>\d{2})-(?P<d>\d{2})-(?P<slug>.+)\.md$", re.IGNORECASE)
 
-def md_to_text(md_body: str) -> str:
-    """Minimal Markdown → plain text cleanup (keeps code, drops markup)."""
-    text = md_body
-    # strip YAML front matter if any slipped in
-    text = re.sub(r"(?s)^---\n.*?\n---\n", "", text).strip()
-    # images ![alt](url) -> alt
-    text = re.sub(r"!\[([^\]]*)\]\([^)]+\)", r"\1", text)
-    # links [text](url) -> text (url)
-    text = re.sub(r"\[([^\]]+)\]\(([^)]+)\)", r"\1 (\2)", text)
-    # inline code `code` -> code
-    text = text.replace("`", "")
-    # bold/italics **strong** *em* -> strong / em
-    text = text.replace("**", "").replace("*", "").replace("_", "")
-    # headings: remove leading # and extra spaces
-    text = re.sub(r"^#{1,6}\s*", "", text, flags=re.MULTILINE)
-    # blockquotes: drop >
-    text = re.sub(r"^\s*>\s?", "", text, flags=re.MULTILINE)
-    # horizontal rules
-    text = re.sub(r"^\s*[-*_]{3,}\s*$", "", text, flags=re.MULTILINE)
-    return text.strip()
-
 def derive_title(content_body: str, slug: str) -> str:
     # Use first ATX heading (# Title) if present
     m = re.search(r"^\s*#\s+(.+)$", content_body, flags=re.MULTILINE)
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Shared Markdown -> plain text converter.
+
+Used for the plain/*.txt mirrors written by every importer and for the corpus
+text in normalize_and_build_dataset.py, so all sources go through the same
+rules:
+
+  - YAML front matter at the top is dropped
+  - fenced code blocks and `inline code` keep their inner text verbatim
+  - images -> alt text, links -> "text (url)" (an image inside a link keeps its alt)
+  - backslash escapes give the literal character (\\* -> *)
+  - heading markers, blockquote markers and horizontal rules are removed
+  - **strong** / *em* / __strong__ / _em_ keep their text; the delimiters are
+    removed only as an opener / closer pair within one paragraph, so a lone
+    asterisk ("5* more", "a ** b", a "* item" bullet) stays, and "_" pairs
+    only at word boundaries (snake_case and URLs are kept)
+  - trailing whitespace is trimmed and runs of blank lines collapse to one
+
+Compared with the normalizer it replaced (legacy_normalize in
+scripts/bench_md_to_text.py), emphasis delimiters, horizontal rules and
+escaping backslashes no longer reach the corpus, and whitespace-only lines
+collapse like empty ones; on content/ that changes most outputs (89 of 126
+when this was written), almost all by dropping "**" / "*" / "---".
+
+The body is tokenized by one compiled alternation and rewritten in a single
+left-to-right scan, instead of a chain of whole-string re.sub passes (only
+lines with trailing blanks get a second, targeted pass, and emphasis text is
+rescanned for the markup nested in it).
+scripts/bench_md_to_text.py compares it with the chains it replaced.
+
+Bump VERSION whenever the output of md_to_text() changes.
+"""
+from __future__ import annotations
+import re
+
+VERSION = 2
+
+# Emphasis content: escaped characters or anything up to a blank line
+_INNER = r"(?:\\.|[^\\\n]|\n(?![ \t]*\n))+?"
+
+# Every token starts with one of the markup characters in the leading class,
+# which lets the regex engine skip plain prose in C. Each branch then checks
+# which character it was (lookbehind) and whether it sits at a line start.
+_TOKEN_RE = re.compile(
+    r"[`#>!\[*_\n\\-](?:" + "|".join([
+        r"(?P<fence>(?<=`)(?<![^\n]`)``[^\n]*\n(?P<code>.*?)```)",
+        r"(?P<span>(?<=`)(?<!``)(?P<inline>[^`\n]+)`)",
+        r"(?P<tick>(?<=`)`*)",
+        r"(?P<escape>(?<=\\)[!-/:-@\[-`{-~])",
+        # a rule takes the blank lines after it, so it leaves a single paragraph break
+        r"(?P<hr>(?:(?<=-)(?<![^\n]-)(?:[ \t]*-){2,}"
+        r"|(?<=\*)(?<![^\n]\*)(?:[ \t]*\*){2,}"
+        r"|(?<=_)(?<![^\n]_)(?:[ \t]*_){2,})[ \t]*(?:\n(?:[ \t]*\n)*|\Z))",
+        r"(?P<heading>(?<=#)(?<![^\n]#)#{0,5}[ \t]*)",
+        r"(?P<quote>(?<=>)(?<![^\n]>)>*[ \t]?)",
+        r"(?P<image>(?<=!)\[(?P<alt>[^\]]*)\]\([^)]+\))",
+        r"(?P<link>(?<=\[)(?P<text>(?:!\[[^\]]*\]\([^)]+\)|[^\]])+)\]\((?P<url>[^)]+)\))",
+        # an opener is followed by non-space, a closer preceded by one; "_" pairs
+        # only at word boundaries, and unpaired delimiters stay as they are
+        r"(?P<strong>(?<=\*)\*(?!\s)(?P<st>" + _INNER + r")(?<!\s)\*\*(?=\*\*|(?!\*))"
+        r"|(?<=_)(?<![\w_]_)_(?!\s)(?P<ust>" + _INNER + r")(?<!\s)__(?=__|(?![\w_])))",
+        r"(?P<em>(?<=\*)(?<![\w*]\*)(?![\s*])(?P<et>" + _INNER + r")(?<![\s*])\*(?!\*)"
+        r"|(?<=_)(?<![\w_]_)(?![\s_])(?P<uet>" + _INNER + r")(?<![\s_])_(?![\w_]))",
+        r"(?P<blanks>(?<=\n)(?:[ \t]*\n)+)",
+    ]) + ")",
+    re.M | re.S,
+)
+_IMAGE_RE = re.compile(r"!\[([^\]]*)\]\([^)]+\)")
+_TRAILING_RE = re.compile(r"[ \t][ \t]*$", re.M)
+
+def _emphasis_text(text: str) -> str:
+    # the sentinel keeps markup at the start of the span from counting as a line start
+    return _TOKEN_RE.sub(_replace, "\0" + text)[1:]
+
+def _replace(m: re.Match) -> str:
+    kind = m.lastgroup
+    if kind == "fence":
+        return m.group("code")
+    if kind == "span":
+        return m.group("inline")
+    if kind == "escape":
+        return m.group("escape")
+    if kind == "image":
+        return m.group("alt")
+    if kind == "link":
+        text = _IMAGE_RE.sub(r"\1", m.group("text"))
+        return f"{text} ({m.group('url')})"
+    if kind == "strong":
+        return _emphasis_text(m.group("st") or m.group("ust"))
+    if kind == "em":
+        return _emphasis_text(m.group("et") or m.group("uet"))
+    if kind == "blanks":
+        return "\n\n"
+    # tick, hr, heading, quote
+    return ""
+
+def strip_front_matter(md_body: str) -> str:
+    if md_body.startswith("---\n"):
+        end = md_body.find("\n---\n", 3)
+        if end != -1:
+            return md_body[end + 5:]
+    return md_body
+
+def md_to_text(md_body: str) -> str:
+    """Convert a Markdown body to plain text in one scan."""
+    t = _TOKEN_RE.sub(_replace, strip_front_matter(md_body or "").strip())
+    # trailing blanks cannot be dropped from inside the scan (they are emitted
+    # before the newline is seen); most bodies have none, so check first
+    if " \n" in t or "\t\n" in t:
+        t = _TRAILING_RE.sub("", t)
+    return t.strip()
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Metadata bitsets aligned with the vectors of dataset/faiss.index, so a search
+restricted to e.g. "Metaphor Hacker posts from 2018" hands FAISS an ID
+selector instead of over-fetching and filtering in Python.
+
+dataset/faiss_meta.npz, written by build_embeddings.py after the index:
+
+  labels  int64[n]                  label of the index's internal vector i
+                                    (its id map; TOMBSTONE for removed vectors)
+  dates   int32[n]                  yyyymmdd of the vector's document, 0 if undated
+  keys    str[n_keys]               "source:Medium", "tag:AI", "year:2018", "language:en"
+  bits    uint8[n_keys, ceil(n/8)]  one packed little-endian bitset per key
+
+Bits follow the index's internal order, not faiss_ids.json: after
+incremental updates the two differ, which is why the file is rewritten from
+the id map on every build. Tombstones have no bits, so they never match.
+Positions in the id map are the inner index's own ids, which is what
+IDSelectorBitmap tests, because no kind is ever compacted behind the map:
+flat and sq8 remove from both together, HNSW leaves tombstones, and IVF
+indexes are rebuilt instead of removing in place (faiss_index.IVF).
+
+A filter is a dict of field -> value or list of values (source, tag, year,
+language; values of one field are OR-ed, fields AND-ed) plus optional
+"from" / "to" dates compared as ISO prefixes ("2018" to "2018" is the whole
+year; undated documents never match a date bound). select() combines the
+bitsets into one bitmap for faiss.IDSelectorBitmap. filtered_search() scores
+the matching vectors exactly when there are at most BRUTE_FORCE_MAX of them:
+a graph or IVF search with a sparse selector wades through non-matching
+neighbours, so for a selective filter one matrix product over the selected
+rows of embeddings.npy is both faster and exact. Larger selections search
+the index with the selector, efSearch / nprobe widened by the selection's
+sparsity (up to MAX_WIDEN times) to keep recall.
+
+Usage:
+  python scripts/metadata_filter.py                       # keys and vector counts
+  python scripts/metadata_filter.py --source "Metaphor Hacker" --from 2018 --to 2018
+  python scripts/metadata_filter.py --check               # filtered search after incremental updates
+
+Dependencies:
+  pip install numpy faiss-cpu
+"""
+from __future__ import annotations
+import argparse
+import os
+import pathlib
+import tempfile
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import faiss
+
+from faiss_index import (KINDS, QUANTIZED, RESCORE_FACTOR, SEED, TOMBSTONE, faiss_labels, incremental_index,
+                         index_labels, normalized, rescore, search_positions, synthetic_matrix)
+
+REPO = pathlib.Path(".").resolve()
+DATASET = REPO / "dataset"
+META_FILE = "faiss_meta.npz"
+FIELDS = ("source", "tag", "year", "language")
+# selections up to this many vectors are scored exactly instead of through the index
+# (about where a single exact query costs as much as a widened filtered HNSW search)
+BRUTE_FORCE_MAX = 4096
+# cap on how much a sparse selection widens the index search (efSearch / nprobe)
+MAX_WIDEN = 16
+
+def _values(value) -> List[str]:
+    if value is None or value == "":
+        return []
+    return [str(v) for v in (value if isinstance(value, (list, tuple)) else [value])]
+
+def parse_filters(raw: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Normalize a filter dict: {field: [values]} for FIELDS plus "from" / "to" strings."""
+    raw = raw or {}
+    unknown = set(raw) - set(FIELDS) - {"from", "to"}
+    if unknown:
+        raise ValueError(f"unknown filter field(s): {', '.join(sorted(unknown))}")
+    filters: Dict[str, Any] = {f: _values(raw.get(f)) for f in FIELDS if _values(raw.get(f))}
+    for bound in ("from", "to"):
+        if raw.get(bound):
+            filters[bound] = str(raw[bound])
+    return filters
+
+def filter_key(filters: Dict[str, Any]) -> Tuple:
+    return tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in filters.items()))
+
+def date_number(date: Optional[str], fill: str = "0") -> int:
+    """"2018-03-04" -> 20180304; a prefix is padded with fill ("2018" -> 20180000 / 20189999)."""
+    digits = "".join(ch for ch in (date or "")[:10] if ch.isdigit())
+    return int(digits.ljust(8, fill)[:8]) if digits else 0
+
+def document_keys(meta: Dict[str, Any]) -> List[str]:
+    keys = []
+    if meta.get("source"):
+        keys.append(f"source:{meta['source']}")
+    keys.extend(f"tag:{t}" for t in meta.get("tags") or [])
+    if meta.get("date"):
+        keys.append(f"year:{str(meta['date'])[:4]}")
+    if meta.get("language"):
+        keys.append(f"language:{meta['language']}")
+    return keys
+
+def matches(meta: Dict[str, Any], filters: Dict[str, Any]) -> bool:
+    """Whether one document's metadata passes filters (same rules as the bitsets)."""
+    keys = set(document_keys(meta))
+    for field in FIELDS:
+        if field in filters and not any(f"{field}:{v}" in keys for v in filters[field]):
+            return False
+    date = date_number(meta.get("date"))
+    if "from" in filters and not (date and date >= date_number(filters["from"], "0")):
+        return False
+    if "to" in filters and not (date and date <= date_number(filters["to"], "9")):
+        return False
+    return True
+
+def write_metadata(dataset_dir: pathlib.Path, labels: np.ndarray, metas: Dict[int, Dict[str, Any]]) -> Dict[str, Any]:
+    """Write faiss_meta.npz for an index whose internal order has the given labels.
+
+    metas maps each live label to its document's metadata (source, date,
+    tags, language). Returns a small summary.
+    """
+    n = len(labels)
+    per_key: Dict[str, List[int]] = {}
+    dates = np.zeros(n, dtype=np.int32)
+    for pos, label in enumerate(labels.tolist()):
+        meta = metas.get(label) if label != TOMBSTONE else None
+        if meta is None:
+            continue
+        dates[pos] = date_number(meta.get("date"))
+        for key in document_keys(meta):
+            per_key.setdefault(key, []).append(pos)
+    keys = sorted(per_key)
+    bits = np.zeros((len(keys), (n + 7) // 8), dtype=np.uint8)
+    for row, key in enumerate(keys):
+        member = np.zeros(n, dtype=bool)
+        member[per_key[key]] = True
+        bits[row] = np.packbits(member, bitorder="little")
+    path = pathlib.Path(dataset_dir) / META_FILE
+    tmp = path.with_name(path.name + ".tmp.npz")
+    np.savez(tmp, labels=np.asarray(labels, dtype=np.int64), dates=dates,
+             keys=np.array(keys, dtype=str), bits=bits)
+    os.replace(tmp, path)
+    return {"vectors": n, "keys": len(keys), "bytes": path.stat().st_size}
+
+class MetadataIndex:
+    def __init__(self, labels: np.ndarray, dates: np.ndarray, keys: Sequence[str], bits: np.ndarray):
+        self.labels = labels
+        self.dates = dates
+        self.keys = list(keys)
+        self.rows = {key: i for i, key in enumerate(self.keys)}
+        self.bits = bits
+        self.n = len(labels)
+        self.alive = np.packbits(labels != TOMBSTONE, bitorder="little")
+        self._matrix_rows: Optional[Tuple[Any, np.ndarray]] = None
+
+    @classmethod
+    def load(cls, dataset_dir: pathlib.Path = DATASET) -> "MetadataIndex":
+        with np.load(pathlib.Path(dataset_dir) / META_FILE, allow_pickle=False) as data:
+            return cls(data["labels"], data["dates"], [str(k) for k in data["keys"]], data["bits"])
+
+    def matrix_rows(self, rows: Optional[Dict[int, int]]) -> np.ndarray:
+        """Embedding matrix row of every internal position (-1 if none), given a label -> row map.
+
+        Computed once per map; rows=None means labels are rows.
+        """
+        if self._matrix_rows is None or self._matrix_rows[0] is not rows:
+            if rows is None:
+                aligned = np.where(self.labels != TOMBSTONE, self.labels, -1)
+            else:
+                aligned = np.array([rows.get(label, -1) for label in self.labels.tolist()], dtype=np.int64)
+            self._matrix_rows = (rows, aligned)
+        return self._matrix_rows[1]
+
+    def count(self, bitmap: np.ndarray) -> int:
+        return int(np.unpackbits(bitmap, count=self.n, bitorder="little").sum())
+
+    def select(self, filters: Dict[str, Any]) -> Tuple[np.ndarray, int]:
+        """Packed bitmap of the vectors passing filters (from parse_filters()), and how many there are."""
+        bitmap = self.alive.copy()
+        for field in FIELDS:
+            if field not in filters:
+                continue
+            either = np.zeros_like(bitmap)
+            for value in filters[field]:
+                row = self.rows.get(f"{field}:{value}")
+                if row is not None:
+                    either |= self.bits[row]
+            bitmap &= either
+        if "from" in filters or "to" in filters:
+            lo = date_number(filters.get("from"), "0")
+            hi = date_number(filters.get("to"), "9") if filters.get("to") else 99999999
+            bitmap &= np.packbits((self.dates >= max(lo, 1)) & (self.dates <= hi), bitorder="little")
+        return bitmap, self.count(bitmap)
+
+def _empty(n_queries: int, k: int):
+    return np.full((n_queries, k), -np.inf, dtype=np.float32), np.full((n_queries, k), -1, dtype=np.int64)
+
+def exact_search(queries: np.ndarray, k: int, meta: MetadataIndex, bitmap: np.ndarray, matrix: np.ndarray,
+                 rows: Optional[Dict[int, int]] = None):
+    """Exact top k among the vectors set in bitmap, scored against matrix rows."""
+    selected = np.flatnonzero(np.unpackbits(bitmap, count=meta.n, bitorder="little"))
+    positions = meta.matrix_rows(rows)[selected]
+    # read the selected rows in file order for locality on a memmap
+    order = np.argsort(positions)
+    order = order[positions[order] >= 0]
+    if not len(order):
+        return _empty(len(queries), k)
+    labels = meta.labels[selected[order]]
+    scores = queries @ normalized(matrix[positions[order]]).T
+    k = min(k, len(labels))
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    best = np.take_along_axis(scores, top, axis=1)
+    ranked = np.argsort(-best, axis=1, kind="stable")
+    return np.take_along_axis(best, ranked, axis=1), labels[np.take_along_axis(top, ranked, axis=1)]
+
+def filtered_search(index, queries: np.ndarray, k: int, meta: MetadataIndex, bitmap: np.ndarray,
+                    count: int, matrix: Optional[np.ndarray] = None,
+                    rows: Optional[Dict[int, int]] = None, rescore_factor: int = 0):
+    """Search only the vectors set in bitmap; returns (scores, labels) like index.search().
+
+    With the float matrix (and label -> row map) available, selections of
+    up to BRUTE_FORCE_MAX vectors are scored exactly against it, all
+    queries in one matrix product. Otherwise the index's own vectors are
+    searched through an IDSelectorBitmap, with efSearch / nprobe widened by
+    the selection's sparsity; with rescore_factor that many candidates per
+    result are re-ranked exactly (for the quantized kinds).
+    """
+    k = min(k, max(count, 1))
+    if count == 0:
+        return _empty(len(queries), k)
+    if matrix is not None and count <= BRUTE_FORCE_MAX:
+        return exact_search(queries, k, meta, bitmap, matrix, rows)
+    fetch = min(k * max(rescore_factor, 1), count)
+    sel = faiss.IDSelectorBitmap(meta.n, faiss.swig_ptr(bitmap))
+    scores, positions = search_positions(index, queries, fetch, sel, min(meta.n / count, MAX_WIDEN))
+    labels = np.where(positions >= 0, meta.labels[np.maximum(positions, 0)], -1)
+    if matrix is not None and rescore_factor:
+        return rescore(labels, queries, k, matrix, rows)
+    return scores[:, :k], labels[:, :k]
+
+def check_filtered(kind: str, n: int = 20_000, dim: int = 64, remove: int = 100, add: int = 50,
+                   queries: int = 500, k: int = 10) -> List[str]:
+    """Regression check of filtered search on an incrementally updated index.
+
+    Half the rows are tagged "source:even" (more than BRUTE_FORCE_MAX, so
+    the IDSelectorBitmap path runs); after faiss_index.incremental_index()
+    removes and adds vectors, every result must be an even row still in the
+    index and even rows must find themselves. Returns the problems.
+    """
+    matrix = synthetic_matrix(n, dim)
+    labels = faiss_labels([f"doc{i}" for i in range(n)])
+    try:
+        index = incremental_index(kind, matrix, labels, remove, add)
+    except RuntimeError as e:
+        return [str(e)]
+    rows = {label: row for row, label in enumerate(labels.tolist())}
+    metas = {label: {"source": "odd" if row % 2 else "even"} for label, row in rows.items()}
+    with tempfile.TemporaryDirectory() as tmp:
+        write_metadata(pathlib.Path(tmp), index_labels(index), metas)
+        meta = MetadataIndex.load(pathlib.Path(tmp))
+    bitmap, count = meta.select(parse_filters({"source": "even"}))
+    live = np.arange(remove, n)
+    allowed = live[live % 2 == 0]
+    problems = []
+    if count != len(allowed):
+        problems.append(f"{kind}: filter selects {count} vectors, expected {len(allowed)}")
+    # a sample of the kept rows, and every added one
+    rng = np.random.default_rng(SEED)
+    kept, added = allowed[allowed < n - add], allowed[allowed >= n - add]
+    sample = np.concatenate([np.sort(rng.choice(kept, size=min(queries, len(kept)), replace=False)), added])
+    factor = RESCORE_FACTOR if kind in QUANTIZED else 0
+    _, found = filtered_search(index, normalized(matrix[sample]), k, meta, bitmap, count, matrix, rows, factor)
+    hits = int(np.sum(found[:, 0] == labels[sample]))
+    if hits < (0.9 if kind == "ivf-pq" else 0.99) * len(sample):
+        problems.append(f"{kind}: filtered self-match {hits}/{len(sample)}")
+    outside = int(np.sum(~np.isin(found[found >= 0], labels[allowed])))
+    if outside:
+        problems.append(f"{kind}: {outside} results outside the filter")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect dataset/faiss_meta.npz or count a filter's matches")
+    parser.add_argument("--dataset", type=pathlib.Path, default=DATASET)
+    for field in FIELDS:
+        parser.add_argument(f"--{field}", action="append")
+    parser.add_argument("--from", dest="date_from")
+    parser.add_argument("--to", dest="date_to")
+    parser.add_argument("--check", nargs="*", choices=KINDS, metavar="KIND",
+                        help="instead: check filtered search after incremental remove + add (all kinds by default)")
+    args = parser.parse_args()
+
+    if args.check is not None:
+        problems = []
+        for kind in args.check or KINDS:
+            found = check_filtered(kind)
+            print(f"{kind:9s} {'FAIL' if found else 'ok'}")
+            problems.extend(found)
+        for problem in problems:
+            print(f"  {problem}")
+        raise SystemExit(1 if problems else 0)
+
+    meta = MetadataIndex.load(args.dataset)
+    filters = parse_filters({**{f: getattr(args, f) for f in FIELDS}, "from": args.date_from, "to": args.date_to})
+    if not filters:
+        print(f"{meta.n} vectors, {len(meta.keys)} keys")
+        for key in meta.keys:
+            print(f"  {meta.count(meta.bits[meta.rows[key]]):7d}  {key}")
+        return
+    _, count = meta.select(filters)
+    print(f"{count} of {meta.n} vectors match {filters}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+MinHash + LSH candidate generation for near-duplicate detection.
+
+Used by normalize_and_build_dataset.py (--near-dup-engine minhash) to propose
+candidate pairs in near-linear time; every candidate is still verified with
+the exact RapidFuzz scoring, so LSH only decides which pairs get scored.
+
+Each text is reduced to character k-gram shingles (lowercased, whitespace
+collapsed), hashed to uint64 with a rolling polynomial hash, and summarized by
+NUM_PERM multiply-shift permutations. Signatures are split into BANDS bands of
+ROWS rows; texts sharing any band bucket become candidates. With 32 x 4 the
+collision probability is ~50% at Jaccard 0.42 and >99% above 0.75.
+
+partial_ratio() also scores a short text contained in a longer one highly,
+which Jaccard over the whole sample does not capture. Texts are therefore
+indexed a second time on their first PREFIX_CHARS characters, so a short post
+that is the opening of a longer one still collides with it.
+
+Dependencies:
+  pip install numpy
+"""
+from __future__ import annotations
+import re
+from collections import defaultdict
+import numpy as np
+
+SHINGLE_SIZE = 5
+NUM_PERM = 128
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+PREFIX_CHARS = 1000
+SEED = 1
+
+_WS_RE = re.compile(r"\s+")
+_BASE = np.uint64(1099511628211)  # FNV prime, used as polynomial base
+
+def shingle_hashes(text: str, k: int = SHINGLE_SIZE) -> np.ndarray:
+    """Return the unique uint64 hashes of the character k-grams of text."""
+    t = _WS_RE.sub(" ", text.lower()).strip()
+    if not t:
+        return np.zeros(0, dtype=np.uint64)
+    codes = np.frombuffer(t.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    if len(codes) < k:
+        k = len(codes)
+    n = len(codes) - k + 1
+    h = np.zeros(n, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for j in range(k):
+            h = h * _BASE + codes[j:j + n]
+    return np.unique(h)
+
+class MinHasher:
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = SEED):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 2**63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self.b = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64)
+
+    def signature(self, hashes: np.ndarray) -> np.ndarray:
+        if len(hashes) == 0:
+            return np.full(len(self.a), np.iinfo(np.uint64).max, dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            perm = self.a[:, None] * hashes[None, :] + self.b[:, None]
+        return (perm >> np.uint64(32)).min(axis=1)
+
+class MinHashLSH:
+    """Banded LSH index over MinHash signatures."""
+
+    def __init__(self, bands: int = BANDS, rows: int = ROWS, seed: int = SEED):
+        self.bands = bands
+        self.rows = rows
+        self.hasher = MinHasher(bands * rows, seed)
+        self.buckets: dict[tuple[int, bytes], list[int]] = defaultdict(list)
+
+    def insert(self, key: int, text: str):
+        sig = self.hasher.signature(shingle_hashes(text))
+        for band in range(self.bands):
+            chunk = sig[band * self.rows:(band + 1) * self.rows].tobytes()
+            self.buckets[(band, chunk)].append(key)
+
+    def pairs(self) -> set[tuple[int, int]]:
+        out = set()
+        for bucket in self.buckets.values():
+            if len(bucket) < 2:
+                continue
+            members = sorted(set(bucket))
+            for x in range(len(members)):
+                for y in range(x + 1, len(members)):
+                    out.add((members[x], members[y]))
+        return out
+
+def candidate_pairs(samples: list[str], prefix_chars: int = PREFIX_CHARS) -> set[tuple[int, int]]:
+    """Return candidate (i, j) index pairs, i < j, for the given samples."""
+    full = MinHashLSH()
+    prefix = MinHashLSH()
+    for i, s in enumerate(samples):
+        full.insert(i, s)
+        prefix.insert(i, s[:prefix_chars])
+    return full.pairs() | prefix.pairs()
@@ -5,8 +5,17 @@ Normalize content/* -> dataset/corpus.jsonl with deduplication & canonicalizatio
 Places:
  - reads: content/**/index.md  (front matter + markdown content)
  - prefers plain mirrors: plain/*.txt (if available)
- - writes: dataset/corpus.jsonl (one JSON object per line)
- - writes: dataset/manifest.json (summary)
+ - caches parsed posts: dataset/.normalize_cache.json (keyed by path, mtime, size, sha256)
+ - writes: dataset/corpus.jsonl (one JSON object per line), or shards such as
+   dataset/corpus-2019.jsonl / corpus-00001.jsonl.zst with --shard-by / --compress
+   (staged in a temp dir, published under content-hashed names such as
+   corpus.<sha256 prefix>.jsonl and linked to these stable names, see corpus_writer.py)
+ - writes: dataset/corpus.index.<hash>.json (id -> shard/byte offset/length + date, source, tags,
+   language; read by scripts/corpus_reader.py)
+ - writes: dataset/manifest.json (summary + every shard's path, name, rows, bytes, sha256 and the
+   index file; written last, its replacement is the commit point)
+ - writes: dataset/bm25.index (BM25 inverted index over title + text, see scripts/bm25_index.py)
+ - writes: dataset/dedupe_summary.json (every duplicate cluster and dropped doc)
  - writes: static/llms.txt and static/llms-full.txt
 
 Canonical preference order (when collapsing duplicates):
@@ -16,15 +25,33 @@ Canonical preference order (when collapsing duplicates):
   4) other (alphabetical)
 
 Near-duplicate threshold: RAPIDFUZZ partial_ratio >= 95 (applies to first 4000 chars)
+  candidates: every pair (exhaustive) or MinHash LSH pairs (--near-dup-engine minhash)
+  scoring: rapidfuzz process.cdist on all cores (default; row blocks for exhaustive, each row's own
+           candidates for minhash) or pairwise (--scoring pairwise)
 Exact duplicate: SHA256 of final_text
 
+Usage:
+  python scripts/normalize_and_build_dataset.py            # serial load
+  python scripts/normalize_and_build_dataset.py --jobs 8   # parse posts in 8 processes
+  python scripts/normalize_and_build_dataset.py --full     # ignore dataset/.normalize_cache.json
+  python scripts/normalize_and_build_dataset.py --near-dup-engine minhash   # LSH candidates only
+  python scripts/normalize_and_build_dataset.py --near-dup-report           # minhash recall vs exhaustive
+  python scripts/normalize_and_build_dataset.py --shard-by year --compress zstd
+
 Dependencies:
-  pip install python-frontmatter rapidfuzz
+  pip install python-frontmatter rapidfuzz numpy
+  pip install zstandard   # only for --compress zstd
 """
 from __future__ import annotations
-import pathlib, json, hashlib, datetime, re, sys
-from rapidfuzz import fuzz
+import argparse, pathlib, json, hashlib, datetime, inspect, os, sys, time
+from concurrent.futures import ProcessPoolExecutor
+from rapidfuzz import fuzz, process
+import numpy as np
 import frontmatter
+import markdown_text
+from markdown_text import md_to_text
+from corpus_writer import CorpusWriter, COMPRESSION, DEFAULT_SHARD_SIZE, SHARD_BY
+import bm25_index
 
 REPO = pathlib.Path(".").resolve()
 CONTENT = REPO / "content"
@@ -34,10 +61,11 @@ STATIC = REPO / "static"
 DATASET.mkdir(parents=True, exist_ok=True)
 STATIC.mkdir(parents=True, exist_ok=True)
 
-OUT_JSONL = DATASET / "corpus.jsonl"
 MANIFEST = DATASET / "manifest.json"
 LLMS = STATIC / "llms.txt"
 LLMS_FULL = STATIC / "llms-full.txt"
+CACHE_FILE = DATASET / ".normalize_cache.json"
+NEAR_DUP_REPORT = DATASET / "near_dup_report.json"
 
 # canonical ordering map
 SOURCE_RANK = {
@@ -50,75 +78,192 @@ DEFAULT_SOURCE_RANK = 99
 # near-duplicate threshold and sampling length
 NEAR_DUP_THRESHOLD = 95
 SAMPLE_CHARS = 4000
+# batch scoring: at most this many rows per cdist call, and at most
+# BATCH_CELLS scores held in memory at once
+BATCH_ROWS = 256
+BATCH_CELLS = 4_000_000
 
-def md_to_text(md_body: str) -> str:
-    # Very conservative Markdown -> plain text cleaning.
-    t = md_body
-    # remove YAML if present
-    t = re.sub(r"(?s)^---\n.*?\n---\n", "", t).strip()
-    # images -> alt text
-    t = re.sub(r'!\[([^\]]*)\]\([^)]+\)', r'\1', t)
-    # links -> text (url)
-    t = re.sub(r'\[([^\]]+)\]\(([^)]+)\)', r'\1 (\2)', t)
-    # code fences -> keep inner
-    t = re.sub(r'```[^\n]*\n(.*?)```', r'\1', t, flags=re.S)
-    # inline code ticks
-    t = t.replace("`", "")
-    # headings -> remove #
-    t = re.sub(r'^\s*#{1,6}\s*', '', t, flags=re.M)
-    # blockquote markers
-    t = re.sub(r'^\s*>+\s?', '', t, flags=re.M)
-    # multiple blank lines -> two
-    t = re.sub(r'\n{3,}', '\n\n', t)
-    # trim excessive whitespace
-    t = re.sub(r'[ \t]+$', '', t, flags=re.M)
-    return t.strip()
-
-def load_posts():
-    posts = []
-    for idx in sorted(CONTENT.rglob("index.md")):
+# Bump when the field resolution in load_post() changes so that cached posts
+# are re-parsed. The cache stamp also includes markdown_text.VERSION and hashes
+# the source of load_post() and of the markdown_text module.
+MD_TO_TEXT_VERSION = 2
+
+def load_post(idx: pathlib.Path) -> tuple[dict | None, str | None]:
+    """Parse one content/**/index.md into a post dict.
+
+    Returns (post, None) on success or (None, warning) when the file cannot be
+    read, so callers running in a worker pool can report failures in order.
+    """
+    try:
+        p = frontmatter.load(idx)
+    except Exception as e:
+        return None, f"[WARN] failed reading {idx}: {e}"
+    # Resolve fields
+    meta = dict(p.metadata or {})
+    title = meta.get("title") or p.get("title") or ""
+    date = meta.get("date") or meta.get("publishDate") or ""
+    try:
+        # normalize date to YYYY-MM-DD if possible
+        date = str(date)[:10]
+    except Exception:
+        date = ""
+    source_data = meta.get("source", {})
+    if isinstance(source_data, dict):
+        source = source_data.get("name") or "unknown"
+    else:
+        source = str(source_data) if source_data else "unknown"
+    canonical = meta.get("canonical_url") or meta.get("url") or meta.get("permalink") or ""
+    pid = meta.get("id") or f"{date.replace('-','')}-{idx.parent.name}"
+    # prefer plain mirror if exists
+    plain_path = PLAIN / f"{pid}.txt"
+    if plain_path.exists():
+        text = plain_path.read_text(encoding="utf-8")
+    else:
+        text = md_to_text(p.content or "")
+    # fallback to short summary if text empty
+    if not text:
+        text = (meta.get("summary") or meta.get("description") or "").strip()
+    return {
+        "repo_path": str(idx),
+        "id": str(pid),
+        "title": str(title),
+        "date": str(date),
+        "source": str(source),
+        "canonical_url": str(canonical),
+        "tags": meta.get("tags") or meta.get("categories") or [],
+        "license": meta.get("license") or "CC-BY-4.0",
+        "language": meta.get("language") or "en",
+        "text": text
+    }, None
+
+def file_fingerprint(path: pathlib.Path) -> dict | None:
+    """Return {mtime_ns, size, sha256} for path, or None if it does not exist."""
+    try:
+        st = path.stat()
+        data = path.read_bytes()
+    except FileNotFoundError:
+        return None
+    return {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha256": hashlib.sha256(data).hexdigest()}
+
+def fingerprint_matches(path: pathlib.Path, fp: dict | None) -> bool:
+    """Check path against a stored fingerprint.
+
+    mtime+size equality is trusted; otherwise the content hash decides (so a
+    touched but unchanged file is still a hit, and its new mtime is recorded).
+    """
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return fp is None
+    if fp is None or st.st_size != fp["size"]:
+        return False
+    if st.st_mtime_ns == fp["mtime_ns"]:
+        return True
+    if hashlib.sha256(path.read_bytes()).hexdigest() != fp["sha256"]:
+        return False
+    fp["mtime_ns"] = st.st_mtime_ns
+    return True
+
+def cache_stamp() -> str:
+    rules = inspect.getsource(markdown_text) + inspect.getsource(load_post)
+    digest = hashlib.sha256(rules.encode("utf-8")).hexdigest()[:16]
+    return f"{MD_TO_TEXT_VERSION}.{markdown_text.VERSION}:{digest}"
+
+class NormalizeCache:
+    """Persistent per-file cache of load_post() results.
+
+    Entries are keyed by the index.md path relative to the repo and hold the
+    fingerprints of index.md and of the plain mirror it resolved to (or None
+    when there was no mirror), plus the resulting post or warning.
+    """
+
+    def __init__(self, path: pathlib.Path, full: bool = False):
+        self.path = path
+        self.stamp = cache_stamp()
+        self.entries: dict[str, dict] = {}
+        self.used: dict[str, dict] = {}
+        self.hits = 0
+        if full or not path.exists():
+            return
         try:
-            p = frontmatter.load(idx)
+            data = json.loads(path.read_text(encoding="utf-8"))
         except Exception as e:
-            print(f"[WARN] failed reading {idx}: {e}", file=sys.stderr)
-            continue
-        # Resolve fields
-        meta = dict(p.metadata or {})
-        title = meta.get("title") or p.get("title") or ""
-        date = meta.get("date") or meta.get("publishDate") or ""
-        try:
-            # normalize date to YYYY-MM-DD if possible
-            date = str(date)[:10]
-        except Exception:
-            date = ""
-        source_data = meta.get("source", {})
-        if isinstance(source_data, dict):
-            source = source_data.get("name") or "unknown"
-        else:
-            source = str(source_data) if source_data else "unknown"
-        canonical = meta.get("canonical_url") or meta.get("url") or meta.get("permalink") or ""
-        pid = meta.get("id") or f"{date.replace('-','')}-{idx.parent.name}"
-        # prefer plain mirror if exists
-        plain_path = PLAIN / f"{pid}.txt"
-        if plain_path.exists():
-            text = plain_path.read_text(encoding="utf-8")
+            print(f"[WARN] ignoring unreadable cache {path}: {e}", file=sys.stderr)
+            return
+        if data.get("stamp") == self.stamp:
+            self.entries = data.get("entries") or {}
+
+    @staticmethod
+    def key(idx: pathlib.Path) -> str:
+        return idx.relative_to(REPO).as_posix()
+
+    def lookup(self, idx: pathlib.Path) -> tuple[dict | None, str | None] | None:
+        key = self.key(idx)
+        entry = self.entries.get(key)
+        if entry is None or not fingerprint_matches(idx, entry["index"]):
+            return None
+        plain = entry.get("plain")
+        if plain is not None and not fingerprint_matches(REPO / plain["path"], plain["fp"]):
+            return None
+        self.used[key] = entry
+        self.hits += 1
+        post = entry.get("post")
+        if post is not None:
+            post = dict(post, repo_path=str(idx))
+        return post, entry.get("warning")
+
+    def store(self, idx: pathlib.Path, index_fp: dict | None, result: tuple[dict | None, str | None]):
+        post, warning = result
+        if index_fp is None:
+            return
+        plain = None
+        if post is not None:
+            plain_path = PLAIN / f"{post['id']}.txt"
+            plain = {"path": plain_path.relative_to(REPO).as_posix(), "fp": file_fingerprint(plain_path)}
+        self.used[self.key(idx)] = {"index": index_fp, "plain": plain, "post": post, "warning": warning}
+
+    def save(self):
+        # only entries seen in this run are kept, so deleted posts drop out
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps({"stamp": self.stamp, "entries": self.used}, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+def load_posts(jobs: int = 1, cache: NormalizeCache | None = None):
+    """Load all posts in sorted path order.
+
+    Files whose fingerprints match the cache are taken from it; the rest are
+    parsed, in a process pool when jobs > 1. Results (and any per-file
+    warnings) are still collected in path order so the output is identical to
+    a serial, uncached run.
+    """
+    paths = sorted(CONTENT.rglob("index.md"))
+    results: list[tuple[dict | None, str | None] | None] = [None] * len(paths)
+    misses = []
+    for i, idx in enumerate(paths):
+        hit = cache.lookup(idx) if cache is not None else None
+        if hit is None:
+            misses.append(i)
         else:
-            text = md_to_text(p.content or "")
-        # fallback to short summary if text empty
-        if not text:
-            text = (meta.get("summary") or meta.get("description") or "").strip()
-        posts.append({
-            "repo_path": str(idx),
-            "id": str(pid),
-            "title": str(title),
-            "date": str(date),
-            "source": str(source),
-            "canonical_url": str(canonical),
-            "tags": meta.get("tags") or meta.get("categories") or [],
-            "license": meta.get("license") or "CC-BY-4.0",
-            "language": meta.get("language") or "en",
-            "text": text
-        })
+            results[i] = hit
+    # fingerprint before parsing: an edit racing the parse is re-parsed next run
+    fps = {i: file_fingerprint(paths[i]) for i in misses} if cache is not None else {}
+    miss_paths = [paths[i] for i in misses]
+    if jobs > 1 and len(miss_paths) > 1:
+        chunksize = max(1, len(miss_paths) // (jobs * 4))
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            parsed = list(pool.map(load_post, miss_paths, chunksize=chunksize))
+    else:
+        parsed = [load_post(idx) for idx in miss_paths]
+    for i, result in zip(misses, parsed):
+        results[i] = result
+        if cache is not None:
+            cache.store(paths[i], fps[i], result)
+    posts = []
+    for post, warning in results:
+        if warning:
+            print(warning, file=sys.stderr)
+            continue
+        posts.append(post)
     return posts
 
 def text_hash(s: str) -> str:
@@ -148,66 +293,225 @@ def choose_preferred(a: dict, b: dict) -> dict:
     # fallback: stable by id
     return a if a["id"] <= b["id"] else b
 
-def deduplicate_and_cluster(posts: list[dict]):
-    # exact de-dupe map
-    hash_map = {}   # hash -> representative id
-    representatives = []  # list of representative docs
-    dropped = []  # list of (kept_id, removed_id, reason)
+def near_dup_candidates(samples: list[str], engine: str = "exhaustive"):
+    """Return a function mapping index i to the ascending indices j > i to score.
+
+    "exhaustive" scores every later sample; "minhash" only the pairs proposed
+    by MinHash LSH (see scripts/minhash.py).
+    """
+    n = len(samples)
+    if engine == "exhaustive":
+        return lambda i: range(i + 1, n)
+    if engine == "minhash":
+        from minhash import candidate_pairs
+        later: dict[int, list[int]] = {}
+        for i, j in sorted(candidate_pairs(samples)):
+            later.setdefault(i, []).append(j)
+        return lambda i: later.get(i, [])
+    raise ValueError(f"unknown near-dup engine: {engine}")
+
+class NearDupScorer:
+    """Scores sample pairs (i, j) for the near-duplicate pass.
+
+    "pairwise" calls fuzz.partial_ratio once per pair from Python. "batch"
+    scores natively with rapidfuzz process.cdist on `workers` threads
+    (-1 = all cores): with dense candidates (the exhaustive engine) a block
+    of rows against the union of their candidate columns, with sparse ones
+    (minhash) each row against only the columns it asks for, so no pair is
+    scored that pairwise scoring would skip. Both pass
+    score_cutoff=NEAR_DUP_THRESHOLD, so scores below the threshold are 0 and
+    scores at or above it are identical. `scored` counts partial_ratio calls.
+    """
+
+    def __init__(self, samples: list[str], candidates, scoring: str = "batch", workers: int = -1,
+                 dense: bool = True):
+        if scoring not in ("batch", "pairwise"):
+            raise ValueError(f"unknown near-dup scoring: {scoring}")
+        self.samples = samples
+        self.candidates = candidates
+        self.scoring = scoring
+        self.workers = workers
+        self.dense = dense
+        self.scored = 0
+        self.block_rows = max(1, min(BATCH_ROWS, BATCH_CELLS // max(1, len(samples))))
+        self.block = -1
+        self.cols = np.zeros(0, dtype=np.int64)
+        self.matrix = None
+
+    def _cdist(self, rows, cols):
+        self.scored += len(rows) * len(cols)
+        return process.cdist(
+            [self.samples[i] for i in rows],
+            [self.samples[j] for j in cols],
+            scorer=fuzz.partial_ratio,
+            score_cutoff=NEAR_DUP_THRESHOLD,
+            dtype=np.float64,
+            workers=self.workers,
+        )
+
+    def _load_block(self, block: int):
+        start = block * self.block_rows
+        rows = range(start, min(start + self.block_rows, len(self.samples)))
+        cols = sorted(set().union(*(self.candidates(i) for i in rows)))
+        self.block, self.cols, self.matrix = block, np.asarray(cols, dtype=np.int64), None
+        if cols:
+            self.matrix = self._cdist(rows, cols)
+
+    def scores(self, i: int, js: list[int]) -> list[float]:
+        """Scores of sample i against each of samples js (a subset of candidates(i))."""
+        if not js:
+            return []
+        if self.scoring == "pairwise":
+            self.scored += len(js)
+            return [fuzz.partial_ratio(self.samples[i], self.samples[j], score_cutoff=NEAR_DUP_THRESHOLD)
+                    for j in js]
+        if not self.dense:
+            return self._cdist([i], js)[0].tolist()
+        block = i // self.block_rows
+        if block != self.block:
+            self._load_block(block)
+        cols = np.searchsorted(self.cols, np.asarray(js, dtype=np.int64))
+        return self.matrix[i - block * self.block_rows, cols].tolist()
+
+def near_dup_engine_report(posts: list[dict], scoring: str = "batch", workers: int = -1) -> dict:
+    """Compare MinHash LSH candidates with exhaustive scoring on posts.
+
+    Every pair of distinct texts is scored, so this is as slow as the
+    exhaustive engine; it exists to measure LSH recall on the real corpus.
+    """
+    texts = list(dict.fromkeys(p["text"] for p in posts))
+    samples = [t[:SAMPLE_CHARS] for t in texts]
+    n = len(samples)
+    t0 = time.perf_counter()
+    from minhash import candidate_pairs
+    lsh = candidate_pairs(samples)
+    t1 = time.perf_counter()
+    scorer = NearDupScorer(samples, near_dup_candidates(samples, "exhaustive"), scoring, workers)
+    truth = set()
+    for i in range(n):
+        js = list(range(i + 1, n))
+        truth.update((i, j) for j, score in zip(js, scorer.scores(i, js)) if score >= NEAR_DUP_THRESHOLD)
+    t2 = time.perf_counter()
+    found = truth & lsh
+    return {
+        "distinct_texts": n,
+        "threshold": NEAR_DUP_THRESHOLD,
+        "exhaustive_pairs_scored": n * (n - 1) // 2,
+        "minhash_candidate_pairs": len(lsh),
+        "near_dup_pairs": len(truth),
+        "near_dup_pairs_found": len(found),
+        "recall": round(len(found) / len(truth), 4) if truth else 1.0,
+        "missed": [[texts[i][:80], texts[j][:80]] for i, j in sorted(truth - lsh)],
+        "minhash_seconds": round(t1 - t0, 3),
+        "exhaustive_seconds": round(t2 - t1, 3),
+    }
+
+class UnionFind:
+    """Disjoint sets over document ids (union by size, path halving)."""
+
+    def __init__(self):
+        self.parent: dict[str, str] = {}
+        self.size: dict[str, int] = {}
+
+    def add(self, x: str):
+        if x not in self.parent:
+            self.parent[x] = x
+            self.size[x] = 1
+
+    def find(self, x: str) -> str:
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a: str, b: str) -> str:
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return ra
+        if self.size[ra] < self.size[rb]:
+            ra, rb = rb, ra
+        self.parent[rb] = ra
+        self.size[ra] += self.size[rb]
+        return ra
+
+def deduplicate_and_cluster(posts: list[dict], engine: str = "exhaustive",
+                            scoring: str = "batch", workers: int = -1):
+    """Cluster exact and near duplicates and keep one preferred doc per cluster.
+
+    Documents with identical text are unioned first; one representative per
+    distinct text then goes through near-dup scoring, and every pair at or
+    above NEAR_DUP_THRESHOLD is unioned, so clusters are transitive. The
+    preferred doc of each cluster is folded with choose_preferred() over its
+    members in load order.
+
+    Returns (final_docs, dropped, clusters): final docs in order of each
+    cluster's first member, (kept_id, removed_id, reason) tuples, and
+    {"kept", "members"} for every cluster with more than one member.
+    """
+    uf = UnionFind()
+    # nodes are repo paths, which (unlike ids) are unique: two posts sharing an
+    # id but not their text are both kept, as before union-find
+    docs: dict[str, dict] = {}  # repo path -> doc, in load order
+    doc_hash: dict[str, str] = {}  # repo path -> text hash
+    hash_rep: dict[str, str] = {}  # text hash -> first repo path with that text
     # first pass: exact hash dedupe
     for p in posts:
+        key = p["repo_path"]
         h = text_hash(p["text"])
-        if h in hash_map:
-            kept = hash_map[h]
-            # find kept doc and decide preferred
-            kept_doc = next(x for x in representatives if x["id"] == kept)
-            preferred = choose_preferred(kept_doc, p)
-            if preferred["id"] == kept_doc["id"]:
-                # keep existing, record removal
-                dropped.append((kept_doc["id"], p["id"], "exact-hash"))
-            else:
-                # replace representative
-                representatives = [x for x in representatives if x["id"] != kept_doc["id"]]
-                representatives.append(p)
-                hash_map[h] = p["id"]
-                dropped.append((p["id"], kept_doc["id"], "exact-hash-replaced"))
+        docs[key] = p
+        doc_hash[key] = h
+        uf.add(key)
+        if h in hash_rep:
+            uf.union(hash_rep[h], key)
         else:
-            hash_map[h] = p["id"]
-            representatives.append(p)
+            hash_rep[h] = key
+
+    # second pass: near-duplicate clustering over one doc per distinct text
+    rep_keys = list(hash_rep.values())
+    samples = [docs[x]["text"][:SAMPLE_CHARS] for x in rep_keys]
+    candidates = near_dup_candidates(samples, engine)
+    scorer = NearDupScorer(samples, candidates, scoring, workers, dense=engine == "exhaustive")
+    best_score: dict[str, float] = {}  # text hash -> best near-dup score that linked it
+    for i, a in enumerate(rep_keys):
+        # each row's pairs not yet in one cluster are scored together
+        js = [j for j in candidates(i) if uf.find(a) != uf.find(rep_keys[j])]
+        for j, score in zip(js, scorer.scores(i, js)):
+            b = rep_keys[j]
+            if score >= NEAR_DUP_THRESHOLD:
+                uf.union(a, b)
+                for x in (a, b):
+                    h = doc_hash[x]
+                    best_score[h] = max(best_score.get(h, 0.0), score)
 
-    # second pass: near-duplicate clustering
+    members: dict[str, list[str]] = {}
+    for key in docs:
+        members.setdefault(uf.find(key), []).append(key)
     final = []
-    seen_ids = set()
-    # We'll compare each representative to those already finalised
-    for rep in representatives:
-        if rep["id"] in seen_ids:
+    dropped = []
+    clusters = []
+    for keys in members.values():
+        preferred = docs[keys[0]]
+        for key in keys[1:]:
+            preferred = choose_preferred(preferred, docs[key])
+        final.append(preferred)
+        if len(keys) == 1:
             continue
-        rep_sample = rep["text"][:SAMPLE_CHARS]
-        cluster = [rep]
-        seen_ids.add(rep["id"])
-        # compare to all other reps not yet seen
-        for other in representatives:
-            if other["id"] in seen_ids or other["id"] == rep["id"]:
+        kept = preferred["repo_path"]
+        clusters.append({"kept": preferred["id"], "members": [docs[key]["id"] for key in keys]})
+        for key in keys:
+            if key == kept:
                 continue
-            other_sample = other["text"][:SAMPLE_CHARS]
-            score = fuzz.partial_ratio(rep_sample, other_sample)
-            if score >= NEAR_DUP_THRESHOLD:
-                # near duplicate -> pick preferred
-                preferred = choose_preferred(cluster[0], other)
-                # preferred becomes cluster[0]
-                if preferred["id"] != cluster[0]["id"]:
-                    # replace cluster[0]
-                    dropped.append((preferred["id"], cluster[0]["id"], f"near-dup({score})"))
-                    cluster[0] = preferred
-                else:
-                    dropped.append((cluster[0]["id"], other["id"], f"near-dup({score})"))
-                seen_ids.add(other["id"])
-        final.append(cluster[0])
-
-    return final, dropped
-
-def build_dataset(final_docs: list[dict]):
-    # Write JSONL
-    with OUT_JSONL.open("w", encoding="utf-8") as fh:
+            h = doc_hash[key]
+            reason = "exact-hash" if h == doc_hash[kept] else f"near-dup({best_score[h]})"
+            dropped.append((preferred["id"], docs[key]["id"], reason))
+
+    return final, dropped, clusters
+
+def build_dataset(final_docs: list[dict], shard_by: str = "none",
+                  shard_size: int = DEFAULT_SHARD_SIZE, compress: str = "none") -> dict:
+    # Stream JSONL into staged shards; shards and manifest are published atomically
+    with CorpusWriter(DATASET, MANIFEST.name, shard_by, shard_size, compress) as writer:
         for d in sorted(final_docs, key=lambda x: x.get("date","")):
             row = {
                 "id": d["id"],
@@ -220,21 +524,23 @@ def build_dataset(final_docs: list[dict]):
                 "license": d.get("license") or "CC-BY-4.0",
                 "text": d["text"]
             }
-            fh.write(json.dumps(row, ensure_ascii=False) + "\n")
-    # Manifest
-    manifest = {
-        "generated_at": datetime.datetime.utcnow().isoformat()+"Z",
-        "n_documents": len(final_docs)
-    }
-    MANIFEST.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+            writer.write(row)
+        # Manifest (written last, lists every shard with its sha256)
+        return writer.commit({
+            "generated_at": datetime.datetime.utcnow().isoformat()+"Z",
+            "n_documents": len(final_docs)
+        })
 
-def write_llms_txt(final_docs: list[dict]):
+def write_llms_txt(final_docs: list[dict], shards: list[str]):
     base = ""  # placeholder; we will write relative paths for now
     lines = []
     lines.append("# llms.txt — index of available machine-readable artifacts")
     lines.append("")
     lines.append("## Dataset")
-    lines.append(f"- dataset/corpus.jsonl")
+    for shard in shards:
+        lines.append(f"- dataset/{shard}")
+    lines.append("- dataset/manifest.json  (shard list with row counts and sha256)")
+    lines.append("- dataset/bm25.index  (BM25 inverted index, see scripts/bm25_index.py)")
     lines.append("")
     lines.append("## Plain-text mirrors")
     lines.append("- plain/  (one file per article where available)")
@@ -252,24 +558,58 @@ def write_llms_txt(final_docs: list[dict]):
     LLMS_FULL.write_text("\n".join([f"{d['id']}\t{d['date']}\t{d['source']}\t{d.get('canonical_url','')}" for d in final_docs]), encoding="utf-8")
 
 def main():
-    print("[1/4] Loading posts from content/")
-    posts = load_posts()
-    print(f"  loaded {len(posts)} posts")
-    print("[2/4] Deduplicating (exact + near-dup)")
-    final_docs, dropped = deduplicate_and_cluster(posts)
-    print(f"  final documents: {len(final_docs)}  dropped pairs: {len(dropped)}")
+    parser = argparse.ArgumentParser(description="Normalize content/ into dataset/corpus.jsonl")
+    parser.add_argument("--jobs", "-j", type=int, default=1,
+                        help="worker processes for loading posts (0 = all cores)")
+    parser.add_argument("--full", action="store_true",
+                        help="ignore the per-file cache and re-parse every post")
+    parser.add_argument("--near-dup-engine", choices=["exhaustive", "minhash"], default="exhaustive",
+                        help="how near-duplicate candidate pairs are generated")
+    parser.add_argument("--scoring", choices=["batch", "pairwise"], default="batch",
+                        help="score near-dup candidates in native cdist blocks or one pair at a time")
+    parser.add_argument("--workers", type=int, default=-1,
+                        help="threads for batch scoring (-1 = all cores)")
+    parser.add_argument("--near-dup-report", action="store_true",
+                        help="write dataset/near_dup_report.json comparing minhash recall with exhaustive scoring")
+    parser.add_argument("--shard-by", choices=SHARD_BY, default="none",
+                        help="split the corpus into one file per year or per --shard-size-mb")
+    parser.add_argument("--shard-size-mb", type=float, default=DEFAULT_SHARD_SIZE / 2**20,
+                        help="uncompressed size at which --shard-by size starts a new shard")
+    parser.add_argument("--compress", choices=list(COMPRESSION), default="none",
+                        help="compress corpus shards (zstd needs the zstandard package)")
+    args = parser.parse_args()
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+
+    print(f"[1/5] Loading posts from content/ (jobs={jobs})")
+    cache = NormalizeCache(CACHE_FILE, full=args.full)
+    posts = load_posts(jobs, cache)
+    cache.save()
+    print(f"  loaded {len(posts)} posts ({cache.hits} from cache)")
+    if args.near_dup_report:
+        report = near_dup_engine_report(posts, args.scoring, args.workers)
+        print(json.dumps({k: v for k, v in report.items() if k != "missed"}, indent=2))
+        NEAR_DUP_REPORT.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"[2/5] Deduplicating (exact + near-dup, engine={args.near_dup_engine})")
+    final_docs, dropped, clusters = deduplicate_and_cluster(posts, args.near_dup_engine, args.scoring, args.workers)
+    print(f"  final documents: {len(final_docs)}  clusters: {len(clusters)}  dropped: {len(dropped)}")
     # write dataset
-    print("[3/4] Writing dataset/corpus.jsonl")
-    build_dataset(final_docs)
-    print("[4/4] Writing llms.txt and llms-full.txt")
-    write_llms_txt(final_docs)
+    print(f"[3/5] Writing dataset/corpus (shard-by={args.shard_by}, compress={args.compress})")
+    manifest = build_dataset(final_docs, args.shard_by, int(args.shard_size_mb * 2**20), args.compress)
+    for shard in manifest["shards"]:
+        print(f"  [OK] {shard['name']} ({shard['path']})  rows={shard['rows']}  bytes={shard['bytes']}")
+    print("[4/5] Building dataset/bm25.index")
+    header = bm25_index.write_index(sorted(final_docs, key=lambda x: x.get("date","")), DATASET)
+    print(f"  [OK] {header['n_docs']} documents, {header['n_terms']} terms")
+    print("[5/5] Writing llms.txt and llms-full.txt")
+    write_llms_txt(final_docs, [s["name"] for s in manifest["shards"]])
     # write log summary
     summary = {
         "loaded": len(posts),
         "final": len(final_docs),
-        "dropped_pairs": dropped[:200]
+        "dropped_pairs": dropped,
+        "clusters": clusters
     }
-    print(json.dumps(summary, indent=2, ensure_ascii=False))
+    print(json.dumps({k: summary[k] for k in ("loaded", "final")}, indent=2, ensure_ascii=False))
     (DATASET / "dedupe_summary.json").write_text(json.dumps(summary, indent=2, ensure_ascii=False), encoding="utf-8")
     print("Done.")
 
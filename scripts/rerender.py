@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Rebuild content/<year>/<slug>/index.md and plain/*.txt from the raw sources
+already on disk, without touching the network: after a change to html_to_md,
+the front matter or the plain-text cleanup, this replaces a --force re-import.
+
+Inputs, replayed through the importers' own extract / convert code:
+
+  wordpress          sources/wordpress/raw/*.json REST API posts, with the
+                     category and tag names resolved at import time
+  medium, substack   sources/<name>/raw/*.json feed dumps; teaser entries take
+                     their article page from the HTTP cache (http_cache.py)
+  dyslexiaaction     sources/dyslexiaaction/raw/index-page*.html listings and
+                     post-p*-NN.html pages (else the page in the HTTP cache)
+
+Feeds are replayed in the importers' FEEDS order and, as in an import into an
+empty tree, the first entry to claim a path wins. A post whose existing
+index.md has another id (say, the Metaphor Hacker original of a Medium
+repost) belongs to another source and is left alone, as is a WordPress post
+whose index.md came from the Markdown export rather than the REST importer.
+Entries whose article page is not cached are skipped too: they are not
+rendered from their teaser.
+
+Every rendering is keyed by the sha256 of its inputs and of the converting
+code (the importer module, markdown_text.py and the trafilatura / markdownify
+versions). sources/.render_cache.json remembers, per output, that key and the
+hashes of the files it produced: while both still match, the post is skipped
+without converting anything. The rest are converted in a process pool
+(--jobs) and written in input order, and only files whose bytes change are
+rewritten, so unchanged posts keep their mtimes (and normalize cache hits).
+A post that fails to convert is logged as [ERROR] and left out of the render
+cache, so the next run tries it again; the others are still written. Raw
+records without a date are skipped with a warning.
+
+Usage:
+  python scripts/rerender.py                    # all sources, one process per core
+  python scripts/rerender.py --source medium --jobs 4
+  python scripts/rerender.py --full             # ignore the render cache
+
+Dependencies:
+  pip install feedparser trafilatura markdownify python-frontmatter python-slugify requests
+"""
+from __future__ import annotations
+import argparse
+import hashlib
+import importlib.metadata
+import inspect
+import json
+import os
+import pathlib
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from slugify import slugify
+import markdown_text
+import import_medium
+import import_substack
+import import_wordpress
+import scrape_dyslexiaaction_tech_blog as dyslexiaaction
+from http_cache import HttpCache
+
+ROOT = pathlib.Path(".").resolve()
+RENDER_CACHE = ROOT / "sources" / ".render_cache.json"
+FEED_IMPORTERS = {"medium": import_medium, "substack": import_substack}
+SOURCES = ("wordpress", "medium", "substack", "dyslexiaaction")
+MODULES = {"wordpress": import_wordpress, "medium": import_medium, "substack": import_substack,
+           "dyslexiaaction": dyslexiaaction}
+
+def text_hash(s: str) -> str:
+    return hashlib.sha256(s.encode("utf-8")).hexdigest()
+
+def file_hash(path: pathlib.Path) -> Optional[str]:
+    try:
+        return hashlib.sha256(path.read_bytes()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+def converter_stamp(source: str) -> str:
+    """Hash of the code that turns a source's raw input into files."""
+    code = inspect.getsource(MODULES[source]) + inspect.getsource(markdown_text)
+    versions = [importlib.metadata.version(p) for p in ("trafilatura", "markdownify", "python-frontmatter")]
+    return text_hash(code + "\n".join(versions))
+
+def job_key(job: dict, stamp: str) -> str:
+    inputs = {k: v for k, v in job.items() if k not in ("dest_md", "dest_txt")}
+    return text_hash(stamp + json.dumps(inputs, ensure_ascii=False, sort_keys=True, default=str))
+
+def raw_feeds(source: str) -> List[pathlib.Path]:
+    """A feed importer's raw dumps, in FEEDS order, then any others by name."""
+    module = FEED_IMPORTERS[source]
+    order = {slugify(url)[:50] + ".json": i for i, url in enumerate(module.FEEDS)}
+    return sorted(module.RAW_DIR.glob("*.json"), key=lambda p: (order.get(p.name, len(order)), p.name))
+
+def feed_jobs(source: str, cache: HttpCache) -> Tuple[List[dict], int]:
+    module = FEED_IMPORTERS[source]
+    jobs, missing = [], 0
+    for raw in raw_feeds(source):
+        try:
+            d = json.loads(raw.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            print(f"[WARN] unreadable feed dump {raw.relative_to(ROOT)}: {e}")
+            continue
+        feed_url = d.get("href") or ""
+        for entry in d.get("entries") or []:
+            job = module.plan_entry(entry, feed_url, force=True)
+            job["source"] = source
+            job["page_html"] = None
+            if module.needs_page(job):
+                page = cache.get(job["page_url"])
+                if page is None or not page.ok:
+                    missing += 1
+                    continue
+                job["page_html"] = page.text
+            jobs.append(job)
+    return jobs, missing
+
+def wordpress_jobs() -> Tuple[List[dict], int]:
+    jobs = []
+    for raw_file in sorted(import_wordpress.RAW_DIR.glob("*.json")):
+        try:
+            raw = json.loads(raw_file.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            print(f"[WARN] unreadable post dump {raw_file.relative_to(ROOT)}: {e}")
+            continue
+        post = raw.get("post") if isinstance(raw, dict) else None
+        if not isinstance(post, dict) or not post.get("date"):
+            print(f"[WARN] post dump without a date {raw_file.relative_to(ROOT)}, skipped")
+            continue
+        nid, dest_md, dest_txt = import_wordpress.post_paths(post)
+        jobs.append({"source": "wordpress", "nid": nid, "raw": raw, "dest_md": dest_md, "dest_txt": dest_txt})
+    return jobs, 0
+
+def dyslexiaaction_jobs(cache: HttpCache) -> Tuple[List[dict], int]:
+    raw_dir = dyslexiaaction.RAW_DIR
+    jobs, missing = [], 0
+    pages = {int(path.stem[len("index-page"):]): path for path in raw_dir.glob("index-page*.html")
+             if path.stem[len("index-page"):].isdigit()}
+    for p, index in sorted(pages.items()):
+        post_urls, date_strs = dyslexiaaction.parse_index(index.read_text(encoding="utf-8"))
+        for i, (rel_url, dstr) in enumerate(zip(post_urls, date_strs), start=1):
+            full_url = rel_url if rel_url.startswith("http") else f"{dyslexiaaction.WAYBACK_BASE}{rel_url}"
+            if not dstr:
+                print(f"[WARN] listing row without a date {index.relative_to(ROOT)} #{i}, skipped")
+                continue
+            raw = raw_dir / f"post-p{p}-{i:02d}.html"
+            if raw.exists():
+                post_html = raw.read_text(encoding="utf-8")
+            else:
+                page = cache.get(full_url)
+                if page is None or not page.ok:
+                    missing += 1
+                    continue
+                post_html = page.text
+            date_iso = dyslexiaaction.normalize_date(dstr)
+            title = dyslexiaaction.extract_title(post_html) or "Untitled"
+            nid, dest_md, dest_txt = dyslexiaaction.post_paths(date_iso, title)
+            jobs.append({"source": "dyslexiaaction", "nid": nid, "date": date_iso, "title": title,
+                         "canonical": dyslexiaaction.strip_wayback_prefix(full_url), "post_html": post_html,
+                         "dest_md": dest_md, "dest_txt": dest_txt})
+    return jobs, missing
+
+def render(job: dict) -> Tuple[Optional[Tuple[str, str]], Optional[str]]:
+    """((index.md, plain text), None) for a job, or (None, error) when it cannot
+    be converted; runs in the worker processes, so one bad post does not stop the rest."""
+    try:
+        return convert(job), None
+    except Exception as exc:
+        return None, f"{type(exc).__name__}: {exc}"
+
+def convert(job: dict) -> Tuple[str, str]:
+    """(index.md, plain text) of a job."""
+    if job["source"] == "wordpress":
+        return import_wordpress.render_post(job["raw"])
+    if job["source"] == "dyslexiaaction":
+        body_md = dyslexiaaction.post_body_md(job["post_html"])
+        return dyslexiaaction.render_post(job["date"], job["title"], body_md, job["canonical"])
+    module = FEED_IMPORTERS[job["source"]]
+    return module.render_entry(job, module.page_content(job, job["page_html"]))
+
+class RenderCache:
+    """Per-output record of the input key and output hashes of the last rendering."""
+
+    def __init__(self, path: pathlib.Path, full: bool = False):
+        self.path = path
+        self.entries: Dict[str, dict] = {}
+        self.used: Dict[str, dict] = {}
+        if full or not path.exists():
+            return
+        try:
+            self.entries = json.loads(path.read_text(encoding="utf-8")).get("entries") or {}
+        except Exception as e:
+            print(f"[WARN] ignoring unreadable render cache {path}: {e}", file=sys.stderr)
+
+    def hit(self, rel: str, key: str, dest_md: pathlib.Path, dest_txt: pathlib.Path) -> bool:
+        entry = self.entries.get(rel)
+        if (entry is None or entry["key"] != key or file_hash(dest_md) != entry["md"]
+                or file_hash(dest_txt) != entry["txt"]):
+            return False
+        self.used[rel] = entry
+        return True
+
+    def store(self, rel: str, key: str, index_md: str, plain: str):
+        self.used[rel] = {"key": key, "md": text_hash(index_md), "txt": text_hash(plain)}
+
+    def save(self):
+        # only outputs seen in this run are kept
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps({"entries": self.used}, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+def existing_id(path: pathlib.Path) -> Optional[str]:
+    """The id in an existing index.md's front matter, None if there is no file."""
+    try:
+        with path.open(encoding="utf-8") as f:
+            head = f.read(4096)
+    except FileNotFoundError:
+        return None
+    m = re.search(r"^id:\s*['\"]?([^'\"\n]+)", head, flags=re.M)
+    return m.group(1).strip() if m else ""
+
+def write_if_changed(path: pathlib.Path, text: str) -> bool:
+    if file_hash(path) == text_hash(text):
+        return False
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-render content/ and plain/ from raw sources, offline")
+    parser.add_argument("--source", action="append", choices=SOURCES, help="source to re-render (default: all)")
+    parser.add_argument("--jobs", "-j", type=int, default=0, help="worker processes (0 = one per core)")
+    parser.add_argument("--full", action="store_true", help="ignore sources/.render_cache.json")
+    args = parser.parse_args()
+    jobs_n = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    sources = args.source or list(SOURCES)
+
+    t0 = time.perf_counter()
+    http = HttpCache(offline=True)
+    cache = RenderCache(RENDER_CACHE, full=args.full)
+    jobs: List[dict] = []
+    keys: List[str] = []
+    claimed: set = set()
+    missing = duplicates = foreign = 0
+    for source in SOURCES:
+        if source == "wordpress":
+            found, n_missing = wordpress_jobs()
+        elif source == "dyslexiaaction":
+            found, n_missing = dyslexiaaction_jobs(http)
+        else:
+            found, n_missing = feed_jobs(source, http)
+        if source not in sources:
+            # still claims its paths, so --source renders exactly what a full run would
+            claimed.update(job["dest_md"] for job in found)
+            continue
+        stamp = converter_stamp(source)
+        missing += n_missing
+        for job in found:
+            if job["dest_md"] in claimed:
+                duplicates += 1
+                continue
+            claimed.add(job["dest_md"])
+            if existing_id(job["dest_md"]) not in (None, job["nid"]) or (
+                    source == "wordpress" and job["dest_md"].exists()
+                    and not import_wordpress.written_here(job["dest_md"], job["nid"])):
+                foreign += 1
+                continue
+            jobs.append(job)
+            keys.append(job_key(job, stamp))
+        print(f"[{source}] {len(found)} inputs" + (f", {n_missing} without a cached page" if n_missing else ""))
+
+    rels = [job["dest_md"].relative_to(ROOT).as_posix() for job in jobs]
+    todo = [i for i, job in enumerate(jobs) if not cache.hit(rels[i], keys[i], job["dest_md"], job["dest_txt"])]
+    todo_jobs = [jobs[i] for i in todo]
+    if jobs_n > 1 and len(todo_jobs) > 1:
+        chunksize = max(1, len(todo_jobs) // (jobs_n * 4))
+        with ProcessPoolExecutor(max_workers=jobs_n) as pool:
+            rendered = list(pool.map(render, todo_jobs, chunksize=chunksize))
+    else:
+        rendered = [render(job) for job in todo_jobs]
+
+    written = failed = 0
+    for i, (result, error) in zip(todo, rendered):
+        job = jobs[i]
+        if error:
+            # not stored in the render cache, so the next run tries it again
+            print(f"[ERROR] rendering {job['nid']} -> {rels[i]}: {error}")
+            failed += 1
+            continue
+        index_md, plain = result
+        changed = write_if_changed(job["dest_md"], index_md)
+        changed = write_if_changed(job["dest_txt"], plain) or changed
+        if changed:
+            written += 1
+            print(f"[OK]   {job['nid']} -> {rels[i]}")
+        cache.store(rels[i], keys[i], index_md, plain)
+    cache.save()
+    print(f"Re-rendered {len(jobs)} posts in {time.perf_counter() - t0:.2f}s (jobs={jobs_n}): "
+          f"{len(jobs) - len(todo)} cached, {len(todo) - failed} converted, {written} rewritten, {failed} failed; "
+          f"{duplicates} duplicate paths, {foreign} owned by another source, "
+          f"{missing} skipped without a cached page")
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,7 @@ One-off scrape of Dyslexia Action Tech Blog from the Wayback Machine.
 Source index (Wayback snapshot):
   https://web.archive.org/web/20170613010952/http://www.dyslexiaaction.org.uk/tech-blog
 
-This script crawls all paginated index pages, collects post URLs and dates,
+This script fetches the paginated index pages, collects post URLs and dates,
 fetches each post page, extracts title and main content, converts to Markdown,
 and writes into `content/<year>/<slug>/index.md` with a plain text copy in `plain/`.
 
@@ -13,19 +13,29 @@ Usage:
   python scripts/scrape_dyslexiaaction_tech_blog.py           # scrape pages 0..7
   python scripts/scrape_dyslexiaaction_tech_blog.py --force   # overwrite existing
   python scripts/scrape_dyslexiaaction_tech_blog.py --pages 0 7  # set page range
+  python scripts/scrape_dyslexiaaction_tech_blog.py --force --offline  # re-extract from the HTTP cache
+  python scripts/scrape_dyslexiaaction_tech_blog.py --base-url http://127.0.0.1:8769 --no-cache  # fake_wayback_server.py
 
 Notes:
   - Relies on requests, trafilatura, markdownify, python-frontmatter, python-slugify
   - Uses regex to parse index listing links and dates; uses trafilatura for post body
   - Canonical URL points to the original domain (without the Wayback prefix)
+  - Pages are kept in the HTTP cache (http_cache.py, sources/.http_cache) and,
+    being Wayback captures, never re-downloaded; --offline makes no requests
+  - Pages are fetched concurrently through fetch_engine.py (--workers in flight,
+    --rate per second, retries with backoff); all snapshots of an index page are
+    probed at once and the first with listings in SNAPSHOTS order is used
+  - Every page is saved to sources/dyslexiaaction/raw as it arrives and reused
+    on the next run, so an interrupted crawl resumes (--no-resume refetches)
 """
 
 from __future__ import annotations
 import argparse
 import datetime as dt
+import math
+import os
 import pathlib
 import re
-import time
 from typing import Iterable, Tuple
 
 import requests
@@ -33,6 +43,9 @@ from trafilatura import extract
 from markdownify import markdownify as md
 from slugify import slugify
 import frontmatter
+from markdown_text import md_to_text
+from http_cache import HttpCache
+from fetch_engine import FetchEngine
 
 
 ROOT = pathlib.Path(".").resolve()
@@ -52,48 +65,41 @@ SNAPSHOTS = [
     "20170504173908",  # used by inner paginated pages
     "20170428003223",
 ]
+USER_AGENT = "Mozilla/5.0 (compatible; DA-Scraper/1.0)"
+# the Wayback Machine is slow to answer but throttles bursts: several requests
+# in flight, only a few started per second
+DEFAULT_WORKERS = 6
+DEFAULT_RATE = 2.0
+LISTING_RE = re.compile(r'<div class="views-field views-field-title">', flags=re.I)
 
 
-def http_get(url: str, timeout: int = 60, retries: int = 5) -> str:
-    last_exc: Exception | None = None
-    for attempt in range(retries):
-        try:
-            r = requests.get(url, timeout=timeout, headers={
-                "User-Agent": "Mozilla/5.0 (compatible; DA-Scraper/1.0)",
-                "Accept": "text/html,application/xhtml+xml"
-            }, allow_redirects=True)
-            if r.status_code == 429:
-                # rate limited; respect Retry-After if present
-                ra = r.headers.get("Retry-After")
-                wait = int(ra) if ra and ra.isdigit() else (2 * (attempt + 1))
-                time.sleep(wait)
-                continue
-            r.raise_for_status()
-            return r.text
-        except requests.exceptions.SSLError as exc:
-            last_exc = exc
-            # Fallback to http (non-TLS) for Wayback if HTTPS has handshake issues
-            if url.startswith("https://web.archive.org/"):
-                alt = url.replace("https://web.archive.org/", "http://web.archive.org/")
-                try:
-                    r = requests.get(alt, timeout=timeout, headers={
-                        "User-Agent": "Mozilla/5.0 (compatible; DA-Scraper/1.0)",
-                        "Accept": "text/html,application/xhtml+xml"
-                    }, allow_redirects=True, verify=True)
-                    r.raise_for_status()
-                    return r.text
-                except Exception as exc2:
-                    last_exc = exc2
-            if attempt < retries - 1:
-                time.sleep(1.0 * (attempt + 1))
-                continue
-            raise
-        except requests.exceptions.RequestException as exc:
-            last_exc = exc
-            if attempt < retries - 1:
-                time.sleep(1.0 * (attempt + 1))
-                continue
+def http_get(engine: FetchEngine, url: str) -> str:
+    """Page text through the engine (and its HTTP cache: Wayback captures never change)."""
+    try:
+        page = engine.fetch(url)
+    except requests.exceptions.SSLError:
+        # Fallback to http (non-TLS) for Wayback if HTTPS has handshake issues
+        if not url.startswith("https://web.archive.org/"):
             raise
+        page = engine.fetch(url.replace("https://", "http://", 1))
+    page.raise_for_status()
+    return page.text
+
+
+def load_raw(path: pathlib.Path) -> str | None:
+    """A page saved by an earlier (possibly interrupted) run, or None."""
+    try:
+        html = path.read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return None
+    return html or None
+
+
+def save_raw(path: pathlib.Path, html: str) -> None:
+    # atomic, so an interrupted run never leaves a truncated page to resume from
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(html, encoding="utf-8")
+    os.replace(tmp, path)
 
 
 def html_to_md(html: str) -> str:
@@ -146,7 +152,7 @@ def normalize_date(date_str: str) -> str:
 
 def strip_wayback_prefix(url: str) -> str:
     """Return the original URL without the Wayback prefix if present."""
-    m = re.match(r"https?://web\.archive\.org/web/\d+/(https?://.+)", url)
+    m = re.match(r"https?://[^/]+/web/\d+/(https?://.+)", url)
     if m:
         return m.group(1)
     m2 = re.match(r"/web/\d+/(https?://.+)", url)
@@ -189,16 +195,21 @@ def extract_body_html(html: str) -> str | None:
     return None
 
 
-def write_post(date_iso: str, title: str, body_md: str, canonical: str) -> None:
+def post_paths(date_iso: str, title: str) -> tuple[str, pathlib.Path, pathlib.Path]:
+    """(id, index.md path, plain-text path) of a post."""
     year = date_iso[:4]
     slug = slugify(title or "untitled", max_length=80)
     nid = f"da-{date_iso.replace('-', '')}-{slug}"
+    return nid, OUT_CONTENT / year / slug / "index.md", OUT_PLAIN / f"{nid}.txt"
+
+
+def post_body_md(post_html: str) -> str:
+    return html_to_md(extract_body_html(post_html) or "")
 
-    dest_dir = OUT_CONTENT / year / slug
-    dest_md = dest_dir / "index.md"
-    dest_txt = OUT_PLAIN / f"{nid}.txt"
 
-    dest_dir.mkdir(parents=True, exist_ok=True)
+def render_post(date_iso: str, title: str, body_md: str, canonical: str) -> tuple[str, str]:
+    """Text of the post's index.md and of its plain-text mirror."""
+    nid, _, _ = post_paths(date_iso, title)
     fm = {
         "id": nid,
         "title": title,
@@ -212,10 +223,15 @@ def write_post(date_iso: str, title: str, body_md: str, canonical: str) -> None:
     }
 
     post = frontmatter.Post(body_md, **fm)
-    dest_md.write_text(frontmatter.dumps(post), encoding="utf-8")
+    return frontmatter.dumps(post), md_to_text(post.content)
 
-    # Plain text (simple whitespace normalization)
-    plain = re.sub(r"(?m)^\s*$", "\n", re.sub(r"\s+", " ", re.sub(r"\r", "", post.content.strip())))
+
+def write_post(date_iso: str, title: str, body_md: str, canonical: str) -> None:
+    nid, dest_md, dest_txt = post_paths(date_iso, title)
+    index_md, plain = render_post(date_iso, title, body_md, canonical)
+
+    dest_md.parent.mkdir(parents=True, exist_ok=True)
+    dest_md.write_text(index_md, encoding="utf-8")
     dest_txt.write_text(plain, encoding="utf-8")
 
     print(f"[OK]   {nid} -> {dest_md.relative_to(ROOT)}")
@@ -228,7 +244,7 @@ def find_next_index_href(html: str) -> str | None:
     return None
 
 
-def discover_index_urls(start_url: str, limit: int = 20) -> list[str]:
+def discover_index_urls(engine: FetchEngine, start_url: str, limit: int = 20) -> list[str]:
     """Discover all paginated index page URLs by following pager links on Wayback.
 
     Returns absolute Wayback URLs for each index page variant.
@@ -242,7 +258,7 @@ def discover_index_urls(start_url: str, limit: int = 20) -> list[str]:
             continue
         seen.add(u)
         try:
-            html = http_get(u)
+            html = http_get(engine, u)
         except Exception as exc:
             print(f"[WARN] index fetch failed {u}: {exc}")
             continue
@@ -255,76 +271,129 @@ def discover_index_urls(start_url: str, limit: int = 20) -> list[str]:
     return urls
 
 
-def fetch_index_for_page(page_num: int) -> tuple[str, str]:
-    """Return (url, html) for an index listing page, trying known snapshots.
-
-    Ensures we hit a capture that actually contains listing content.
-    """
+def index_url(page_num: int, snap: str, base: str = WAYBACK_BASE) -> str:
     base_http = "http://www.dyslexiaaction.org.uk/tech-blog"
     http_url = base_http if page_num == 0 else f"{base_http}?page={page_num}"
-    last_exc: Exception | None = None
-    for snap in SNAPSHOTS:
-        url = f"{WAYBACK_BASE}/web/{snap}/{http_url}"
-        try:
-            html = http_get(url)
-        except Exception as exc:
-            last_exc = exc
-            continue
-        # Quick heuristic: expect at least one listing title container
-        if re.search(r'<div class="views-field views-field-title">', html, flags=re.I):
-            return url, html
-    # Fallback to latest attempt even if no marker
-    if last_exc:
-        raise last_exc
-    # As a last resort, just return the first URL with empty html
-    return f"{WAYBACK_BASE}/web/{SNAPSHOTS[0]}/{http_url}", ""
-
-
-def run(start_page: int, end_page: int, force: bool = False) -> None:
-    # Discover all index page URLs via pager links
-    # Process each requested page directly using fallback snapshots
-    for p in range(start_page, end_page + 1):
+    return f"{base}/web/{snap}/{http_url}"
+
+
+def fetch_indexes(engine: FetchEngine, pages: Iterable[int], base: str = WAYBACK_BASE,
+                  resume: bool = True) -> dict[int, tuple[str, str | Exception]]:
+    """(url, html) of each index listing page, trying known snapshots.
+
+    A listing saved by an earlier run is reused. Otherwise every snapshot of
+    every page is probed at once, and the first capture in SNAPSHOTS order
+    that actually contains listing content is chosen, so the result does not
+    depend on which answer arrives first. html is the exception when no
+    snapshot could be fetched, and "" when none had listings.
+    """
+    found: dict[int, tuple[str, str | Exception]] = {}
+    probes: list[tuple[int, str]] = []
+    for p in pages:
+        raw = RAW_DIR / f"index-page{p}.html"
+        html = load_raw(raw) if resume else None
+        if html and LISTING_RE.search(html):
+            found[p] = (str(raw.relative_to(ROOT)), html)
+        else:
+            probes += [(p, index_url(p, snap, base)) for snap in SNAPSHOTS]
+
+    def probe(item: tuple[int, str]) -> str | Exception:
         try:
-            use_url, html = fetch_index_for_page(p)
+            return http_get(engine, item[1])
         except Exception as exc:
-            print(f"[WARN] index fetch failed for page {p}: {exc}")
-            continue
-        print(f"[INDEX] page {p}: {use_url}")
-        (RAW_DIR / f"index-page{p}.html").write_text(html, encoding="utf-8")
-        post_urls, date_strs = parse_index(html)
-        if len(post_urls) > len(date_strs):
-            post_urls = post_urls[: len(date_strs)]
-        print(f"  posts: {len(post_urls)}, dates: {len(date_strs)}")
-
-        for i, (rel_url, dstr) in enumerate(zip(post_urls, date_strs), start=1):
-            full_url = rel_url if rel_url.startswith("http") else f"{WAYBACK_BASE}{rel_url}"
-            canonical = strip_wayback_prefix(full_url)
-            date_iso = normalize_date(dstr)
+            return exc
+
+    answers: dict[int, list[tuple[str, str | Exception]]] = {}
+    for (p, url), html in zip(probes, engine.map(probe, probes)):
+        answers.setdefault(p, []).append((url, html))
+    for p, candidates in answers.items():
+        listing = [(url, html) for url, html in candidates if isinstance(html, str) and LISTING_RE.search(html)]
+        errors = [(url, html) for url, html in candidates if isinstance(html, Exception)]
+        if listing:
+            found[p] = listing[0]
+        elif errors:
+            found[p] = errors[-1]
+        else:
+            found[p] = (candidates[0][0], "")
+    return found
+
+
+def run(start_page: int, end_page: int, force: bool = False, workers: int = DEFAULT_WORKERS,
+        rate: float = DEFAULT_RATE, base: str = WAYBACK_BASE, resume: bool = True,
+        cache: HttpCache | None = None) -> None:
+    """Scrape index pages start_page..end_page and their posts.
+
+    Index pages and then posts are fetched concurrently (at most `workers` in
+    flight, `rate` requests per second). Every page is saved under RAW_DIR as
+    soon as it arrives and, with resume, reused instead of fetched again, so
+    an interrupted crawl picks up where it stopped. Posts are converted and
+    written in listing order on the main thread.
+    """
+    with FetchEngine(workers, rate, user_agent=USER_AGENT, cache=cache) as engine:
+        engine.session.headers["Accept"] = "text/html,application/xhtml+xml"
+        pages = range(start_page, end_page + 1)
+        indexes = fetch_indexes(engine, pages, base, resume)
+        posts: list[tuple[int, int, str, str]] = []
+        for p in pages:
+            use_url, html = indexes[p]
+            if isinstance(html, Exception):
+                print(f"[WARN] index fetch failed for page {p}: {html}")
+                continue
+            print(f"[INDEX] page {p}: {use_url}")
+            if LISTING_RE.search(html):
+                save_raw(RAW_DIR / f"index-page{p}.html", html)
+            post_urls, date_strs = parse_index(html)
+            if len(post_urls) > len(date_strs):
+                post_urls = post_urls[: len(date_strs)]
+            print(f"  posts: {len(post_urls)}, dates: {len(date_strs)}")
+            for i, (rel_url, dstr) in enumerate(zip(post_urls, date_strs), start=1):
+                full_url = rel_url if rel_url.startswith("http") else f"{base}{rel_url}"
+                posts.append((p, i, full_url, dstr))
+
+        def fetch_post(item: tuple[int, int, str, str]) -> tuple[str | Exception, bool]:
+            """(html or the exception, whether it came from RAW_DIR)"""
+            p, i, full_url, _ = item
+            raw = RAW_DIR / f"post-p{p}-{i:02d}.html"
+            html = load_raw(raw) if resume else None
+            if html:
+                return html, True
             try:
-                post_html = http_get(full_url)
-                (RAW_DIR / f"post-p{p}-{i:02d}.html").write_text(post_html, encoding="utf-8")
-                title = extract_title(post_html)
+                html = http_get(engine, full_url)
             except Exception as exc:
-                print(f"[WARN] fetch failed for {full_url}: {exc}")
+                return exc, False
+            save_raw(raw, html)
+            return html, False
+
+        fetched = engine.map(fetch_post, posts)
+        reused = sum(from_raw for _, from_raw in fetched)
+        for (p, i, full_url, dstr), (post_html, _) in zip(posts, fetched):
+            if isinstance(post_html, Exception):
+                print(f"[WARN] fetch failed for {full_url}: {post_html}")
                 continue
-
-            slug = slugify((title or "untitled"), max_length=80)
-            year = date_iso[:4]
-            dest_md = (OUT_CONTENT / year / slug / "index.md")
+            canonical = strip_wayback_prefix(full_url)
+            date_iso = normalize_date(dstr)
+            title = extract_title(post_html)
+            _, dest_md, _ = post_paths(date_iso, title)
             if dest_md.exists() and not force:
-                print(f"[SKIP] {year}/{slug} (exists)")
+                print(f"[SKIP] {dest_md.parent.relative_to(OUT_CONTENT)} (exists)")
                 continue
-
-            body_html = extract_body_html(post_html) or ""
-            body_md = html_to_md(body_html)
-            write_post(date_iso, title or "Untitled", body_md, canonical)
-            time.sleep(0.1)
+            write_post(date_iso, title or "Untitled", post_body_md(post_html), canonical)
+        print(f"Posts: {len(posts)} ({reused} from {RAW_DIR.relative_to(ROOT)}); fetched: {engine.summary()}")
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--force", action="store_true", help="overwrite existing outputs")
     parser.add_argument("--pages", nargs=2, type=int, metavar=("START", "END"), help="page range inclusive (default 0 7)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="concurrent requests")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="requests per second")
+    parser.add_argument("--base-url", default=WAYBACK_BASE,
+                        help="Wayback Machine to scrape (e.g. fake_wayback_server.py for testing)")
+    parser.add_argument("--no-resume", action="store_true", help="fetch pages again even if saved in the raw dir")
+    parser.add_argument("--offline", action="store_true", help="serve pages from the HTTP cache only")
+    parser.add_argument("--no-cache", action="store_true", help="bypass the HTTP cache")
     args = parser.parse_args()
     start, end = (0, 7) if not args.pages else (args.pages[0], args.pages[1])
-    run(start, end, force=args.force)
+    cache = None if args.no_cache else HttpCache(ttl=math.inf, offline=args.offline)
+    run(start, end, force=args.force, workers=args.workers, rate=args.rate, base=args.base_url.rstrip("/"),
+        resume=not args.no_resume, cache=cache)
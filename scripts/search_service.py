@@ -0,0 +1,580 @@
+#!/usr/bin/env python3
+"""
+Long-running semantic search over the index built by build_embeddings.py.
+
+Everything is loaded once: dataset/faiss.index (memory-mapped where FAISS
+supports it), faiss_ids.json / faiss_chunks.json, and the corpus through
+CorpusReader (memory-mapped shards, metadata from corpus.index.json). Queries
+are embedded by a pluggable backend:
+
+  openai  the embeddings API (model from dataset/faiss_state.json by default)
+  fake    deterministic offline stub, the same feature hashing as
+          fake_embeddings_server.py, so it matches indexes built against it
+  module:factory  any callable(dim, model, api_base) returning an object
+          with embed(texts) -> (n, dim) float32 array
+
+Concurrent requests go through a micro-batching queue: the worker takes
+whatever queries arrived within --max-wait-ms (up to --max-batch), embeds them
+in one call and runs one index.search() for the lot. Hits are collapsed to
+the best chunk per document and carry id, title, url, date, source, score and
+a snippet; every response includes its queue / embed / search timings and
+GET /stats reports p50 / p99 latency and batch sizes. Indexes of int8 or
+binary codes (build_embeddings.py --index sq8 / binary) are rescored against
+the memory-mapped embeddings.npy.
+
+Three query modes, per request or --mode (default: vector if faiss.index
+exists, else bm25):
+
+  vector  the FAISS index only
+  bm25    dataset/bm25.index only (bm25_index.py): exact terms, no embedding call
+  hybrid  both, fused by reciprocal rank (RRF_K) over the top k * OVERFETCH
+          documents of each; hits also carry vector_score / bm25_score
+
+Any query can be restricted by source, tag, year, language and from / to
+dates (metadata_filter.py). Vector search hands FAISS the bitset selection
+from dataset/faiss_meta.npz, or scores the selected vectors exactly when
+there are few of them; BM25 masks its documents by the corpus index columns.
+Queries in one batch that share a filter share one search.
+
+HTTP API:
+  GET  /search?q=metaphor+hacking&k=5&mode=hybrid
+  GET  /search?q=metaphor&source=Metaphor+Hacker&from=2018&to=2018&tag=AI&tag=NLP
+  POST /search  {"query": "...", "k": 5, "mode": "bm25"}  or  {"queries": ["...", "..."], "k": 5}
+  POST /search  {"query": "...", "filter": {"source": ["Medium"], "year": 2019}}
+  GET  /stats
+  GET  /health
+
+Usage:
+  python scripts/search_service.py serve --port 8766
+  python scripts/search_service.py serve --embedder fake      # offline, no API key
+  python scripts/search_service.py query "frame semantics" -k 5
+  python scripts/search_service.py query --mode hybrid "Fillmore frames"
+  python scripts/search_service.py query --source "Metaphor Hacker" --from 2018 --to 2018 "metaphor"
+  python scripts/search_service.py bench --embedder fake --requests 2000 --concurrency 16
+
+Dependencies:
+  pip install numpy faiss-cpu openai   # openai only for --embedder openai
+
+Environment:
+  OPENAI_API_KEY - required for --embedder openai
+  OPENAI_BASE_URL - default for --api-base
+"""
+from __future__ import annotations
+import argparse
+import importlib
+import json
+import os
+import pathlib
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+import faiss
+
+from bm25_index import BM25_FILE, Bm25Index
+from corpus_reader import CorpusReader
+from embedding_matrix import load_embeddings
+from faiss_index import (QUANTIZED, RESCORE_FACTOR, faiss_labels, index_kind, read_index, search as index_search,
+                         search_rescored, tombstones)
+from metadata_filter import FIELDS, META_FILE, MetadataIndex, filter_key, filtered_search, matches, parse_filters
+
+REPO = pathlib.Path(".").resolve()
+DATASET = REPO / "dataset"
+DEFAULT_MODEL = "text-embedding-3-small"
+DEFAULT_K = 10
+MAX_K = 100
+DEFAULT_MAX_BATCH = 32
+DEFAULT_MAX_WAIT_MS = 2.0
+SNIPPET_CHARS = 240
+# chunk hits fetched per requested document, so collapsing chunks still fills k
+OVERFETCH = 4
+LATENCY_WINDOW = 10_000
+MODES = ("vector", "bm25", "hybrid")
+# reciprocal rank fusion constant (60 in Cormack et al.)
+RRF_K = 60
+# distinct filters whose selections (bitmap, BM25 mask) are kept
+FILTER_CACHE = 256
+
+class FakeEmbedder:
+    """Offline embedder: same vectors as fake_embeddings_server.py."""
+
+    def __init__(self, dim: int, model: str = "", api_base: Optional[str] = None):
+        from fake_embeddings_server import fake_embedding
+        self.dim = dim
+        self._embed = fake_embedding
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        return np.stack([self._embed(t, self.dim) for t in texts]).astype(np.float32)
+
+class OpenAIEmbedder:
+    def __init__(self, dim: int, model: str = DEFAULT_MODEL, api_base: Optional[str] = None):
+        import openai
+        self.dim = dim
+        self.model = model
+        self.client = openai.OpenAI(base_url=api_base) if api_base else openai.OpenAI()
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        response = self.client.embeddings.create(model=self.model, input=list(texts))
+        return np.array([d.embedding for d in sorted(response.data, key=lambda d: d.index)], dtype=np.float32)
+
+EMBEDDERS = {"openai": OpenAIEmbedder, "fake": FakeEmbedder}
+
+def make_embedder(name: str, dim: int, model: str, api_base: Optional[str] = None):
+    """Embedder by registry name or "module:factory"."""
+    if name in EMBEDDERS:
+        return EMBEDDERS[name](dim, model, api_base)
+    module, _, attr = name.partition(":")
+    if not attr:
+        raise ValueError(f"unknown embedder {name!r} (use {', '.join(EMBEDDERS)} or module:factory)")
+    return getattr(importlib.import_module(module), attr)(dim, model, api_base)
+
+def percentile(values, q: float) -> Optional[float]:
+    return round(float(np.percentile(values, q)), 3) if len(values) else None
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = RRF_K) -> List[Tuple[str, float]]:
+    """Fuse ranked id lists: score(d) = sum of 1 / (k + rank of d), best first."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: -item[1])
+
+class SearchService:
+    """Indexes, id maps and corpus loaded once; queries served through a batching worker.
+
+    Either index may be missing: without faiss.index only "bm25" queries are
+    served (and no embedder is created), without bm25.index only "vector".
+    Filtered vector queries need faiss_meta.npz next to the index.
+    """
+
+    def __init__(self, dataset_dir: pathlib.Path = DATASET, embedder: str = "openai",
+                 model: Optional[str] = None, api_base: Optional[str] = None,
+                 max_batch: int = DEFAULT_MAX_BATCH, max_wait_ms: float = DEFAULT_MAX_WAIT_MS,
+                 snippet_chars: int = SNIPPET_CHARS, mode: Optional[str] = None):
+        self.dir = pathlib.Path(dataset_dir)
+        t0 = time.perf_counter()
+        self.index: Optional[faiss.Index] = None
+        self.embedder = None
+        self.embedder_name = None
+        self.model = None
+        if (self.dir / "faiss.index").exists():
+            self.index = read_index(self.dir / "faiss.index", mmap=True)
+            self.ids: List[str] = json.loads((self.dir / "faiss_ids.json").read_text(encoding="utf-8"))
+            chunks_path = self.dir / "faiss_chunks.json"
+            self.chunks = json.loads(chunks_path.read_text(encoding="utf-8")) if chunks_path.exists() else None
+            state_path = self.dir / "faiss_state.json"
+            state = json.loads(state_path.read_text(encoding="utf-8")) if state_path.exists() else {}
+            # id-mapped indexes return faiss_id() labels, older flat ones positions
+            if hasattr(self.index, "id_map"):
+                self.positions: Optional[Dict[int, int]] = {int(label): pos for pos, label in
+                                                             enumerate(faiss_labels(self.ids))}
+            else:
+                self.positions = None
+            self.meta: Optional[MetadataIndex] = None
+            if self.positions is not None and (self.dir / META_FILE).exists():
+                self.meta = MetadataIndex.load(self.dir)
+                if self.meta.n != self.index.ntotal:
+                    print(f"WARNING: {META_FILE} does not match faiss.index, filtered vector search disabled "
+                          f"(re-run build_embeddings.py)")
+                    self.meta = None
+            # int8 / binary codes are only a first stage: rescore against the float matrix,
+            # which also serves exact search over small filtered selections
+            self.rescore = index_kind(self.index) in QUANTIZED
+            self.matrix = None
+            if self.rescore or self.meta is not None:
+                matrix_ids, self.matrix = load_embeddings(self.dir)
+                self.matrix_rows = (self.positions if matrix_ids == self.ids else
+                                    {int(label): row for row, label in enumerate(faiss_labels(matrix_ids))})
+            self.model = model or state.get("model") or DEFAULT_MODEL
+            self.embedder = make_embedder(embedder, self.index.d, self.model, api_base)
+            self.embedder_name = embedder
+        self.bm25 = Bm25Index.load(self.dir) if (self.dir / BM25_FILE).exists() else None
+        self.modes = [m for m, ok in (("vector", self.index is not None), ("bm25", self.bm25 is not None),
+                                      ("hybrid", self.index is not None and self.bm25 is not None)) if ok]
+        if not self.modes:
+            raise FileNotFoundError(f"neither faiss.index nor {BM25_FILE} found in {self.dir}")
+        self.mode = mode or self.modes[0]
+        if self.mode not in self.modes:
+            raise ValueError(f"mode {self.mode!r} needs an index that is missing (available: {', '.join(self.modes)})")
+        self.reader = CorpusReader(self.dir)
+        self.selections: Dict[Tuple, Tuple[np.ndarray, int]] = {}
+        self.masks: Dict[Tuple, np.ndarray] = {}
+        self.snippet_chars = snippet_chars
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000
+        self.load_ms = (time.perf_counter() - t0) * 1000
+
+        self.queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self.lock = threading.Lock()
+        self.latencies: deque = deque(maxlen=LATENCY_WINDOW)
+        self.counts = {"queries": 0, "batches": 0, "errors": 0}
+        self.started = time.time()
+        self.worker = threading.Thread(target=self._work, name="search-batcher", daemon=True)
+        self.worker.start()
+
+    def __enter__(self) -> "SearchService":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def close(self):
+        if self.worker.is_alive():
+            self.queue.put(None)
+            self.worker.join()
+        self.reader.close()
+
+    def submit(self, query: str, k: int = DEFAULT_K, mode: Optional[str] = None,
+               filters: Optional[Dict[str, Any]] = None) -> Future:
+        mode = mode or self.mode
+        if mode not in self.modes:
+            raise ValueError(f"mode must be one of {', '.join(self.modes)}")
+        filters = parse_filters(filters)
+        if filters and mode != "bm25" and self.meta is None:
+            raise ValueError(f"filtered {mode} search needs {META_FILE} (re-run build_embeddings.py)")
+        future: Future = Future()
+        self.queue.put((query, max(1, min(int(k), MAX_K)), mode, filters, time.perf_counter(), future))
+        return future
+
+    def search(self, query: str, k: int = DEFAULT_K, mode: Optional[str] = None,
+               filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        return self.submit(query, k, mode, filters).result()
+
+    def search_many(self, queries: Sequence[str], k: int = DEFAULT_K, mode: Optional[str] = None,
+                    filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        futures = [self.submit(q, k, mode, filters) for q in queries]
+        return [f.result() for f in futures]
+
+    def _work(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch:
+                try:
+                    # drain what is already queued, then wait out the window
+                    item = self.queue.get(timeout=max(0.0, deadline - time.perf_counter()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._run(batch)
+                    return
+                batch.append(item)
+            self._run(batch)
+
+    def _selection(self, filters: Dict[str, Any]) -> Tuple[np.ndarray, int]:
+        key = filter_key(filters)
+        if key not in self.selections:
+            if len(self.selections) >= FILTER_CACHE:
+                self.selections.clear()
+            self.selections[key] = self.meta.select(filters)
+        return self.selections[key]
+
+    def _mask(self, filters: Dict[str, Any]) -> np.ndarray:
+        """BM25 documents passing filters, judged by the corpus index columns."""
+        key = filter_key(filters)
+        if key not in self.masks:
+            if len(self.masks) >= FILTER_CACHE:
+                self.masks.clear()
+            self.masks[key] = np.array([doc_id in self.reader and matches(self.reader.meta(doc_id), filters)
+                                        for doc_id in self.bm25.ids], dtype=bool)
+        return self.masks[key]
+
+    def _dense_search(self, vectors: np.ndarray, k: int, filters: Dict[str, Any]):
+        fetch = min(k * OVERFETCH, self.index.ntotal)
+        if filters:
+            bitmap, count = self._selection(filters)
+            return filtered_search(self.index, vectors, fetch, self.meta, bitmap, count, self.matrix,
+                                   self.matrix_rows, RESCORE_FACTOR if self.rescore else 0)
+        if self.rescore:
+            return search_rescored(self.index, vectors, fetch, self.matrix, self.matrix_rows)
+        return index_search(self.index, vectors, fetch)
+
+    def _run(self, batch: List[tuple]):
+        # only vector / hybrid queries are embedded, all of them in one call; one search per distinct filter
+        dense = [i for i, item in enumerate(batch) if item[2] != "bm25"]
+        rows: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        t0 = t1 = t2 = time.perf_counter()
+        try:
+            if dense:
+                vectors = np.ascontiguousarray(self.embedder.embed([batch[i][0] for i in dense]), dtype=np.float32)
+                faiss.normalize_L2(vectors)
+                t1 = time.perf_counter()
+                groups: Dict[Tuple, List[int]] = {}
+                for row, i in enumerate(dense):
+                    groups.setdefault(filter_key(batch[i][3]), []).append(row)
+                for members in groups.values():
+                    filters = batch[dense[members[0]]][3]
+                    scores, labels = self._dense_search(vectors[members], max(batch[dense[r]][1] for r in members),
+                                                        filters)
+                    for j, row in enumerate(members):
+                        rows[dense[row]] = (scores[j], labels[j])
+                t2 = time.perf_counter()
+        except Exception as e:
+            with self.lock:
+                self.counts["errors"] += len(batch)
+            for item in batch:
+                item[-1].set_exception(e)
+            return
+        for i, (query, k, mode, filters, queued, future) in enumerate(batch):
+            t3 = time.perf_counter()
+            try:
+                vector = self._vector_ranking(*rows[i]) if i in rows else []
+                lexical = (self.bm25.search(query, k * OVERFETCH, self._mask(filters) if filters else None)
+                           if mode != "vector" else [])
+                t4 = time.perf_counter()
+                hits = self._rank(mode, k, vector, lexical)
+            except Exception as e:
+                with self.lock:
+                    self.counts["errors"] += 1
+                future.set_exception(e)
+                continue
+            done = time.perf_counter()
+            timing = {"queue_ms": round((t0 - queued) * 1000, 3),
+                      "embed_ms": round((t1 - t0) * 1000, 3) if i in rows else 0.0,
+                      "search_ms": round((t2 - t1) * 1000, 3) if i in rows else 0.0,
+                      "lexical_ms": round((t4 - t3) * 1000, 3),
+                      "total_ms": round((done - queued) * 1000, 3),
+                      "batch_size": len(batch)}
+            with self.lock:
+                self.latencies.append(timing["total_ms"])
+                self.counts["queries"] += 1
+            result = {"query": query, "k": k, "mode": mode, "hits": hits, "timing": timing}
+            if filters:
+                result["filter"] = filters
+            future.set_result(result)
+        with self.lock:
+            self.counts["batches"] += 1
+
+    def _vector_ranking(self, scores: np.ndarray, labels: np.ndarray) -> List[Tuple[str, int, float]]:
+        """(doc id, chunk position, score) of the best chunk per document, in score order."""
+        ranking = []
+        seen = set()
+        for score, label in zip(scores.tolist(), labels.tolist()):
+            if label < 0:
+                continue
+            pos = label if self.positions is None else self.positions.get(label)
+            if pos is None or pos >= len(self.ids):
+                continue
+            doc_id = self.chunks["doc_id"][pos] if self.chunks else self.ids[pos]
+            if doc_id not in seen:
+                seen.add(doc_id)
+                ranking.append((doc_id, pos, score))
+        return ranking
+
+    def _rank(self, mode: str, k: int, vector: List[Tuple[str, int, float]],
+              lexical: List[Tuple[str, float]]) -> List[Dict[str, Any]]:
+        if mode == "vector":
+            return [self._hit(doc_id, pos, {"score": round(score, 4)}) for doc_id, pos, score in vector[:k]]
+        if mode == "bm25":
+            return [self._hit(doc_id, None, {"score": round(score, 4)}) for doc_id, score in lexical[:k]]
+        dense = {doc_id: (pos, score) for doc_id, pos, score in vector}
+        sparse = dict(lexical)
+        hits = []
+        for doc_id, score in reciprocal_rank_fusion([[d for d, _, _ in vector], [d for d, _ in lexical]])[:k]:
+            pos, vector_score = dense.get(doc_id, (None, None))
+            fields: Dict[str, Any] = {"score": round(score, 6)}
+            if vector_score is not None:
+                fields["vector_score"] = round(vector_score, 4)
+            if doc_id in sparse:
+                fields["bm25_score"] = round(sparse[doc_id], 4)
+            hits.append(self._hit(doc_id, pos, fields))
+        return hits
+
+    def _hit(self, doc_id: str, pos: Optional[int], fields: Dict[str, Any]) -> Dict[str, Any]:
+        """Result entry with corpus metadata; the snippet is the matched chunk when there is one."""
+        hit: Dict[str, Any] = {"id": doc_id}
+        if pos is not None:
+            hit["chunk"] = self.ids[pos]
+        hit.update(fields)
+        if doc_id in self.reader:
+            meta = self.reader.meta(doc_id)
+            hit.update({key: meta.get(key) for key in ("title", "url", "date", "source")})
+            if self.snippet_chars:
+                text = (self.reader.get(doc_id) or {}).get("text") or ""
+                if pos is not None and self.chunks:
+                    text = text[self.chunks["start"][pos]:self.chunks["end"][pos]]
+                hit["snippet"] = text[:self.snippet_chars]
+        return hit
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            latencies = list(self.latencies)
+            counts = dict(self.counts)
+        return {
+            **counts,
+            "mean_batch": round(counts["queries"] / counts["batches"], 2) if counts["batches"] else None,
+            "p50_ms": percentile(latencies, 50),
+            "p99_ms": percentile(latencies, 99),
+            "uptime_s": round(time.time() - self.started, 1),
+            "load_ms": round(self.load_ms, 1),
+            "index": None if self.index is None else {
+                "kind": index_kind(self.index), "vectors": self.index.ntotal - tombstones(self.index),
+                "dim": self.index.d},
+            "bm25": None if self.bm25 is None else {"documents": len(self.bm25), "terms": len(self.bm25.term_ids)},
+            "filter_keys": None if self.index is None or self.meta is None else len(self.meta.keys),
+            "modes": self.modes,
+            "embedder": self.embedder_name,
+            "model": self.model,
+        }
+
+class SearchHandler(BaseHTTPRequestHandler):
+    service: SearchService
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send(self, status: int, body: dict):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _search(self, queries: List[str], k: int, mode: Optional[str], filters: Any, single: bool):
+        if not queries or not all(isinstance(q, str) and q.strip() for q in queries):
+            self._send(400, {"error": "query must be a non-empty string"})
+            return
+        if filters is not None and not isinstance(filters, dict):
+            self._send(400, {"error": "filter must be a JSON object"})
+            return
+        try:
+            results = self.service.search_many(queries, k, mode, filters)
+        except ValueError as e:
+            self._send(400, {"error": str(e)})
+            return
+        except Exception as e:
+            self._send(502, {"error": f"{type(e).__name__}: {e}"})
+            return
+        self._send(200, results[0] if single else {"results": results})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        path = url.path.rstrip("/")
+        if path == "/search":
+            params = parse_qs(url.query)
+            try:
+                k = int(params.get("k", [DEFAULT_K])[0])
+            except ValueError:
+                self._send(400, {"error": "k must be an integer"})
+                return
+            filters = {field: params[field] for field in FIELDS if field in params}
+            filters.update({bound: params[bound][0] for bound in ("from", "to") if bound in params})
+            self._search(params.get("q", [""])[:1], k, params.get("mode", [None])[0], filters, single=True)
+        elif path == "/stats":
+            self._send(200, self.service.stats())
+        elif path == "/health":
+            self._send(200, {"status": "ok"})
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        if urlparse(self.path).path.rstrip("/") != "/search":
+            self._send(404, {"error": "not found"})
+            return
+        try:
+            req = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            k = int(req.get("k", DEFAULT_K))
+        except (ValueError, AttributeError):
+            self._send(400, {"error": "body must be a JSON object"})
+            return
+        if "queries" in req:
+            queries = req["queries"] if isinstance(req["queries"], list) else []
+            self._search(queries, k, req.get("mode"), req.get("filter"), single=False)
+        else:
+            self._search([req.get("query")], k, req.get("mode"), req.get("filter"), single=True)
+
+def serve(service: SearchService, host: str, port: int):
+    SearchHandler.service = service
+    server = ThreadingHTTPServer((host, port), SearchHandler)
+    stats = service.stats()
+    index = f"{stats['index']['kind']}, {stats['index']['vectors']} vectors, " if stats["index"] else ""
+    print(f"Search on http://{host}:{port}/search ({index}modes {'/'.join(service.modes)}, "
+          f"default {service.mode}, loaded in {stats['load_ms']:.0f} ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def bench(args: argparse.Namespace):
+    """Throughput and latency of concurrent single queries, unbatched vs batched."""
+    with CorpusReader(args.dataset) as reader:
+        titles = [m["title"] for m in (reader.meta(i) for i in reader.ids) if m.get("title")]
+    queries = [titles[i % len(titles)] for i in range(args.requests)]
+    filters = cli_filters(args)
+    for max_batch in (1, args.max_batch):
+        with SearchService(args.dataset, args.embedder, args.model, args.api_base, max_batch,
+                           args.max_wait_ms, mode=args.mode) as service:
+            t0 = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                list(pool.map(lambda q: service.search(q, args.k, filters=filters), queries))
+            secs = time.perf_counter() - t0
+            s = service.stats()
+        print(f"max batch {max_batch:3d}: {len(queries) / secs:8.1f} queries/s, p50 {s['p50_ms']} ms, "
+              f"p99 {s['p99_ms']} ms, mean batch {s['mean_batch']}")
+
+def cli_filters(args: argparse.Namespace) -> Dict[str, Any]:
+    return parse_filters({**{field: getattr(args, field) for field in FIELDS},
+                          "from": args.date_from, "to": args.date_to})
+
+def main():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--dataset", type=pathlib.Path, default=DATASET)
+    common.add_argument("--embedder", default="openai",
+                        help=f"{' | '.join(EMBEDDERS)} | module:factory (default openai)")
+    common.add_argument("--model", help="embedding model (default: the one the index was built with)")
+    common.add_argument("--api-base", default=os.getenv("OPENAI_BASE_URL"))
+    common.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH, help="queries per index.search call")
+    common.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT_MS,
+                        help="how long the batcher waits for more queries")
+    common.add_argument("--mode", choices=MODES,
+                        help="default query mode (vector if faiss.index exists, else bm25)")
+    for field in FIELDS:
+        common.add_argument(f"--{field}", action="append", help=f"only documents with this {field} (repeatable)")
+    common.add_argument("--from", dest="date_from", help="only documents dated on or after this ISO prefix")
+    common.add_argument("--to", dest="date_to", help="only documents dated on or before this ISO prefix")
+    parser = argparse.ArgumentParser(description="Semantic search service over dataset/faiss.index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_serve = sub.add_parser("serve", parents=[common], help="run the HTTP service")
+    p_serve.add_argument("--host", default="127.0.0.1")
+    p_serve.add_argument("--port", type=int, default=8766)
+    p_query = sub.add_parser("query", parents=[common], help="run queries once and print the hits")
+    p_query.add_argument("queries", nargs="+")
+    p_query.add_argument("-k", type=int, default=DEFAULT_K)
+    p_query.add_argument("--json", action="store_true", help="print the raw JSON results")
+    p_bench = sub.add_parser("bench", parents=[common], help="concurrent query throughput, batched vs not")
+    p_bench.add_argument("--requests", type=int, default=1000)
+    p_bench.add_argument("--concurrency", type=int, default=16)
+    p_bench.add_argument("-k", type=int, default=DEFAULT_K)
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        bench(args)
+        return
+    service = SearchService(args.dataset, args.embedder, args.model, args.api_base, args.max_batch,
+                            args.max_wait_ms, mode=args.mode)
+    with service:
+        if args.command == "serve":
+            serve(service, args.host, args.port)
+            return
+        for result in service.search_many(args.queries, args.k, filters=cli_filters(args)):
+            if args.json:
+                print(json.dumps(result, ensure_ascii=False, indent=2))
+                continue
+            print(f"{result['query']}  ({result['timing']['total_ms']:.1f} ms)")
+            for hit in result["hits"]:
+                print(f"  {hit['score']:.4f}  {hit['id']}  {hit.get('title') or ''}")
+
+if __name__ == "__main__":
+    main()
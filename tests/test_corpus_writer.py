@@ -0,0 +1,32 @@
+import json
+import stat
+
+from corpus_reader import CorpusReader
+from corpus_writer import CorpusWriter
+
+ROWS = [{"id": f"doc{i}", "date": f"{2018 + i % 3}-01-01", "source": "Medium", "tags": [], "title": f"T{i}",
+         "url": "", "language": "en", "text": f"text {i}"} for i in range(6)]
+
+def publish(out, **kwargs):
+    with CorpusWriter(out, shard_by="year", **kwargs) as writer:
+        for row in ROWS:
+            writer.write(row)
+        return writer.commit()
+
+def test_published_files_are_world_readable(tmp_path):
+    manifest = publish(tmp_path)
+    files = [tmp_path / "manifest.json", tmp_path / manifest["index"]]
+    files += [tmp_path / s[key] for s in manifest["shards"] for key in ("path", "name")]
+    for path in files:
+        assert stat.S_IMODE(path.stat().st_mode) & 0o044 == 0o044, path.name
+
+def test_republish_replaces_old_files_and_reads_back(tmp_path):
+    first = publish(tmp_path)
+    second = publish(tmp_path, compress="gzip")
+    assert json.loads((tmp_path / "manifest.json").read_text())["shards"] == second["shards"]
+    for s in first["shards"]:
+        assert not (tmp_path / s["path"]).exists()
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(
+        ["manifest.json", second["index"]] + [s[k] for s in second["shards"] for k in ("path", "name")])
+    with CorpusReader(tmp_path) as reader:
+        assert [reader.get(row["id"])["text"] for row in ROWS] == [row["text"] for row in ROWS]
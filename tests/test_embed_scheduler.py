@@ -0,0 +1,91 @@
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+import numpy as np
+import openai
+import pytest
+
+from embed_scheduler import AdaptiveConcurrency, EmbeddingScheduler
+from fake_embeddings_server import FakeEmbeddings, fake_embedding
+
+DIM = 16
+
+@pytest.fixture
+def fake_server():
+    """Start fake_embeddings_server's handler on an ephemeral port; yields a factory taking its options."""
+    servers = []
+
+    def start(**options):
+        handler = type("Handler", (FakeEmbeddings,), {
+            "dim": DIM, "in_flight": 0, "lock": threading.Lock(),
+            "stats": {"requests": 0, "inputs": 0, "rate_limited": 0}, **options})
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        client = openai.OpenAI(base_url=f"http://127.0.0.1:{server.server_address[1]}/v1", api_key="local",
+                               max_retries=0)
+        return client, handler.stats
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+def texts(n):
+    return [f"document {i} about metaphor number {i}" for i in range(n)]
+
+def run(scheduler, docs):
+    done, failed = {}, {}
+
+    def on_batch(batch, vectors):
+        done.update(zip(batch, vectors))
+
+    def on_failed(batch, error):
+        failed.update((i, error) for i in batch)
+
+    stats = scheduler.run(docs, None, on_batch, on_failed)
+    return done, failed, stats
+
+def test_rejected_document_is_isolated_by_bisection(fake_server):
+    client, server_stats = fake_server(reject_substring="REJECT")
+    docs = texts(40)
+    docs[13] += " REJECT"
+    scheduler = EmbeddingScheduler(client, "test-model", concurrency=4, max_inputs=8)
+    done, failed, stats = run(scheduler, docs)
+    assert list(failed) == [13] and "BadRequestError" in failed[13]
+    assert sorted(done) == [i for i in range(40) if i != 13]
+    for i, vector in done.items():
+        assert np.allclose(vector, fake_embedding(docs[i], DIM), atol=1e-6)
+    # 8 -> 4 -> 2 -> 1 around the bad text; the other four batches go through whole
+    assert stats["bisected"] == 3 and stats["failed_batches"] == 1
+    assert stats["batches"] == 5 and server_stats["inputs"] == 39
+
+def test_rate_limits_wait_for_retry_after(fake_server):
+    client, server_stats = fake_server(max_concurrent=2, latency=0.05, retry_after=0.2)
+    scheduler = EmbeddingScheduler(client, "test-model", concurrency=8, max_concurrency=8, max_inputs=2)
+    t0 = time.monotonic()
+    done, failed, stats = run(scheduler, texts(40))
+    assert not failed and sorted(done) == list(range(40))
+    assert stats["rate_limited"] == server_stats["rate_limited"] > 0
+    assert stats["final_concurrency"] < 8
+    assert time.monotonic() - t0 >= 0.2
+
+def test_aimd_limit():
+    limiter = AdaptiveConcurrency(initial=4, maximum=8)
+    for _ in range(4):
+        limiter.acquire()
+        limiter.release()
+    # +1 after about `limit` successes
+    assert 4.9 < limiter.limit < 5
+    limiter.acquire()
+    limiter.release(rate_limited=True, retry_after=0.2)
+    assert limiter.limit == pytest.approx(4.9 / 2, abs=0.1)
+    t0 = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - t0 >= 0.15
+    limiter.release()
+    for _ in range(200):
+        limiter.acquire()
+        limiter.release()
+    assert limiter.limit == 8 and limiter.peak == 8
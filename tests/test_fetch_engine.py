@@ -0,0 +1,98 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from fetch_engine import FetchEngine
+
+class Handler(BaseHTTPRequestHandler):
+    """/ok/<x> echoes x (after /ok/<x>?sleep=<s>), /limited/<key> answers 429 with
+    Retry-After once per key, /down always 503; arrival times are recorded per path."""
+
+    def do_GET(self):
+        server = self.server
+        path, _, query = self.path.partition("?")
+        with server.lock:
+            server.arrivals.setdefault(path, []).append(time.monotonic())
+            hits = len(server.arrivals[path])
+        if path.startswith("/limited/") and hits == 1:
+            return self.reply(429, b"slow down", {"Retry-After": str(server.retry_after)})
+        if path == "/down":
+            return self.reply(503, b"down", {"Retry-After": "0"})
+        if query.startswith("sleep="):
+            time.sleep(float(query[len("sleep="):]))
+        self.reply(200, path.rsplit("/", 1)[-1].encode())
+
+    def reply(self, status, body, headers=None):
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def start_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.lock = threading.Lock()
+    server.arrivals = {}
+    server.retry_after = 0.3
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    return server
+
+@pytest.fixture
+def servers():
+    started = [start_server(), start_server()]
+    yield started
+    for server in started:
+        server.shutdown()
+        server.server_close()
+
+def arrivals(server):
+    return sorted(t for times in server.arrivals.values() for t in times)
+
+def test_rate_limit_is_per_host(servers):
+    a, b = servers
+    urls = [f"{s.url}/ok/{i}" for s in (a, b) for i in range(6)]
+    with FetchEngine(workers=12, rate=10, burst=1) as engine:
+        t0 = time.monotonic()
+        bodies = engine.map(engine.text, urls)
+        elapsed = time.monotonic() - t0
+    assert bodies == [str(i) for _ in range(2) for i in range(6)]
+    for server in (a, b):
+        times = arrivals(server)
+        assert len(times) == 6
+        # one token every 0.1 s per host, whatever the worker count
+        assert min(t1 - t0 for t0, t1 in zip(times, times[1:])) >= 0.08
+    # the two hosts are throttled independently, so they overlap
+    assert elapsed < 0.9
+
+def test_429_waits_for_retry_after(servers):
+    server = servers[0]
+    with FetchEngine(workers=1, rate=0, retries=2) as engine:
+        response = engine.get(f"{server.url}/limited/x")
+    assert response.status_code == 200
+    assert engine.stats["retries"] == 1 and engine.stats["errors"] == 0
+    first, second = server.arrivals["/limited/x"]
+    assert second - first >= server.retry_after
+
+def test_gives_up_after_retries(servers):
+    server = servers[0]
+    with FetchEngine(workers=1, rate=0, retries=2) as engine:
+        response = engine.get(f"{server.url}/down")
+        assert engine.text(f"{server.url}/down") is None
+    assert response.status_code == 503
+    assert len(server.arrivals["/down"]) == 2 * 3
+    assert engine.stats["retries"] == 2 * 2 and engine.stats["errors"] == 2
+
+def test_map_keeps_input_order(servers):
+    server = servers[0]
+    # earlier items answer later
+    urls = [f"{server.url}/ok/{i}?sleep={0.05 * (8 - i)}" for i in range(8)]
+    with FetchEngine(workers=8, rate=0) as engine:
+        bodies = engine.map(engine.text, urls)
+    assert bodies == [str(i) for i in range(8)]
@@ -0,0 +1,104 @@
+import json
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+import requests
+
+import import_wordpress
+from fake_wordpress_server import FakeWordPress
+
+POSTS = 250
+
+@pytest.fixture
+def site():
+    handler = type("Handler", (FakeWordPress,), {
+        "posts": POSTS, "edits": {}, "in_flight": 0, "lock": threading.Lock(),
+        "stats": {"requests": 0, "post_objects": 0, "bytes": 0, "max_in_flight": 0}})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    """Point the importer's paths at an empty tmp tree."""
+    raw = tmp_path / "sources" / "wordpress" / "raw"
+    raw.mkdir(parents=True)
+    monkeypatch.setattr(import_wordpress, "ROOT", tmp_path)
+    monkeypatch.setattr(import_wordpress, "RAW_DIR", raw)
+    monkeypatch.setattr(import_wordpress, "STATE_PATH", raw.parent / "sync_state.json")
+    monkeypatch.setattr(import_wordpress, "OUT_CONTENT", tmp_path / "content")
+    monkeypatch.setattr(import_wordpress, "OUT_PLAIN", tmp_path / "plain")
+    (tmp_path / "content").mkdir()
+    (tmp_path / "plain").mkdir()
+    return tmp_path
+
+class Sync:
+    """Runs the importer and reports what each run cost the server (from /stats)."""
+
+    def __init__(self, site, tree):
+        self.site = site
+        self.tree = tree
+        self.last = self.stats()
+
+    def stats(self):
+        return requests.get(f"{self.site}/stats").json()
+
+    def __call__(self):
+        import_wordpress.run(self.site, workers=4, rate=0)
+        now = self.stats()
+        # the /stats request itself is counted too
+        delta = {"requests": now["requests"] - self.last["requests"] - 1,
+                 "post_objects": now["post_objects"] - self.last["post_objects"]}
+        self.last = now
+        return delta
+
+    def mark(self):
+        state = json.loads((self.tree / "sources" / "wordpress" / "sync_state.json").read_text())
+        return state["sites"][self.site]["modified_after"]
+
+    def edit(self, post_id):
+        return requests.post(f"{self.site}/wp-json/wp/v2/posts/{post_id}").json()
+
+    def outputs(self):
+        return sorted(p.relative_to(self.tree).as_posix() for p in (self.tree / "content").glob("*/*/index.md"))
+
+def test_full_noop_and_incremental_sync(site, tree, capsys):
+    sync = Sync(site, tree)
+    # 3 pages of posts, then one categories and one tags lookup
+    assert sync() == {"requests": 5, "post_objects": POSTS}
+    assert len(sync.outputs()) == POSTS
+    assert len(list((tree / "sources" / "wordpress" / "raw").glob("*.json"))) == POSTS
+    assert "Posts: 250 written" in capsys.readouterr().out
+
+    # only the newest post falls in the overlap before the high-water mark, and it is unchanged
+    assert sync() == {"requests": 1, "post_objects": 1}
+    assert "Posts: 0 written, 0 skipped, 1 unchanged" in capsys.readouterr().out
+
+    edited = sync.edit(7)
+    assert sync() == {"requests": 1, "post_objects": 2}
+    assert "Posts: 1 written, 0 skipped, 1 unchanged" in capsys.readouterr().out
+    assert sync.mark() == edited["modified"]
+    nid, dest_md, dest_txt = import_wordpress.post_paths(edited)
+    assert "(edit 1)" in dest_md.read_text() and "(edit 1)" in dest_txt.read_text()
+    assert len(sync.outputs()) == POSTS
+
+def test_mark_holds_until_a_sync_completes(site, tree, capsys):
+    sync = Sync(site, tree)
+    sync()
+    mark = sync.mark()
+    edited = sync.edit(7)
+    # the plain-text mirror cannot be written, so the listing is not complete
+    _, _, dest_txt = import_wordpress.post_paths(edited)
+    dest_txt.unlink()
+    dest_txt.mkdir()
+    sync()
+    assert "[ERROR] processing post 7" in capsys.readouterr().out
+    assert sync.mark() == mark
+
+    dest_txt.rmdir()
+    assert sync() == {"requests": 1, "post_objects": 2}
+    assert "Posts: 1 written" in capsys.readouterr().out
+    assert sync.mark() == edited["modified"]
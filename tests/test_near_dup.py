@@ -0,0 +1,49 @@
+import random
+
+import normalize_and_build_dataset as nbd
+
+def corpus(n=20, seed=7):
+    rng = random.Random(seed)
+    words = [f"w{k}" for k in range(500)]
+    texts = [" ".join(rng.choice(words) for _ in range(150)) for _ in range(n)]
+    # every fifth text has a near copy with one word changed
+    for i in range(0, n, 5):
+        tokens = texts[i].split()
+        tokens[75] = "changed"
+        texts.append(" ".join(tokens))
+    return texts
+
+def posts(texts):
+    return [{"repo_path": f"content/p{i}/index.md", "id": f"p{i}", "title": "", "date": f"2020-01-{i % 28 + 1:02d}",
+             "source": "Medium", "canonical_url": "", "tags": [], "language": "en", "text": t}
+            for i, t in enumerate(texts)]
+
+def score_all(samples, engine, scoring):
+    candidates = nbd.near_dup_candidates(samples, engine)
+    scorer = nbd.NearDupScorer(samples, candidates, scoring, dense=engine == "exhaustive")
+    found = {}
+    for i in range(len(samples)):
+        js = list(candidates(i))
+        found.update(((i, j), s) for j, s in zip(js, scorer.scores(i, js)) if s >= nbd.NEAR_DUP_THRESHOLD)
+    return found, scorer.scored
+
+def test_minhash_batch_scores_only_candidate_pairs():
+    samples = [t[:nbd.SAMPLE_CHARS] for t in corpus()]
+    batch, batch_scored = score_all(samples, "minhash", "batch")
+    pairwise, pairwise_scored = score_all(samples, "minhash", "pairwise")
+    n_candidates = sum(len(nbd.near_dup_candidates(samples, "minhash")(i)) for i in range(len(samples)))
+    assert batch_scored == pairwise_scored == n_candidates
+    assert n_candidates < len(samples) * (len(samples) - 1) // 2
+    assert batch == pairwise
+    assert len(batch) == 4
+
+def test_exhaustive_batch_matches_pairwise():
+    samples = [t[:nbd.SAMPLE_CHARS] for t in corpus(n=10)]
+    assert score_all(samples, "exhaustive", "batch")[0] == score_all(samples, "exhaustive", "pairwise")[0]
+
+def test_minhash_dedupe_same_for_both_scorings():
+    rows = posts(corpus())
+    batch = nbd.deduplicate_and_cluster(rows, "minhash", "batch")
+    pairwise = nbd.deduplicate_and_cluster(rows, "minhash", "pairwise")
+    assert batch == pairwise
+    assert len(batch[1]) == 4
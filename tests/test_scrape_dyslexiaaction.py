@@ -0,0 +1,77 @@
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+import pytest
+import requests
+
+import scrape_dyslexiaaction_tech_blog as scraper
+from fake_wayback_server import SNAPSHOTS, FakeWayback
+from fetch_engine import FetchEngine
+
+PAGES = 3
+
+class SlowSecondSnapshot(FakeWayback):
+    """Answers captures of the second snapshot last, so arrival order differs from SNAPSHOTS order."""
+
+    def _route(self):
+        if f"/web/{SNAPSHOTS[1]}/" in self.path:
+            time.sleep(0.2)
+        super()._route()
+
+@pytest.fixture
+def wayback():
+    handler = type("Handler", (SlowSecondSnapshot,), {
+        "pages": PAGES, "in_flight": 0, "lock": threading.Lock(),
+        "stats": {"requests": 0, "listings": 0, "posts": 0, "errors": 0, "max_in_flight": 0}})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    """Point the scraper's paths at an empty tmp tree."""
+    raw = tmp_path / "sources" / "dyslexiaaction" / "raw"
+    raw.mkdir(parents=True)
+    monkeypatch.setattr(scraper, "ROOT", tmp_path)
+    monkeypatch.setattr(scraper, "RAW_DIR", raw)
+    monkeypatch.setattr(scraper, "OUT_CONTENT", tmp_path / "content")
+    monkeypatch.setattr(scraper, "OUT_PLAIN", tmp_path / "plain")
+    (tmp_path / "plain").mkdir()
+    return tmp_path
+
+def stats(base):
+    return requests.get(f"{base}/stats").json()
+
+def test_crawl_then_resume_from_raw(wayback, tree, capsys):
+    scraper.run(0, PAGES - 1, workers=8, rate=0, base=wayback)
+    first = stats(wayback)
+    # every snapshot of every listing page is probed, then each post fetched once
+    assert first["listings"] == PAGES * len(SNAPSHOTS)
+    assert first["posts"] == PAGES * 10
+    assert len(list((tree / "content").glob("*/*/index.md"))) == PAGES * 10
+    assert len(list((tree / "plain").glob("da-*.txt"))) == PAGES * 10
+    raw = tree / "sources" / "dyslexiaaction" / "raw"
+    assert len(list(raw.glob("index-page*.html"))) == PAGES
+    assert len(list(raw.glob("post-p*-*.html"))) == PAGES * 10
+    capsys.readouterr()
+
+    scraper.run(0, PAGES - 1, workers=8, rate=0, base=wayback)
+    # only the /stats request itself
+    assert stats(wayback)["requests"] - first["requests"] == 1
+    out = capsys.readouterr().out
+    assert f"Posts: {PAGES * 10} ({PAGES * 10} from sources/dyslexiaaction/raw)" in out
+    assert out.count("[SKIP]") == PAGES * 10
+
+def test_first_listing_capture_in_snapshot_order_wins(wayback, tree):
+    with FetchEngine(workers=8, rate=0) as engine:
+        found = scraper.fetch_indexes(engine, range(PAGES), wayback, resume=False)
+    # the first snapshot has listings only on page 0; the second beats the
+    # third for later pages even though its answers arrive last
+    assert found[0][0] == scraper.index_url(0, SNAPSHOTS[0], wayback)
+    for p in range(1, PAGES):
+        url, html = found[p]
+        assert url == scraper.index_url(p, SNAPSHOTS[1], wayback)
+        assert scraper.LISTING_RE.search(html)